@@ -0,0 +1,167 @@
+import fnmatch
+import json
+import os
+import threading
+from collections import namedtuple
+
+# Тип файла по имени; проверяется по порядку, первое совпадение
+KIND_PATTERNS = [
+    ('circularized', 'Circularized*.fasta'),
+    ('novo_contigs', 'Contigs*.fasta'),
+    ('scaffolds', '*scaffolds.fa*'),
+    ('contigs', '*contigs.fa*'),
+    ('busco_summary', 'short_summary.*.txt'),
+    ('quast_report', 'report.tsv'),
+    ('reads', '*.fastq.gz'),
+]
+ORGANELLES = ('mito', 'chloro')
+# Органелла определяется только по частям пути, которые создает конвейер: окончанию имени файла
+# NOVOPlasty (..._mito.fasta) и сводок BUSCO по нему или по папке органеллы, либо папке с именем органеллы.
+# Имя образца может содержать mito или chloro, поэтому поиск подстроки по всему пути не подходит
+ORGANELLE_PATTERNS = ('*_{}.fasta', 'short_summary.*_{}.fasta.txt', 'short_summary.*.{}.txt')
+
+Artifact = namedtuple('Artifact', ['path', 'sample', 'organelle', 'kind', 'size', 'mtime_ns'])
+
+
+def artifact_kind(name):
+    for kind, pattern in KIND_PATTERNS:
+        if fnmatch.fnmatch(name, pattern):
+            return kind
+    return None
+
+
+def artifact_organelle(path):
+    parts = path.split(os.sep)
+    for organelle in ORGANELLES:
+        if any(fnmatch.fnmatch(parts[-1], pattern.format(organelle)) for pattern in ORGANELLE_PATTERNS):
+            return organelle
+    # Ближайшая к файлу папка органеллы
+    for part in reversed(parts[:-1]):
+        if part in ORGANELLES:
+            return part
+    return None
+
+
+# Индекс файлов в папках результатов. Папка читается через os.scandir один раз; при следующих
+# запросах для каждой папки делается только stat, и она перечитывается, лишь если изменилось её mtime
+# (файлы добавлены, удалены или переименованы). Индекс можно сохранить в JSON и загрузить в следующем запуске
+class ArtifactIndex:
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        # папка -> {'mtime_ns', 'dirs': [имена], 'files': {имя: [размер, mtime_ns]}}
+        self.dirs = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.dirs = json.load(f)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            tmp_path = f"{self.path}.tmp{threading.get_ident()}"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.dirs, f)
+            os.replace(tmp_path, self.path)
+
+    def _scan_dir(self, directory, mtime_ns):
+        entry = {'mtime_ns': mtime_ns, 'dirs': [], 'files': {}}
+        with os.scandir(directory) as entries:
+            for item in entries:
+                try:
+                    if item.is_dir():
+                        entry['dirs'].append(item.name)
+                    elif item.is_file():
+                        stat = item.stat()
+                        entry['files'][item.name] = [stat.st_size, stat.st_mtime_ns]
+                except OSError:
+                    continue
+        return entry
+
+    # Обновление поддерева root: перечитываются только изменившиеся папки. На NFS mtime папки может
+    # не измениться сразу после записи файла (кэш атрибутов), поэтому force перечитывает все папки поддерева
+    def refresh(self, root, force=False):
+        root = os.path.abspath(root)
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+            except OSError:
+                with self.lock:
+                    self._forget(directory)
+                continue
+            with self.lock:
+                entry = self.dirs.get(directory)
+            if force or entry is None or entry['mtime_ns'] != mtime_ns:
+                entry = self._scan_dir(directory, mtime_ns)
+                with self.lock:
+                    self._forget_removed(directory, entry)
+                    self.dirs[directory] = entry
+            stack.extend(os.path.join(directory, name) for name in entry['dirs'])
+
+    # Удаление папки и её поддерева из индекса; обход идёт по записям самого индекса, а не по всем ключам
+    def _forget(self, directory):
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            entry = self.dirs.pop(directory, None)
+            if entry:
+                stack.extend(os.path.join(directory, name) for name in entry['dirs'])
+
+    # Удаление из индекса подпапок, которых больше нет в перечитанной папке
+    def _forget_removed(self, directory, entry):
+        old_entry = self.dirs.get(directory)
+        if old_entry:
+            for name in set(old_entry['dirs']) - set(entry['dirs']):
+                self._forget(os.path.join(directory, name))
+
+    # Подпапки root (например, папки образцов)
+    def subdirs(self, root):
+        root = os.path.abspath(root)
+        self.refresh(root)
+        with self.lock:
+            entry = self.dirs.get(root)
+        return [os.path.join(root, name) for name in sorted(entry['dirs'])] if entry else []
+
+    # Файлы в поддереве root с заданным типом, органеллой и образцом (имя первой папки под root).
+    # max_depth - глубина файла относительно root (1 - файлы прямо в root). Обходятся только записи
+    # поддерева root (с учётом sample и max_depth), а не весь индекс. Если после обычного обновления
+    # ничего не найдено, поддерево перечитывается целиком (force) на случай устаревшего mtime на NFS
+    def query(self, root, kind=None, organelle=None, sample=None, max_depth=None, refresh=True):
+        root = os.path.abspath(root)
+        if refresh:
+            self.refresh(root)
+        found = self._collect(root, kind, organelle, sample, max_depth)
+        if refresh and not found:
+            self.refresh(root, force=True)
+            found = self._collect(root, kind, organelle, sample, max_depth)
+        return found
+
+    def _collect(self, root, kind, organelle, sample, max_depth):
+        found = []
+        stack = [(root, [])]
+        while stack:
+            directory, parts = stack.pop()
+            with self.lock:
+                entry = self.dirs.get(directory)
+            if entry is None:
+                continue
+            if max_depth is None or len(parts) + 2 <= max_depth:
+                for name in entry['dirs']:
+                    if not parts and sample is not None and name != sample:
+                        continue
+                    stack.append((os.path.join(directory, name), parts + [name]))
+            artifact_sample = parts[0] if parts else None
+            if sample is not None and artifact_sample != sample:
+                continue
+            for name, (size, mtime_ns) in entry['files'].items():
+                artifact_kind_ = artifact_kind(name)
+                if kind is not None and artifact_kind_ != kind:
+                    continue
+                path = os.path.join(directory, name)
+                artifact_organelle_ = artifact_organelle(os.path.join(*parts, name))
+                if organelle is not None and artifact_organelle_ != organelle:
+                    continue
+                found.append(Artifact(path, artifact_sample, artifact_organelle_, artifact_kind_, size, mtime_ns))
+        return sorted(found)
@@ -0,0 +1,140 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from quast_cache import read_report
+
+# Ключ сборки: образец, сборщик, группа прочтений и органелла ('' для сборок всего генома)
+KEY_COLUMNS = ['sample', 'assembler', 'tier', 'organelle']
+# Метрики report.tsv QUAST и их колонки в таблице
+QUAST_METRICS = {
+    '# contigs': 'contigs',
+    'Largest contig': 'largest_contig',
+    'Total length': 'total_length',
+    'GC (%)': 'gc_percent',
+    'N50': 'n50',
+    'L50': 'l50',
+    "# N's per 100 kbp": 'ns_per_100kbp',
+}
+# Строка итогов short_summary BUSCO: C:95.1%[S:94.0%,D:1.1%],F:1.2%,M:3.7%,n:255
+BUSCO_PATTERN = re.compile(r'C:([\d.]+)%\[S:([\d.]+)%,D:([\d.]+)%\],F:([\d.]+)%,M:([\d.]+)%,n:(\d+)')
+BUSCO_COLUMNS = ['busco_complete', 'busco_single', 'busco_duplicated', 'busco_fragmented', 'busco_missing',
+                 'busco_total']
+COST_COLUMNS = ['wall_s', 'cpu_hours', 'seconds_per_n50_kb', 'cpu_hours_per_busco_complete']
+# Метрики, которые сравниваются между сборщиками на листе сравнения
+COMPARISON_METRICS = ['n50', 'total_length', 'busco_complete', 'wall_s', 'seconds_per_n50_kb',
+                      'cpu_hours_per_busco_complete']
+
+
+# Метрики первой сборки в report.tsv (в отчетах конвейера одна сборка на отчет)
+def parse_quast_report(path):
+    for metrics in read_report(path).values():
+        return {QUAST_METRICS[name]: value for name, value in metrics if name in QUAST_METRICS}
+    return {}
+
+
+def parse_busco_summary(path):
+    with open(path) as f:
+        match = BUSCO_PATTERN.search(f.read())
+    return dict(zip(BUSCO_COLUMNS, match.groups())) if match else {}
+
+
+PARSERS = {'quast_report': parse_quast_report, 'busco_summary': parse_busco_summary}
+
+
+def _parse(item):
+    kind, path, key = item
+    try:
+        values = PARSERS[kind](path)
+    except (OSError, ValueError) as e:
+        print(f"Could not read {path}: {e}")
+        return kind, None
+    return kind, {**key, **values, f'{kind}_file': path} if values else None
+
+
+# Таблица сборок из отчетов QUAST и BUSCO: files - (тип 'quast_report' или 'busco_summary', путь, ключ сборки).
+# Файлы читаются параллельно; одна строка на сборку, метрики QUAST и BUSCO в колонках
+def load_assembly_results(files, workers=8):
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        parsed = [row for row in executor.map(_parse, files) if row[1]]
+    frames = []
+    for kind in PARSERS:
+        rows = [row for row_kind, row in parsed if row_kind == kind]
+        if rows:
+            # При нескольких отчетах одной сборки берется последний по пути
+            frame = pd.DataFrame(rows).sort_values(f'{kind}_file').drop_duplicates(KEY_COLUMNS, keep='last')
+            frames.append(frame)
+    if not frames:
+        return pd.DataFrame(columns=KEY_COLUMNS)
+    results = frames[0]
+    for frame in frames[1:]:
+        results = results.merge(frame, on=KEY_COLUMNS, how='outer')
+    numeric = [column for column in list(QUAST_METRICS.values()) + BUSCO_COLUMNS if column in results]
+    results[numeric] = results[numeric].apply(pd.to_numeric, errors='coerce')
+    # Пути к отчетам - в конце таблицы
+    columns = KEY_COLUMNS + numeric + [column for column in results if column.endswith('_file')]
+    return results[columns].sort_values(KEY_COLUMNS).reset_index(drop=True)
+
+
+# Этап сборки -> (сборщик, органелла): spades, abyss, novo_mito, novo_chloro
+def _assembler_stage(stage):
+    assembler, _, organelle = stage.partition('_')
+    return assembler, organelle
+
+
+# Стоимость сборок (costs - строки TelemetryStore.stage_costs для этапов сборки) и стоимость качества:
+# секунды на тысячу пар оснований N50 и CPU-часы на процент полных генов BUSCO
+def add_costs(results, costs):
+    results = results.copy()
+    costs = pd.DataFrame(costs, columns=['stage', 'tier', 'sample', 'wall_s', 'cpu_s'])
+    if costs.empty:
+        for column in COST_COLUMNS:
+            results[column] = np.nan
+        return results
+    costs[['assembler', 'organelle']] = costs['stage'].apply(lambda stage: pd.Series(_assembler_stage(stage)))
+    costs['cpu_hours'] = costs['cpu_s'] / 3600
+    results = results.merge(costs[KEY_COLUMNS + ['wall_s', 'cpu_hours']], on=KEY_COLUMNS, how='left')
+    n50_kb = results['n50'].replace(0, np.nan) / 1000 if 'n50' in results else np.nan
+    complete = results['busco_complete'].replace(0, np.nan) if 'busco_complete' in results else np.nan
+    results['seconds_per_n50_kb'] = (results['wall_s'] / n50_kb).round(2)
+    results['cpu_hours_per_busco_complete'] = (results['cpu_hours'] / complete).round(6)
+    results['cpu_hours'] = results['cpu_hours'].round(4)
+    return results
+
+
+# Итоги по сборщику и группе: число сборок, медианы метрик и суммарная стоимость
+def assembler_summary(results):
+    columns = [column for column in ['n50', 'total_length', 'busco_complete', 'seconds_per_n50_kb',
+                                     'cpu_hours_per_busco_complete'] if column in results]
+    grouped = results.groupby(['assembler', 'tier', 'organelle'])
+    summary = grouped[columns].median().add_prefix('median_')
+    summary['assemblies'] = grouped.size()
+    for column in ('wall_s', 'cpu_hours'):
+        if column in results:
+            summary[f'total_{column}'] = grouped[column].sum(min_count=1)
+    return summary.reset_index()
+
+
+# Сравнение сборщиков бок о бок: строка на (образец, группа, органелла), колонки метрика_сборщик
+def assembler_comparison(results):
+    metrics = [column for column in COMPARISON_METRICS if column in results]
+    table = results.pivot_table(index=['sample', 'tier', 'organelle'], columns='assembler', values=metrics,
+                                aggfunc='first')
+    table = table[[metric for metric in metrics if metric in table.columns.get_level_values(0)]]
+    table.columns = [f"{metric}_{assembler}" for metric, assembler in table.columns]
+    return table.reset_index()
+
+
+# Листы отчета о сборках: {название листа: таблица}
+def assembly_sheets(files, costs, workers=8):
+    results = load_assembly_results(files, workers)
+    if results.empty:
+        return {}
+    results = add_costs(results, costs)
+    return {
+        'Assemblies': results,
+        'Assembler_summary': assembler_summary(results),
+        'Assembler_comparison': assembler_comparison(results),
+    }
@@ -0,0 +1,82 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastq_io import GZIP_LEVEL, BLOCK_SIZE, BlockGzipWriter, iter_blocks
+
+
+def timed(func):
+    start_time = time.time()
+    size = func()
+    elapsed = time.time() - start_time
+    return {'seconds': round(elapsed, 3), 'mb_per_s': round(size / 1024 ** 2 / elapsed, 2)}
+
+
+def gzip_read(path):
+    size = 0
+    with gzip.open(path, 'rb') as handle:
+        for data in iter(lambda: handle.read(BLOCK_SIZE), b''):
+            size += len(data)
+    return size
+
+
+def layer_read(path, threads):
+    return sum(len(data) for data in iter_blocks(path, threads=threads))
+
+
+def gzip_write(data, path):
+    with gzip.open(path, 'wb', compresslevel=GZIP_LEVEL) as handle:
+        for start in range(0, len(data), BLOCK_SIZE):
+            handle.write(data[start:start + BLOCK_SIZE])
+    return len(data)
+
+
+def layer_write(data, path, threads):
+    with BlockGzipWriter(path, threads=threads) as writer:
+        for start in range(0, len(data), BLOCK_SIZE):
+            writer.write(data[start:start + BLOCK_SIZE])
+    return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MB/s of the block-gzip FASTQ I/O layer against the gzip module")
+    parser.add_argument('fastq', help="Any *.fastq.gz file")
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--json', help="Save results to this file")
+    args = parser.parse_args()
+
+    with gzip.open(args.fastq, 'rb') as handle:
+        data = handle.read()
+
+    results = {'uncompressed_mb': round(len(data) / 1024 ** 2, 2), 'threads': args.threads}
+    work_dir = tempfile.mkdtemp(prefix='bench_gzip_io_')
+    try:
+        plain_path = os.path.join(work_dir, 'plain.fastq.gz')
+        block_path = os.path.join(work_dir, 'block.fastq.gz')
+
+        results['write_gzip'] = timed(lambda: gzip_write(data, plain_path))
+        results['write_block_gzip'] = timed(lambda: layer_write(data, block_path, args.threads))
+        results['read_gzip'] = timed(lambda: gzip_read(plain_path))
+        # Файл без индекса: распаковка в фоновом потоке
+        results['read_stream'] = timed(lambda: layer_read(plain_path, args.threads))
+        # Многочленный файл с индексом: распаковка в пуле потоков
+        results['read_block_gzip'] = timed(lambda: layer_read(block_path, args.threads))
+        results['read_block_gzip_with_gzip_module'] = timed(lambda: gzip_read(block_path))
+    finally:
+        shutil.rmtree(work_dir)
+
+    print(json.dumps(results, indent=1))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+from functools import partial
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import pipe_finish as pf
+from artifacts import ArtifactIndex
+from cache import ResultCache
+from classify import score_sample
+from contig_stats import contig_stats
+from fasta_norm import needs_normalization, normalize_fasta
+from fastq_qc import qc_file
+from journal import RunJournal
+from pipeline import Pipeline
+from scheduler import ResourceScheduler
+from subsample import downsample_pair
+from synthetic import make_dataset, write_contigs
+from stub_tools import STUB_SECONDS_ENV, install_stubs
+from telemetry import TelemetryStore
+from trimmer import TRIM_STEPS, trim_pair
+
+# Размеры наборов: число образцов, пар прочтений в образце, контигов в файле FASTA
+SCALES = {
+    'small': {'samples': 2, 'pairs': 20000, 'contigs': 2000},
+    'medium': {'samples': 4, 'pairs': 200000, 'contigs': 20000},
+    'large': {'samples': 8, 'pairs': 1000000, 'contigs': 100000},
+}
+GENOME_SIZE = 1000000
+# Время и скорость, которые хуже базовых больше чем на эту долю, считаются регрессией
+REGRESSION_TOLERANCE = 0.2
+# Замеры короче этого (с) слишком шумные для сравнения
+MIN_COMPARE_SECONDS = 0.05
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+
+def timed(func, size=None):
+    start_time = time.time()
+    func()
+    elapsed = time.time() - start_time
+    result = {'seconds': round(elapsed, 3)}
+    if size is not None:
+        result['mb_per_s'] = round(size / 1024 ** 2 / elapsed, 2) if elapsed else None
+    return result
+
+
+def _sizes(*paths):
+    return sum(os.path.getsize(path) for path in paths)
+
+
+# Этапы, которые выполняются в самом Python, на одном образце набора
+def bench_stages(work_dir, fastq_dir, sample, contigs, workers):
+    results = {}
+    reads = [os.path.join(fastq_dir, f"{sample}_R{read}_001.fastq.gz") for read in (1, 2)]
+    reads_size = _sizes(*reads)
+
+    qc_dir = os.path.join(work_dir, 'qc')
+    os.makedirs(qc_dir, exist_ok=True)
+    results['qc_file'] = timed(lambda: qc_file(reads[0], qc_dir), _sizes(reads[0]))
+
+    trim_dir = os.path.join(work_dir, 'trim')
+    os.makedirs(trim_dir, exist_ok=True)
+    trimmed = pf.trimmed_files(trim_dir, sample)
+    results['trim_pair'] = timed(lambda: trim_pair(*reads, trimmed, steps=TRIM_STEPS, workers=workers), reads_size)
+    paired = [trimmed[0], trimmed[2]]
+
+    results['score_sample'] = timed(lambda: score_sample(*paired, GENOME_SIZE / 1e6), _sizes(*paired))
+    subsampled = [os.path.join(trim_dir, f"{sample}_subsampled_R{read}.fastq.gz") for read in (1, 2)]
+    results['downsample_pair'] = timed(lambda: downsample_pair(paired, subsampled, 0.5), _sizes(*paired))
+
+    # Файл как у NOVOPlasty ('*' и повторяющиеся заголовки) и обычные контиги сборщика
+    novo_contigs = write_contigs(os.path.join(work_dir, 'novo_contigs.fasta'), contigs, star_fraction=0.001,
+                                 duplicate_headers=True, seed=1)
+    assembly = write_contigs(os.path.join(work_dir, 'contigs.fasta'), contigs, seed=2)
+    normalized = os.path.join(work_dir, 'normalized.fasta')
+    results['needs_normalization'] = timed(lambda: needs_normalization(novo_contigs), _sizes(novo_contigs))
+    results['normalize_fasta'] = timed(lambda: normalize_fasta(novo_contigs, normalized), _sizes(novo_contigs))
+    results['contig_stats'] = timed(lambda: contig_stats(assembly, GENOME_SIZE), _sizes(assembly))
+    return results
+
+
+# Файл шаблона NOVOPlasty со всеми ключами, которые подставляет config_values, и файлы seed
+def write_novo_inputs(work_dir):
+    template = os.path.join(work_dir, 'novo_config.txt')
+    keys = ['Project name', 'Type', 'Genome Range', 'K-mer', 'Max memory', 'Seed Input', 'Read Length',
+            'Insert size', 'Forward reads', 'Reverse reads', 'Reference sequence', 'Chloroplast sequence',
+            'Output path']
+    with open(template, 'w') as f:
+        f.writelines(f"{key:<22}= \n" for key in keys)
+    seeds = {}
+    for organelle in ('mito', 'chloro'):
+        seeds[organelle] = write_contigs(os.path.join(work_dir, f"seed_{organelle}.fasta"), 1, 500, seed=3)
+    return template, seeds
+
+
+def pipeline_config(work_dir, fastq_dir):
+    template, seeds = write_novo_inputs(work_dir)
+
+    def path(name):
+        return os.path.join(work_dir, name)
+
+    def tiers(name):
+        return {tier: path(f"{name}_{tier}") for tier in pf.TIERS}
+
+    return {
+        'fastq': fastq_dir,
+        'qc_output': path('qc_output'),
+        'trimmed': path('trimmed'),
+        'reads': tiers('reads'),
+        'classify_output': path('classification'),
+        'subsampled': tiers('subsampled'),
+        'target_depth': pf.SUBSAMPLE_TARGET_DEPTH,
+        'cheap_bad_tier': False,
+        'novo': tiers('novo'),
+        'config_template': template,
+        'seed_mito': seeds['mito'],
+        'seed_chloro': seeds['chloro'],
+        'spades': tiers('spades'),
+        'abyss': tiers('abyss'),
+        'contig_stats': tiers('contig_stats'),
+        'quast_spades': tiers('quast_spades'),
+        'quast_abyss': tiers('quast_abyss'),
+        'quast_novo': tiers('quast_novo'),
+        'quast_report': tiers('quast_report'),
+        'staging': tiers('staging'),
+        'lineage_dataset': path('lineage_dataset'),
+        'code_dir': None,
+        'busco_spades': tiers('busco_spades'),
+        'busco_abyss': tiers('busco_abyss'),
+        'busco_novo': tiers('busco_novo'),
+        'spades_kmer': 55,
+        'novo_kmer': 55,
+        'read_length': 150,
+        'abyss_kmer': 64,
+        'kmer_sweep': False,
+        'kmer_sweep_width': pf.KMER_SWEEP_WIDTH,
+        'spades_kmer_candidates': pf.SPADES_KMER_CANDIDATES,
+        'abyss_kmer_candidates': pf.ABYSS_KMER_CANDIDATES,
+        'trim_engine': 'native',
+        'qc_engine': 'native',
+        'cache': path('cache'),
+        'journal': path('journal.json'),
+    }
+
+
+# Один проход графа pipe_finish с заглушками программ: общее время, состояния задач и время команд,
+# разница между ними - накладные расходы оркестрации
+def run_pipeline(config, run_name, work_dir):
+    pf.telemetry = TelemetryStore(os.path.join(work_dir, f"telemetry_{run_name}.sqlite"))
+    pf.artifact_index = ArtifactIndex()
+    tasks = pf.build_pipeline(config, pf.STAGES, pf.TIERS)
+    cache = ResultCache(config['cache'], pf.CACHE_QUOTA_GB, pf.CACHE_MAX_AGE_DAYS, pf.VERSION_COMMANDS)
+    pf.scheduler = ResourceScheduler(pf.TOTAL_CORES, pf.TOTAL_MEM_GB)
+    pipeline = Pipeline(tasks, pf.scheduler, partial(pf.run_command, check=True), cache,
+                        RunJournal(config['journal']))
+    pf.telemetry.start_run([__file__, run_name])
+    start_time = time.time()
+    pipeline.run_all()
+    wall_s = time.time() - start_time
+    pf.telemetry.add_tasks(pipeline.tasks)
+    pf.telemetry.finish_run()
+    commands = pf.telemetry.commands(pf.telemetry.run_id)
+    pf.telemetry.close()
+    command_s = sum(row['wall_s'] for row in commands)
+    return {
+        'wall_s': round(wall_s, 3),
+        'tasks': len(pipeline.tasks),
+        'states': pipeline.summary(),
+        'commands': len(commands),
+        'command_wall_s': round(command_s, 3),
+    }
+
+
+# Результаты всех этапов, кроме входных прочтений и кэша, удаляются перед повторным запуском
+def clear_outputs(work_dir, keep):
+    for name in os.listdir(work_dir):
+        if name not in keep:
+            path = os.path.join(work_dir, name)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+
+def bench_orchestration(work_dir, fastq_dir):
+    bin_dir = os.path.join(work_dir, 'bin')
+    plot_script = install_stubs(bin_dir)
+    os.environ['PATH'] = bin_dir + os.pathsep + os.environ['PATH']
+    os.environ.setdefault(STUB_SECONDS_ENV, '0')
+    # Пороги для синтетического генома размером GENOME_SIZE и коротких сборок заглушек
+    pf.CLASSIFY_THRESHOLDS = {**pf.CLASSIFY_THRESHOLDS, 'genome_size_mb': GENOME_SIZE / 1e6}
+    pf.GENOME_SIZE_MB = GENOME_SIZE / 1e6
+    pf.CONTIG_THRESHOLDS = {**pf.CONTIG_THRESHOLDS, 'min_total_length': 1000, 'min_n50': 100}
+
+    run_dir = os.path.join(work_dir, 'pipeline')
+    os.makedirs(run_dir)
+    config = pipeline_config(run_dir, fastq_dir)
+    config['code_dir'] = plot_script
+    keep = {os.path.basename(config['cache']), 'novo_config.txt', 'seed_mito.fasta', 'seed_chloro.fasta'}
+    results = {'cold': run_pipeline(config, 'cold', work_dir)}
+    # Повторный запуск с пустыми папками результатов: этапы программ восстанавливаются из кэша
+    clear_outputs(run_dir, keep)
+    results['warm'] = run_pipeline(config, 'warm', work_dir)
+    return results
+
+
+# Сравнение с прошлым результатом: время (seconds, wall_s) выросло или скорость (mb_per_s) упала
+# больше чем на tolerance
+def compare(results, baseline, tolerance=REGRESSION_TOLERANCE, prefix=''):
+    regressions = []
+    for key, value in results.items():
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if old is None:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            if (old.get('seconds') or old.get('wall_s') or MIN_COMPARE_SECONDS) < MIN_COMPARE_SECONDS:
+                continue
+            regressions.extend(compare(value, old, tolerance, name + '.'))
+        elif key in ('seconds', 'wall_s') and old and value > old * (1 + tolerance):
+            regressions.append(f"{name}: {old} -> {value}")
+        elif key == 'mb_per_s' and old and value is not None and value < old * (1 - tolerance):
+            regressions.append(f"{name}: {old} -> {value}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timings of in-Python stages and pipeline orchestration "
+                                                 "on synthetic data with stub assemblers")
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small'])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Save results to this file "
+                                       "(default: benchmarks/results/bench_pipeline_<time>.json)")
+    parser.add_argument('--baseline', help="Earlier results file to compare with")
+    parser.add_argument('--skip-pipeline', action='store_true', help="Time only the in-Python stages")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated data")
+    args = parser.parse_args()
+
+    results = {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'workers': args.workers,
+        'scales': {},
+    }
+    for scale in args.scales:
+        sizes = SCALES[scale]
+        work_dir = tempfile.mkdtemp(prefix=f'bench_pipeline_{scale}_')
+        try:
+            fastq_dir = os.path.join(work_dir, 'fastq')
+            start_time = time.time()
+            samples, _ = make_dataset(fastq_dir, sizes['samples'], sizes['pairs'], genome_size=GENOME_SIZE,
+                                      seed=args.seed)
+            scale_results = {**sizes, 'generate_s': round(time.time() - start_time, 3)}
+            scale_results['stages'] = bench_stages(os.path.join(work_dir, 'stages'), fastq_dir, samples[0],
+                                                   sizes['contigs'], args.workers)
+            if not args.skip_pipeline:
+                scale_results['pipeline'] = bench_orchestration(work_dir, fastq_dir)
+            results['scales'][scale] = scale_results
+        finally:
+            if args.keep:
+                print(f"Data kept in {work_dir}")
+            else:
+                shutil.rmtree(work_dir)
+
+    print(json.dumps(results, indent=1))
+    json_file = args.json
+    if json_file is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        json_file = os.path.join(RESULTS_DIR, f"bench_pipeline_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(json_file, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f"Results saved to {json_file}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results['scales'], baseline.get('scales', {}))
+        if regressions:
+            print("Slower than baseline:\n" + '\n'.join(regressions))
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
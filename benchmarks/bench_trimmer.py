@@ -0,0 +1,81 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from trimmer import TRIM_STEPS, trim_pair
+
+OUTPUT_NAMES = ['paired_R1', 'unpaired_R1', 'paired_R2', 'unpaired_R2']
+
+
+def output_files(output_dir):
+    return [os.path.join(output_dir, f"sample_{name}.fastq.gz") for name in OUTPUT_NAMES]
+
+
+# Сравниваем распакованное содержимое: сжатые байты у Java и Python всегда разные
+def compare_outputs(files_a, files_b):
+    result = {}
+    for name, file_a, file_b in zip(OUTPUT_NAMES, files_a, files_b):
+        with gzip.open(file_a, 'rb') as a, gzip.open(file_b, 'rb') as b:
+            result[name] = a.read() == b.read()
+    return result
+
+
+def run_native(input_file_R1, input_file_R2, output_dir, workers):
+    start_time = time.time()
+    trim_pair(input_file_R1, input_file_R2, output_files(output_dir), TRIM_STEPS, workers=workers)
+    return time.time() - start_time
+
+
+def run_trimmomatic(trimmomatic, input_file_R1, input_file_R2, output_dir, workers):
+    outputs = ' '.join(output_files(output_dir))
+    command = f"{trimmomatic} PE -threads {workers} -phred33 {input_file_R1} {input_file_R2} {outputs} {TRIM_STEPS}"
+    start_time = time.time()
+    subprocess.run(command, shell=True, check=True)
+    return time.time() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the native trimmer with Trimmomatic on the same read pair")
+    parser.add_argument('r1')
+    parser.add_argument('r2')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--trimmomatic', default='trimmomatic')
+    parser.add_argument('--json', help="Save results to this file")
+    args = parser.parse_args()
+
+    input_mb = (os.path.getsize(args.r1) + os.path.getsize(args.r2)) / 1024 ** 2
+    results = {'input_mb': round(input_mb, 2), 'workers': args.workers, 'steps': TRIM_STEPS}
+    work_dir = tempfile.mkdtemp(prefix='bench_trimmer_')
+    try:
+        native_dir = os.path.join(work_dir, 'native')
+        os.makedirs(native_dir)
+        elapsed = run_native(args.r1, args.r2, native_dir, args.workers)
+        results['native'] = {'seconds': round(elapsed, 3), 'mb_per_s': round(input_mb / elapsed, 2)}
+
+        if shutil.which(args.trimmomatic.split()[0]):
+            trimmomatic_dir = os.path.join(work_dir, 'trimmomatic')
+            os.makedirs(trimmomatic_dir)
+            elapsed = run_trimmomatic(args.trimmomatic, args.r1, args.r2, trimmomatic_dir, args.workers)
+            results['trimmomatic'] = {'seconds': round(elapsed, 3), 'mb_per_s': round(input_mb / elapsed, 2)}
+            results['identical_output'] = compare_outputs(output_files(native_dir), output_files(trimmomatic_dir))
+        else:
+            print(f"{args.trimmomatic} not found, only the native engine was timed")
+    finally:
+        shutil.rmtree(work_dir)
+
+    print(json.dumps(results, indent=1))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
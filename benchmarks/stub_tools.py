@@ -0,0 +1,221 @@
+import os
+import random
+import sys
+import time
+import zlib
+
+# Детерминированные заглушки внешних программ конвейера: принимают те же аргументы, что и pipe_finish
+# передает настоящим программам, и за $BENCH_STUB_SECONDS секунд создают файлы там, где их ждут следующие этапы.
+# Содержимое зависит только от аргументов, поэтому повторные запуски дают одинаковые файлы
+STUB_SECONDS_ENV = 'BENCH_STUB_SECONDS'
+STUB_TOOLS = {
+    'spades.py': 'spades',
+    'abyss-pe': 'abyss',
+    'NOVOPlasty': 'novoplasty',
+    'quast.py': 'quast',
+    'busco': 'busco',
+}
+# Лучшая сборка получается при k около 55-77 (для проверки перебора k)
+BEST_KMER = 66
+
+
+def _pause():
+    time.sleep(float(os.environ.get(STUB_SECONDS_ENV, 0)))
+
+
+def _option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+
+def _key_values(args):
+    return dict(arg.split('=', 1) for arg in args if '=' in arg and not arg.startswith('-'))
+
+
+def _rng(*parts):
+    return random.Random(zlib.crc32(' '.join(map(str, parts)).encode()))
+
+
+def _write_fasta(path, lengths, rng, prefix='NODE', star_every=0):
+    with open(path, 'w') as f:
+        for i, length in enumerate(lengths, start=1):
+            sequence = ''.join(rng.choice('ACGT') for _ in range(length))
+            if star_every:
+                sequence = ''.join('*' if j % star_every == 0 else base for j, base in enumerate(sequence, 1))
+            f.write(f">{prefix}_{i}_length_{length}\n")
+            for start in range(0, length, 60):
+                f.write(sequence[start:start + 60] + '\n')
+
+
+def _assembly_lengths(kmer_size, rng, contigs=40):
+    # Средняя длина контига падает с удалением k от BEST_KMER
+    mean_length = max(3000 - 30 * abs(int(kmer_size) - BEST_KMER), 300)
+    return [max(int(rng.expovariate(1 / mean_length)), 200) for _ in range(contigs)]
+
+
+# Кроме контигов создаются промежуточные файлы, как у настоящего SPAdes (папки K*, corrected, граф сборки)
+def spades(args):
+    output_folder, kmer_size = _option(args, '-o'), _option(args, '-k', 55)
+    os.makedirs(os.path.join(output_folder, f"K{kmer_size}"), exist_ok=True)
+    os.makedirs(os.path.join(output_folder, 'corrected'), exist_ok=True)
+    rng = _rng('spades', os.path.basename(_option(args, '-1', '')), kmer_size)
+    lengths = _assembly_lengths(kmer_size, rng)
+    _write_fasta(os.path.join(output_folder, f"K{kmer_size}", 'final_contigs.fasta'), lengths, rng)
+    _write_fasta(os.path.join(output_folder, 'corrected', 'reads.fasta'), lengths, rng, 'read')
+    _write_fasta(os.path.join(output_folder, 'assembly_graph.fastg'), lengths, rng, 'EDGE')
+    _write_fasta(os.path.join(output_folder, 'contigs.fasta'), lengths, rng)
+    _write_fasta(os.path.join(output_folder, 'scaffolds.fasta'), lengths[::2], rng)
+
+
+def _link(target, path):
+    if os.path.lexists(path):
+        os.remove(path)
+    os.symlink(os.path.basename(target), path)
+
+
+# Как у настоящего abyss-pe: контиги и скаффолды - ссылки на последние файлы этапов (-6.fa, -8.fa),
+# рядом - файлы промежуточных этапов
+def abyss(args):
+    values = _key_values(args)
+    output_folder, name, kmer_size = _option(args, '-C', '.'), values['name'], values.get('k', 64)
+    os.makedirs(output_folder, exist_ok=True)
+    rng = _rng('abyss', name, kmer_size)
+    lengths = _assembly_lengths(kmer_size, rng)
+    _write_fasta(os.path.join(output_folder, f"{name}-1.fa"), lengths, rng, 'unitig')
+    _write_fasta(os.path.join(output_folder, f"{name}-6.fa"), lengths, rng, 'contig')
+    _write_fasta(os.path.join(output_folder, f"{name}-8.fa"), lengths[::2], rng, 'scaffold')
+    _link(f"{name}-6.fa", os.path.join(output_folder, f"{name}-contigs.fa"))
+    _link(f"{name}-8.fa", os.path.join(output_folder, f"{name}-scaffolds.fa"))
+
+
+# Значения из файла конфигурации NOVOPlasty (ключ = значение)
+def _novo_config(path):
+    values = {}
+    with open(path) as f:
+        for line in f:
+            if '=' in line:
+                key, value = line.split('=', 1)
+                values[key.strip()] = value.strip()
+    return values
+
+
+# Кольцевая сборка с '*' (как у настоящего NOVOPlasty), чтобы подготовка файлов для QUAST/BUSCO их нормализовала
+def novoplasty(args):
+    values = _novo_config(_option(args, '-c'))
+    project, output_folder = values['Project name'], values['Output path']
+    os.makedirs(output_folder, exist_ok=True)
+    rng = _rng('novoplasty', project)
+    low, high = (int(value) for value in values.get('Genome Range', '15000-20000').split('-'))
+    length = rng.randint(low, high) // 20
+    _write_fasta(os.path.join(output_folder, f"Circularized_assembly_1_{project}.fasta"), [length], rng,
+                 'Contig', star_every=997)
+
+
+def _fasta_lengths(path):
+    lengths, current = [], None
+    with open(path) as f:
+        for line in f:
+            if line.startswith('>'):
+                if current is not None:
+                    lengths.append(current)
+                current = 0
+            elif current is not None:
+                current += len(line.strip())
+    if current is not None:
+        lengths.append(current)
+    return lengths
+
+
+def _n50(lengths):
+    total, running = sum(lengths), 0
+    for length in sorted(lengths, reverse=True):
+        running += length
+        if running * 2 >= total:
+            return length
+    return 0
+
+
+def quast(args):
+    output_dir = _option(args, '-o')
+    skip = {'-o', '-t', '--threads'}
+    contigs, i = [], 0
+    while i < len(args):
+        if args[i] in skip:
+            i += 2
+            continue
+        if not args[i].startswith('-'):
+            contigs.append(args[i])
+        i += 1
+    os.makedirs(output_dir, exist_ok=True)
+    names = [os.path.splitext(os.path.basename(path))[0] for path in contigs]
+    stats = [_fasta_lengths(path) for path in contigs]
+    rows = [['Assembly'] + names,
+            ['# contigs'] + [str(len(lengths)) for lengths in stats],
+            ['Largest contig'] + [str(max(lengths, default=0)) for lengths in stats],
+            ['Total length'] + [str(sum(lengths)) for lengths in stats],
+            ['N50'] + [str(_n50(lengths)) for lengths in stats]]
+    with open(os.path.join(output_dir, 'report.tsv'), 'w') as f:
+        f.writelines('\t'.join(row) + '\n' for row in rows)
+    with open(os.path.join(output_dir, 'transposed_report.tsv'), 'w') as f:
+        f.writelines('\t'.join(column) + '\n' for column in zip(*rows))
+
+
+def _short_summary(path, input_name, lineage, rng):
+    complete = rng.randint(50, 98)
+    with open(path, 'w') as f:
+        f.write(f"# BUSCO stub\n# The lineage dataset is: {lineage}\n# Input: {input_name}\n\n"
+                f"\tC:{complete}.0%[S:{complete - 1}.0%,D:1.0%],F:1.0%,M:{99 - complete}.0%,n:255\n")
+    return complete
+
+
+# Одна сборка (-i файл) или пакетный режим (-i папка: подпапка и short_summary на каждый файл, batch_summary.txt)
+def busco(args):
+    input_path, output_dir = _option(args, '-i'), _option(args, '--out_path', '.')
+    lineage = os.path.basename(os.path.normpath(_option(args, '-l', 'lineage')))
+    name = _option(args, '-o') or os.path.basename(input_path)
+    run_dir = os.path.join(output_dir, name)
+    os.makedirs(run_dir, exist_ok=True)
+    if os.path.isdir(input_path):
+        rows = []
+        for file_name in sorted(os.listdir(input_path)):
+            file_dir = os.path.join(run_dir, file_name)
+            os.makedirs(file_dir, exist_ok=True)
+            summary = os.path.join(file_dir, f"short_summary.specific.{lineage}.{file_name}.txt")
+            complete = _short_summary(summary, file_name, lineage, _rng('busco', file_name))
+            rows.append(f"{file_name}\t{lineage}\t{complete}.0\n")
+        with open(os.path.join(run_dir, 'batch_summary.txt'), 'w') as f:
+            f.writelines(['Input_file\tDataset\tComplete\n'] + rows)
+    else:
+        summary = os.path.join(run_dir, f"short_summary.specific.{lineage}.{name}.txt")
+        _short_summary(summary, os.path.basename(input_path), lineage, _rng('busco', input_path))
+
+
+# Заглушка скрипта построения диаграммы BUSCO (-wd папка)
+def plot(args):
+    with open(os.path.join(_option(args, '-wd'), 'busco_figure.png'), 'wb') as f:
+        f.write(b'\x89PNG stub\n')
+
+
+# Запускаемые файлы заглушек в bin_dir (папку нужно добавить в начало PATH) и скрипт диаграммы;
+# возвращает путь к скрипту диаграммы для config['code_dir']
+def install_stubs(bin_dir):
+    os.makedirs(bin_dir, exist_ok=True)
+    this_file = os.path.abspath(__file__)
+    for program, tool in STUB_TOOLS.items():
+        path = os.path.join(bin_dir, program)
+        with open(path, 'w') as f:
+            f.write(f"#!/bin/sh\nexec {sys.executable} {this_file} {tool} \"$@\"\n")
+        os.chmod(path, 0o755)
+    plot_script = os.path.join(bin_dir, 'generate_plot.py')
+    with open(plot_script, 'w') as f:
+        f.write(f"import sys\nsys.path.insert(0, {os.path.dirname(this_file)!r})\n"
+                f"from stub_tools import plot\nplot(sys.argv[1:])\n")
+    return plot_script
+
+
+if __name__ == "__main__":
+    if sys.argv[2:] in (['--version'], ['-version'], ['version']):
+        print(f"{sys.argv[1]} stub")
+        sys.exit(0)
+    _pause()
+    {'spades': spades, 'abyss': abyss, 'novoplasty': novoplasty, 'quast': quast, 'busco': busco,
+     'plot': plot}[sys.argv[1]](sys.argv[2:])
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastq_io import BlockGzipWriter
+
+BASES = np.frombuffer(b'ACGT', dtype=np.uint8)
+COMPLEMENT = bytes.maketrans(b'ACGTN', b'TGCAN')
+PHRED_OFFSET = 33
+# Пары генерируются и записываются порциями
+BATCH_PAIRS = 50000
+
+
+def random_sequence(length, rng):
+    return BASES[rng.integers(0, 4, length)].tobytes()
+
+
+# Качество вдоль прочтения: плато mean_quality, к концу падает, с шумом; часть прочтений с плохим хвостом,
+# чтобы шагам TRAILING и SLIDINGWINDOW было что обрезать
+def _qualities(count, read_length, mean_quality, rng):
+    position = np.arange(read_length)
+    drop = np.clip((position - read_length * 0.7) / (read_length * 0.3), 0, 1) * 12
+    quals = mean_quality - drop + rng.normal(0, 3, (count, read_length))
+    bad_tails = rng.random(count) < 0.1
+    quals[bad_tails, -read_length // 5:] = 2
+    return (np.clip(quals, 2, 41).astype(np.uint8) + PHRED_OFFSET)
+
+
+def _reads(genome, starts, read_length):
+    view = np.frombuffer(genome, dtype=np.uint8)
+    index = starts[:, None] + np.arange(read_length)
+    return view[index]
+
+
+def _fastq_block(names, reads, quals):
+    lines = []
+    for name, read, qual in zip(names, reads, quals):
+        lines.append(b'@%s\n%s\n+\n%s\n' % (name, read.tobytes(), qual.tobytes()))
+    return b''.join(lines)
+
+
+# Пара FASTQ (gzip из блоков, как после fastq_io) с прочтениями из genome: вставка insert_size ± 10%,
+# R2 - обратная комплементарная цепь; доля duplicate_fraction пар повторяет предыдущие
+def write_fastq_pair(path_R1, path_R2, genome, pairs, read_length=150, insert_size=400, mean_quality=34,
+                     duplicate_fraction=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    max_start = len(genome) - max(insert_size * 2, read_length)
+    with BlockGzipWriter(path_R1, level=1) as writer_R1, BlockGzipWriter(path_R2, level=1) as writer_R2:
+        for first in range(0, pairs, BATCH_PAIRS):
+            count = min(BATCH_PAIRS, pairs - first)
+            starts = rng.integers(0, max_start, count)
+            duplicates = rng.random(count) < duplicate_fraction
+            starts[1:][duplicates[1:]] = starts[:-1][duplicates[1:]]
+            inserts = (insert_size * rng.uniform(0.9, 1.1, count)).astype(np.int64)
+            reads_R1 = _reads(genome, starts, read_length)
+            reads_R2 = _reads(genome, starts + inserts - read_length, read_length)[:, ::-1]
+            reads_R2 = np.frombuffer(reads_R2.tobytes().translate(COMPLEMENT), dtype=np.uint8).reshape(count, -1)
+            names = [b'SYN:1:FC:1:1:%d:%d' % (first + i, seed) for i in range(count)]
+            writer_R1.write(_fastq_block([name + b' 1:N:0:1' for name in names], reads_R1,
+                                         _qualities(count, read_length, mean_quality, rng)), count)
+            writer_R2.write(_fastq_block([name + b' 2:N:0:1' for name in names], reads_R2,
+                                         _qualities(count, read_length, mean_quality, rng)), count)
+    return path_R1, path_R2
+
+
+# Контиги в FASTA: длины из логнормального распределения со средним mean_length. star_fraction - доля '*'
+# в последовательностях (как у NOVOPlasty), duplicate_headers - повторяющиеся заголовки
+def write_contigs(path, contigs, mean_length=5000, line_width=60, star_fraction=0.0, duplicate_headers=False,
+                  seed=0):
+    rng = np.random.default_rng(seed)
+    lengths = np.maximum(rng.lognormal(np.log(mean_length) - 0.5, 1.0, contigs).astype(np.int64), 100)
+    with open(path, 'wb') as f:
+        for i, length in enumerate(lengths):
+            sequence = bytearray(random_sequence(int(length), rng))
+            if star_fraction:
+                for position in rng.integers(0, length, int(length * star_fraction)):
+                    sequence[position] = ord('*')
+            name = i // 2 if duplicate_headers else i
+            f.write(b'>contig_%d length=%d\n' % (name, length))
+            for start in range(0, length, line_width):
+                f.write(bytes(sequence[start:start + line_width]) + b'\n')
+    return path
+
+
+# Набор образцов с сырыми прочтениями в fastq_dir под именами, которые ждет pipe_finish
+# (<образец>_R1_001.fastq.gz). Образцы с нечетными номерами - с низким качеством (попадают в группу bad)
+def make_dataset(fastq_dir, samples, pairs, read_length=150, genome_size=1000000, seed=0):
+    os.makedirs(fastq_dir, exist_ok=True)
+    genome = random_sequence(genome_size, np.random.default_rng(seed))
+    names = []
+    for i in range(samples):
+        sample = f"SYN{i + 1:03d}"
+        write_fastq_pair(os.path.join(fastq_dir, f"{sample}_R1_001.fastq.gz"),
+                         os.path.join(fastq_dir, f"{sample}_R2_001.fastq.gz"), genome, pairs, read_length,
+                         mean_quality=34 if i % 2 == 0 else 18, seed=seed + i + 1)
+        names.append(sample)
+    return names, genome
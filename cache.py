@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import threading
+import time
+
+from fastq_io import index_path, load_index
+# Размер блока при вычислении контрольной суммы файла
+HASH_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def _atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            total += os.path.getsize(os.path.join(root, file))
+    return total
+
+
+# Контрольная сумма файла или всей папки (по относительным путям и содержимому файлов)
+def path_digest(path, file_digest=None):
+    if os.path.isdir(path):
+        digest = hashlib.sha256()
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for file in sorted(files):
+                file_path = os.path.join(root, file)
+                digest.update(os.path.relpath(file_path, path).encode())
+                digest.update((file_digest or path_digest)(file_path).encode())
+        return digest.hexdigest()
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Жёсткая ссылка, если файлы на одной файловой системе, иначе копия
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _place(src, dst):
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=_link_or_copy, dirs_exist_ok=True)
+    else:
+        _link_or_copy(src, dst)
+
+
+# Замена файла через временное имя: задача, которая читает прежний файл, дочитывает его целиком
+def _replace_file(src, dst):
+    tmp_path = f"{dst}.tmp{os.getpid()}.{threading.get_ident()}"
+    _link_or_copy(src, tmp_path)
+    os.replace(tmp_path, dst)
+
+
+# Кэш результатов этапов: ключ - контрольные суммы входных файлов, полная команда и версия программы.
+# При совпадении ключа выходные файлы и время выполнения восстанавливаются из кэша без запуска программы
+class ResultCache:
+    def __init__(self, cache_dir, quota_gb=500, max_age_days=30, version_commands=None):
+        self.cache_dir = cache_dir
+        self.entries_dir = os.path.join(cache_dir, 'entries')
+        self.quota_bytes = quota_gb * 1024 ** 3
+        self.max_age = max_age_days * 24 * 3600
+        self.version_commands = version_commands or {}
+        self._lock = threading.Lock()
+        self._versions = {}
+        os.makedirs(self.entries_dir, exist_ok=True)
+
+        # Контрольные суммы, запомненные по (размер, mtime), чтобы не пересчитывать их для больших FASTQ
+        self._digests_path = os.path.join(cache_dir, 'digests.json')
+        self._digests = {}
+        if os.path.exists(self._digests_path):
+            with open(self._digests_path) as f:
+                self._digests = json.load(f)
+
+    def tool_version(self, tool):
+        with self._lock:
+            if tool in self._versions:
+                return self._versions[tool]
+        command = self.version_commands.get(tool, f"{tool} --version")
+        try:
+            result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=120)
+            version = (result.stdout or result.stderr).strip().splitlines()[0]
+        except (subprocess.SubprocessError, IndexError):
+            version = 'unknown'
+        with self._lock:
+            self._versions[tool] = version
+        return version
+
+    def file_digest(self, path):
+        path = os.path.abspath(path)
+        if os.path.isdir(path):
+            return path_digest(path, self.file_digest)
+
+        stat = os.stat(path)
+        with self._lock:
+            known = self._digests.get(path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        digest = path_digest(path)
+        with self._lock:
+            self._digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    # sources - файлы исходного кода этапов, которые выполняются внутри Python (для них версия python3
+    # не меняется при правке кода этапа)
+    def key(self, signature, inputs, tool, sources=()):
+        digest = hashlib.sha256()
+        digest.update(signature.encode())
+        digest.update(self.tool_version(tool).encode())
+        for path in inputs:
+            digest.update(path.encode())
+            digest.update(self.file_digest(path).encode())
+        for path in sources:
+            digest.update(self.file_digest(path).encode())
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.entries_dir, key)
+
+    def _load_manifest(self, key):
+        manifest_path = os.path.join(self._entry_dir(key), 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    # Папка восстанавливается по файлам: изменившиеся файлы заменяются, недостающие добавляются,
+    # а сама папка и лишние файлы в ней не удаляются (в ней могут лежать и читаться файлы других задач)
+    def _restore_tree(self, stored, target):
+        for root, dirs, files in os.walk(stored):
+            target_root = os.path.join(target, os.path.relpath(root, stored))
+            os.makedirs(target_root, exist_ok=True)
+            for file in files:
+                stored_file, target_file = os.path.join(root, file), os.path.join(target_root, file)
+                if os.path.isfile(target_file) and self.file_digest(target_file) == self.file_digest(stored_file):
+                    continue
+                _replace_file(stored_file, target_file)
+
+    # Восстанавливает выходные файлы; возвращает записанное время выполнения или None, если записи нет.
+    # Папки никогда не удаляются целиком: если на месте файла результата оказалась папка, запись не используется
+    def restore(self, key, outputs):
+        manifest = self._load_manifest(key)
+        if manifest is None or [item['path'] for item in manifest['outputs']] != list(outputs):
+            return None
+
+        for item in manifest['outputs']:
+            stored = os.path.join(self._entry_dir(key), item['stored'])
+            # Сохранённая копия - жёсткая ссылка, её могли перезаписать на месте
+            if not os.path.exists(stored) or self.file_digest(stored) != item['digest']:
+                return None
+            if os.path.isdir(item['path']) and not os.path.isdir(stored):
+                return None
+
+        for item in manifest['outputs']:
+            stored = os.path.join(self._entry_dir(key), item['stored'])
+            target = item['path']
+            # Если файл на месте и не изменился, ничего не делаем
+            if os.path.exists(target) and self.file_digest(target) == item['digest']:
+                continue
+            os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+            if os.path.isdir(stored):
+                if os.path.lexists(target) and not os.path.isdir(target):
+                    os.remove(target)
+                self._restore_tree(stored, target)
+            else:
+                _replace_file(stored, target)
+
+        # Индексы gzip-членов (.idx) восстанавливаются вместе со своими файлами
+        for item in manifest['outputs']:
+            if item.get('index'):
+                _replace_file(os.path.join(self._entry_dir(key), item['index']), index_path(item['path']))
+
+        manifest['last_used'] = time.time()
+        _atomic_write_json(os.path.join(self._entry_dir(key), 'manifest.json'), manifest)
+        return manifest['elapsed_time']
+
+    def store(self, key, signature, outputs, elapsed_time):
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp{os.getpid()}.{threading.get_ident()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        items = []
+        for index, path in enumerate(outputs):
+            stored = f"output_{index}"
+            _place(path, os.path.join(tmp_dir, stored))
+            item = {'path': path, 'stored': stored, 'digest': self.file_digest(path), 'size': path_size(path)}
+            # Действующий индекс gzip-членов файла хранится рядом с ним
+            if os.path.isfile(path) and load_index(path) is not None:
+                item['index'] = index_path(stored)
+                _place(index_path(path), os.path.join(tmp_dir, item['index']))
+            items.append(item)
+
+        now = time.time()
+        manifest = {'key': key, 'signature': signature, 'outputs': items, 'elapsed_time': elapsed_time,
+                    'created': now, 'last_used': now, 'size': sum(item['size'] for item in items)}
+        _atomic_write_json(os.path.join(tmp_dir, 'manifest.json'), manifest)
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+        self.save_digests()
+        self.evict()
+
+    def save_digests(self):
+        with self._lock:
+            digests = dict(self._digests)
+        _atomic_write_json(self._digests_path, digests)
+
+    # Удаляем записи старше max_age, затем самые давно использованные, пока кэш не уложится в квоту
+    def evict(self):
+        with self._lock:
+            manifests = []
+            for key in os.listdir(self.entries_dir):
+                if '.tmp' in key:
+                    continue
+                manifest = self._load_manifest(key)
+                if manifest is not None:
+                    manifests.append(manifest)
+
+            now = time.time()
+            total_size = sum(manifest['size'] for manifest in manifests)
+            for manifest in sorted(manifests, key=lambda m: m['last_used']):
+                expired = now - manifest['last_used'] > self.max_age
+                if not expired and total_size <= self.quota_bytes:
+                    continue
+                print(f"Evicting cache entry {manifest['key'][:12]} ({manifest['size'] / 1024 ** 2:.1f} MB)")
+                shutil.rmtree(self._entry_dir(manifest['key']), ignore_errors=True)
+                total_size -= manifest['size']
@@ -0,0 +1,152 @@
+import csv
+import json
+import os
+import time
+
+import numpy as np
+
+from fastq_io import FastqBlockReader
+from fastq_qc import BATCH_RECORDS, FastqStats
+
+# Пороги по умолчанию для разделения образцов на good/bad
+DEFAULT_THRESHOLDS = {
+    'genome_size_mb': 1000,  # размер генома для оценки покрытия
+    'min_coverage': 10,
+    'min_mean_quality': 25,
+    'max_duplicate_percent': 60,
+    'min_insert_size': 0,  # 0 - не проверять
+}
+# Для оценки размера вставки берем первые пары прочтений
+INSERT_SAMPLE_PAIRS = 20000
+INSERT_SEED = 15
+CLASSIFICATION_SUFFIX = '_classification.json'
+SUMMARY_COLUMNS = ['sample', 'tier', 'coverage', 'mean_quality', 'duplicate_percent',
+                   'insert_size', 'overlapping_pairs_percent', 'reasons']
+
+_COMPLEMENT = bytes.maketrans(b'ACGTNacgtn', b'TGCANtgcan')
+
+
+# Размер вставки по перекрытию пары: начало обратно-комплементарного R2 ищется в R1.
+# Если фрагмент длиннее, чем R1 + R2, перекрытия нет и пара в оценку не попадает
+def _insert_sizes(seqs_R1, seqs_R2):
+    sizes = []
+    for seq_R1, seq_R2 in zip(seqs_R1, seqs_R2):
+        rc_R2 = seq_R2.translate(_COMPLEMENT)[::-1]
+        if len(rc_R2) < INSERT_SEED:
+            continue
+        position = seq_R1.find(rc_R2[:INSERT_SEED])
+        if position >= 0:
+            sizes.append(position + len(rc_R2))
+    return sizes
+
+
+def score_sample(input_file_R1, input_file_R2, genome_size_mb):
+    stats_R1, stats_R2 = FastqStats(), FastqStats()
+    reader_R1, reader_R2 = FastqBlockReader(input_file_R1), FastqBlockReader(input_file_R2)
+    insert_sizes = []
+    checked_pairs = 0
+    try:
+        while True:
+            block_R1 = reader_R1.read_records(BATCH_RECORDS)
+            if not block_R1:
+                break
+            block_R2 = reader_R2.read_records(block_R1.count(b'\n') // 4)
+            stats_R1.add_block(block_R1)
+            stats_R2.add_block(block_R2)
+            if checked_pairs < INSERT_SAMPLE_PAIRS:
+                seqs_R1 = block_R1.split(b'\n')[1::4][:INSERT_SAMPLE_PAIRS - checked_pairs]
+                seqs_R2 = block_R2.split(b'\n')[1::4][:len(seqs_R1)]
+                insert_sizes.extend(_insert_sizes(seqs_R1, seqs_R2))
+                checked_pairs += len(seqs_R1)
+    finally:
+        reader_R1.close()
+        reader_R2.close()
+
+    result_R1, result_R2 = stats_R1.result(input_file_R1), stats_R2.result(input_file_R2)
+    bases = result_R1['bases'] + result_R2['bases']
+    reads = result_R1['reads'] + result_R2['reads']
+    return {
+        'pairs': result_R1['reads'],
+        'bases': bases,
+        'coverage': bases / (genome_size_mb * 1e6),
+        'mean_quality': (result_R1['mean_quality'] * result_R1['bases'] +
+                         result_R2['mean_quality'] * result_R2['bases']) / bases if bases else 0.0,
+        'duplicate_percent': (result_R1['duplicate_percent'] * result_R1['reads'] +
+                              result_R2['duplicate_percent'] * result_R2['reads']) / reads if reads else 0.0,
+        'insert_size': float(np.median(insert_sizes)) if insert_sizes else None,
+        'overlapping_pairs_percent': 100 * len(insert_sizes) / checked_pairs if checked_pairs else 0.0,
+    }
+
+
+# Образец попадает в bad, если нарушен хотя бы один порог; возвращает группу и список причин
+def classify_metrics(metrics, thresholds):
+    reasons = []
+    if metrics['coverage'] < thresholds['min_coverage']:
+        reasons.append(f"coverage {metrics['coverage']:.1f} < {thresholds['min_coverage']}")
+    if metrics['mean_quality'] < thresholds['min_mean_quality']:
+        reasons.append(f"mean quality {metrics['mean_quality']:.1f} < {thresholds['min_mean_quality']}")
+    if metrics['duplicate_percent'] > thresholds['max_duplicate_percent']:
+        reasons.append(f"duplicates {metrics['duplicate_percent']:.1f}% > {thresholds['max_duplicate_percent']}%")
+    if thresholds['min_insert_size'] and metrics['insert_size'] is not None \
+            and metrics['insert_size'] < thresholds['min_insert_size']:
+        reasons.append(f"insert size {metrics['insert_size']:.0f} < {thresholds['min_insert_size']}")
+    return ('bad' if reasons else 'good'), reasons
+
+
+# Жёсткая ссылка (или символическая, если папки на разных файловых системах) на прочтения в папке группы
+def _link(source, target):
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        os.symlink(os.path.abspath(source), target)
+
+
+def classification_path(output_dir, sample):
+    return os.path.join(output_dir, sample + CLASSIFICATION_SUFFIX)
+
+
+# Оценка образца и размещение его прочтений в папке good или bad; возвращает время выполнения
+def classify_sample(sample, input_files, tier_dirs, output_dir, thresholds=None):
+    start_time = time.time()
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    metrics = score_sample(*input_files, thresholds['genome_size_mb'])
+    tier, reasons = classify_metrics(metrics, thresholds)
+
+    for name, tier_dir in tier_dirs.items():
+        os.makedirs(tier_dir, exist_ok=True)
+        for input_file in input_files:
+            target = os.path.join(tier_dir, os.path.basename(input_file))
+            if name == tier:
+                _link(input_file, target)
+            # Убираем ссылку из другой группы, если образец был классифицирован раньше иначе
+            elif os.path.lexists(target):
+                os.remove(target)
+
+    result = {'sample': sample, 'tier': tier, 'reasons': reasons, 'thresholds': thresholds, **metrics}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(classification_path(output_dir, sample), 'w') as f:
+        json.dump(result, f, indent=1)
+
+    elapsed_time = time.time() - start_time
+    print(f"Sample {sample} classified as {tier}" + (f" ({'; '.join(reasons)})" if reasons else ""))
+    return elapsed_time
+
+
+def write_classification_summary(output_dir, summary_file=None):
+    rows = []
+    for file_name in sorted(os.listdir(output_dir)):
+        if file_name.endswith(CLASSIFICATION_SUFFIX):
+            with open(os.path.join(output_dir, file_name)) as f:
+                result = json.load(f)
+            row = {column: result[column] for column in SUMMARY_COLUMNS}
+            row['reasons'] = '; '.join(row['reasons'])
+            rows.append(row)
+
+    summary_file = summary_file or os.path.join(output_dir, 'classification_summary.tsv')
+    with open(summary_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
@@ -0,0 +1,195 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fasta_norm import iter_chunks, open_fasta
+
+# Сборки читаются большими блоками
+CHUNK_SIZE = 16 * 1024 * 1024
+# Границы для распределения длин контигов
+LENGTH_BINS = [0, 500, 1000, 5000, 10000, 50000, 100000]
+# Пороги по умолчанию: сборки ниже порогов не передаются в QUAST и BUSCO (0 - не проверять)
+DEFAULT_THRESHOLDS = {
+    'min_total_length': 0,
+    'min_n50': 0,
+    'max_n_percent': 100,
+    'min_contigs': 1,
+}
+STATS_SUFFIX = '_contig_stats.json'
+PASS_SUFFIX = '.pass'
+SUMMARY_COLUMNS = ['assembly', 'contigs', 'total_length', 'largest_contig', 'n50', 'l50', 'ng50',
+                   'gc_percent', 'n_percent', 'passed', 'reasons']
+
+_GC = np.zeros(256, dtype=bool)
+_GC[list(b'GCgc')] = True
+_N = np.zeros(256, dtype=bool)
+_N[list(b'Nn')] = True
+
+
+# Длины контигов и число G/C и N за один проход по файлу (plain или gzip), без разбора на строки в Python
+def scan_fasta(path, chunk_size=CHUNK_SIZE):
+    lengths = []
+    current = 0  # длина контига, начатого в предыдущем блоке
+    started = False
+    gc = n = 0
+    with open_fasta(path) as handle:
+        for chunk in iter_chunks(handle, chunk_size):
+            data = np.frombuffer(chunk, dtype=np.uint8)
+            line_ends = np.flatnonzero(data == 10)
+            line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+            line_lengths = line_ends - line_starts
+            is_header = data[line_starts] == ord('>')
+            # Номер контига каждой строки внутри блока; 0 - продолжение контига из предыдущего блока
+            contig_index = np.cumsum(is_header)
+            sequence_lengths = np.where(is_header, 0, line_lengths)
+            # Символы \r в конце строки (файлы из Windows) не считаются основаниями
+            has_cr = (line_lengths > 0) & (data[np.maximum(line_ends - 1, 0)] == 13)
+            sequence_lengths = sequence_lengths - (has_cr & ~is_header)
+            per_contig = np.bincount(contig_index, weights=sequence_lengths, minlength=contig_index[-1] + 1)
+
+            current += int(per_contig[0])
+            if len(per_contig) > 1:
+                if started:
+                    lengths.append(np.array([current], dtype=np.int64))
+                lengths.append(per_contig[1:-1].astype(np.int64))
+                current = int(per_contig[-1])
+                started = True
+
+            # G/C и N считаются по всем байтам блока, кроме строк заголовков
+            header_bytes = np.repeat(is_header, line_lengths + 1)
+            gc += int(np.count_nonzero(_GC[data] & ~header_bytes))
+            n += int(np.count_nonzero(_N[data] & ~header_bytes))
+    if started:
+        lengths.append(np.array([current], dtype=np.int64))
+    lengths = np.concatenate(lengths) if lengths else np.zeros(0, dtype=np.int64)
+    return lengths, gc, n
+
+
+# Nx и Lx: минимальная длина контига (и число контигов), при которой суммарная длина достигает доли target
+def _nx(sorted_lengths, cumulative, target):
+    if not len(sorted_lengths) or cumulative[-1] < target:
+        return None, None
+    index = int(np.searchsorted(cumulative, target))
+    return int(sorted_lengths[index]), index + 1
+
+
+def contig_stats(path, genome_size=None, chunk_size=CHUNK_SIZE):
+    lengths, gc, n = scan_fasta(path, chunk_size)
+    sorted_lengths = np.sort(lengths)[::-1]
+    cumulative = np.cumsum(sorted_lengths)
+    total = int(cumulative[-1]) if len(cumulative) else 0
+    n50, l50 = _nx(sorted_lengths, cumulative, total / 2) if total else (None, None)
+    ng50, lg50 = _nx(sorted_lengths, cumulative, genome_size / 2) if genome_size else (None, None)
+    return {
+        'assembly': path,
+        'contigs': int(len(lengths)),
+        'total_length': total,
+        'largest_contig': int(sorted_lengths[0]) if len(sorted_lengths) else 0,
+        'n50': n50,
+        'l50': l50,
+        'ng50': ng50,
+        'lg50': lg50,
+        'gc_percent': round(100 * gc / (total - n), 2) if total > n else 0.0,
+        'n_percent': round(100 * n / total, 3) if total else 0.0,
+        # Число контигов не короче каждой границы, как "# contigs (>= N bp)" у QUAST
+        'length_distribution': {f">={low}": int(np.count_nonzero(lengths >= low)) for low in LENGTH_BINS},
+    }
+
+
+# Сборка проходит, если не нарушен ни один порог; возвращает признак и список причин
+def check_thresholds(stats, thresholds):
+    thresholds = {**DEFAULT_THRESHOLDS, **(thresholds or {})}
+    reasons = []
+    if stats['contigs'] < thresholds['min_contigs']:
+        reasons.append(f"{stats['contigs']} contigs < {thresholds['min_contigs']}")
+    if stats['total_length'] < thresholds['min_total_length']:
+        reasons.append(f"total length {stats['total_length']} < {thresholds['min_total_length']}")
+    if thresholds['min_n50'] and (stats['n50'] or 0) < thresholds['min_n50']:
+        reasons.append(f"N50 {stats['n50']} < {thresholds['min_n50']}")
+    if stats['n_percent'] > thresholds['max_n_percent']:
+        reasons.append(f"N {stats['n_percent']}% > {thresholds['max_n_percent']}%")
+    return not reasons, reasons
+
+
+def stats_json_path(output_dir, name):
+    return os.path.join(output_dir, name + STATS_SUFFIX)
+
+
+def pass_marker_path(output_dir, name):
+    return os.path.join(output_dir, name + PASS_SUFFIX)
+
+
+# Статистика одной сборки в JSON; если сборка прошла пороги, рядом создается файл-метка name.pass,
+# от которого зависят задачи QUAST и BUSCO. Возвращает время выполнения
+def assembly_gate(path, output_dir, name, thresholds=None, genome_size=None):
+    start_time = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+    stats = contig_stats(path, genome_size)
+    passed, reasons = check_thresholds(stats, thresholds)
+    stats.update({'name': name, 'passed': passed, 'reasons': reasons})
+    with open(stats_json_path(output_dir, name), 'w') as f:
+        json.dump(stats, f, indent=1)
+
+    marker = pass_marker_path(output_dir, name)
+    if passed:
+        open(marker, 'w').close()
+    else:
+        if os.path.exists(marker):
+            os.remove(marker)
+        print(f"Assembly {name} is below thresholds, skipping QUAST/BUSCO: {'; '.join(reasons)}")
+    return time.time() - start_time
+
+
+# Статистика нескольких сборок в пуле процессов; возвращает список словарей в том же порядке
+def contig_stats_files(paths, genome_size=None, workers=4):
+    if workers <= 1 or len(paths) <= 1:
+        return [contig_stats(path, genome_size) for path in paths]
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=context) as executor:
+        return list(executor.map(contig_stats, paths, [genome_size] * len(paths)))
+
+
+# Отбор сборок перед QUAST/BUSCO: статистика пишется в contig_stats.tsv в output_dir,
+# возвращаются только сборки, прошедшие пороги
+def filter_assemblies(paths, output_dir, thresholds=None, genome_size=None, workers=4):
+    rows, passed_paths = [], []
+    for stats in contig_stats_files(paths, genome_size, workers):
+        passed, reasons = check_thresholds(stats, thresholds)
+        stats.update({'passed': passed, 'reasons': reasons})
+        rows.append(summary_row(stats))
+        if passed:
+            passed_paths.append(stats['assembly'])
+        else:
+            print(f"Skipping {stats['assembly']}: {'; '.join(reasons)}")
+    os.makedirs(output_dir, exist_ok=True)
+    _write_tsv(os.path.join(output_dir, 'contig_stats.tsv'), rows)
+    return passed_paths
+
+
+def summary_row(stats):
+    row = {column: stats.get(column) for column in SUMMARY_COLUMNS}
+    row['assembly'] = stats.get('name') or stats['assembly']
+    row['reasons'] = '; '.join(row['reasons'] or [])
+    return row
+
+
+def _write_tsv(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_contig_stats_summary(output_dir, summary_file=None):
+    rows = []
+    for file_name in sorted(os.listdir(output_dir)):
+        if file_name.endswith(STATS_SUFFIX):
+            with open(os.path.join(output_dir, file_name)) as f:
+                rows.append(summary_row(json.load(f)))
+    _write_tsv(summary_file or os.path.join(output_dir, 'contig_stats_summary.tsv'), rows)
+    return rows
@@ -0,0 +1,219 @@
+import itertools
+import json
+import multiprocessing
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from profiler import current_tags, profile_command, task_context
+from scheduler import ResourceScheduler
+
+EXECUTORS = ('local', 'pool', 'slurm', 'fake-slurm')
+# Ресурсы задачи, если они не заданы в task_context (команды вне графа и вне run_jobs)
+DEFAULT_CORES = 1
+DEFAULT_MEM_GB = 4
+# Интервал опроса очереди (с) и время ожидания файла результата после того, как задача исчезла из очереди
+POLL_INTERVAL = 10
+LOST_JOB_GRACE = 60
+
+
+# Команда выполняется на этом узле в отдельном потоке оболочки
+class LocalExecutor:
+    def run(self, command, timeout=None):
+        return profile_command(command, timeout=timeout)
+
+
+def _profile_with_tags(command, tags, timeout=None):
+    with task_context(**tags):
+        return profile_command(command, timeout=timeout)
+
+
+# Команды выполняются в пуле процессов этого узла: замер ресурсов и ожидание потомков идут в
+# процессах пула, а не в потоках основного процесса
+class PoolExecutor:
+    def __init__(self, workers):
+        context = multiprocessing.get_context('forkserver')
+        self.pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+    def run(self, command, timeout=None):
+        return self.pool.submit(_profile_with_tags, command, current_tags(), timeout).result()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+# Очередь SLURM: sbatch для отправки скрипта, squeue для проверки, что задача еще в очереди или выполняется
+class SlurmScheduler:
+    def __init__(self, partition=None, account=None):
+        self.partition = partition
+        self.account = account
+
+    # Предел времени очереди чуть больше предела команды, чтобы команда успела записать результат
+    def directives(self, name, cores, mem_gb, log_file, timeout=None):
+        lines = [f"#SBATCH --job-name={name}", f"#SBATCH --cpus-per-task={cores}",
+                 f"#SBATCH --mem={int(mem_gb)}G", f"#SBATCH --output={log_file}"]
+        if timeout:
+            lines.append(f"#SBATCH --time={int(timeout // 60) + 5}")
+        if self.partition:
+            lines.append(f"#SBATCH --partition={self.partition}")
+        if self.account:
+            lines.append(f"#SBATCH --account={self.account}")
+        return lines
+
+    def submit(self, script, cores, mem_gb):
+        output = subprocess.run(['sbatch', '--parsable', script], check=True, capture_output=True, text=True)
+        return output.stdout.strip().split(';')[0]
+
+    def is_active(self, job_id):
+        output = subprocess.run(['squeue', '-h', '-j', job_id, '-o', '%T'], capture_output=True, text=True)
+        return bool(output.stdout.strip())
+
+
+# Локальная замена очереди для проверки без кластера: скрипты ждут свободных ядер и памяти
+# в собственном бюджете (как задачи в очереди) и выполняются через bash
+class FakeScheduler:
+    def __init__(self, total_cores, total_mem_gb, queue_delay=0):
+        self.resources = ResourceScheduler(total_cores, total_mem_gb)
+        self.queue_delay = queue_delay
+        self.counter = itertools.count(1)
+        self.active = set()
+        self.lock = threading.Lock()
+
+    def directives(self, name, cores, mem_gb, log_file, timeout=None):
+        return [f"# job-name={name} cores={cores} mem={mem_gb}G time={timeout} output={log_file}"]
+
+    def _run(self, job_id, script, cores, mem_gb, log_file):
+        try:
+            time.sleep(self.queue_delay)
+            self.resources.acquire(cores, mem_gb)
+            try:
+                with open(log_file, 'w') as log:
+                    subprocess.run(['bash', script], stdout=log, stderr=subprocess.STDOUT)
+            finally:
+                self.resources.release(cores, mem_gb)
+        finally:
+            with self.lock:
+                self.active.discard(job_id)
+
+    def submit(self, script, cores, mem_gb):
+        job_id = str(next(self.counter))
+        with self.lock:
+            self.active.add(job_id)
+        log_file = os.path.splitext(script)[0] + '.log'
+        threading.Thread(target=self._run, args=(job_id, script, cores, mem_gb, log_file), daemon=True).start()
+        return job_id
+
+    def is_active(self, job_id):
+        with self.lock:
+            return job_id in self.active
+
+
+# Команды отправляются в очередь пакетного планировщика: для каждой пишется скрипт с запросом ресурсов
+# (ядра и память из task_context), который на узле кластера запускает команду через этот модуль
+# с замером ресурсов. Запись профиля с кодом возврата сохраняется в JSON рядом со скриптом; run()
+# ждет этот файл, опрашивая очередь. Папка job_dir должна быть общей для узлов
+class BatchExecutor:
+    def __init__(self, scheduler, job_dir, poll_interval=POLL_INTERVAL, lost_job_grace=LOST_JOB_GRACE):
+        self.scheduler = scheduler
+        self.job_dir = job_dir
+        self.poll_interval = poll_interval
+        self.lost_job_grace = lost_job_grace
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        os.makedirs(job_dir, exist_ok=True)
+
+    def _job_name(self, tags):
+        with self.lock:
+            number = next(self.counter)
+        parts = [tags.get('stage'), tags.get('tier'), tags.get('sample')]
+        label = '_'.join(str(part) for part in parts if part) or 'command'
+        return f"{os.getpid()}_{number:05d}_{label}"
+
+    def write_script(self, command, tags, timeout=None):
+        name = self._job_name(tags)
+        cores = tags.get('cores') or DEFAULT_CORES
+        mem_gb = tags.get('mem_gb') or DEFAULT_MEM_GB
+        base = os.path.join(os.path.abspath(self.job_dir), name)
+        with open(base + '.cmd', 'w') as f:
+            f.write(command)
+        with open(base + '.tags.json', 'w') as f:
+            json.dump(tags, f)
+        lines = ['#!/bin/bash'] + self.scheduler.directives(name, cores, mem_gb, base + '.log', timeout) + [
+            f"cd {shlex.quote(os.getcwd())}",
+            f"{shlex.quote(sys.executable)} {shlex.quote(os.path.abspath(__file__))} "
+            f"{shlex.quote(base + '.cmd')} {shlex.quote(base + '.record.json')}" + (f" {timeout}" if timeout else ""),
+        ]
+        with open(base + '.sh', 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return base, cores, mem_gb
+
+    def _wait(self, job_id, record_file):
+        lost_since = None
+        while not os.path.exists(record_file):
+            if self.scheduler.is_active(job_id):
+                lost_since = None
+            else:
+                # Файл на общей папке может появиться с задержкой; если его так и нет, задача снята или упала
+                lost_since = lost_since or time.time()
+                if time.time() - lost_since > self.lost_job_grace:
+                    return None
+            time.sleep(self.poll_interval)
+        with open(record_file) as f:
+            return json.load(f)
+
+    def run(self, command, timeout=None):
+        tags = current_tags()
+        base, cores, mem_gb = self.write_script(command, tags, timeout)
+        submitted = time.time()
+        job_id = self.scheduler.submit(base + '.sh', cores, mem_gb)
+        print(f"Submitted job {job_id}: {os.path.basename(base)} ({cores} cores, {mem_gb} GB)")
+        record = self._wait(job_id, base + '.record.json')
+        if record is None:
+            print(f"Job {job_id} left the queue without a result, see {base}.log")
+            record = {'stage': tags.get('stage'), 'tier': tags.get('tier'), 'sample': tags.get('sample'),
+                      'tool': tags.get('tool'), 'command': command, 'wall_s': 0.0, 'user_s': 0.0, 'sys_s': 0.0, 'cpu_cores': 0.0,
+                      'peak_rss_mb': 0.0, 'read_mb': 0.0, 'write_mb': 0.0, 'exit_code': -1,
+                      'timed_out': False}
+        # Время ожидания в очереди хранится отдельно от времени выполнения
+        record['queue_s'] = round(max(time.time() - submitted - record['wall_s'], 0.0), 2)
+        return record['exit_code'], record
+
+
+def make_executor(name, job_dir=None, workers=None, total_cores=None, total_mem_gb=None, partition=None,
+                  account=None, poll_interval=POLL_INTERVAL):
+    if name == 'local':
+        return LocalExecutor()
+    if name == 'pool':
+        return PoolExecutor(workers or os.cpu_count())
+    if name == 'slurm':
+        return BatchExecutor(SlurmScheduler(partition, account), job_dir, poll_interval)
+    if name == 'fake-slurm':
+        return BatchExecutor(FakeScheduler(total_cores, total_mem_gb), job_dir, min(poll_interval, 0.2),
+                             lost_job_grace=0)
+    raise ValueError(f"Unknown executor: {name} (expected one of {', '.join(EXECUTORS)})")
+
+
+# Запуск на узле кластера из скрипта задачи: команда из файла .cmd, метки из .tags.json рядом,
+# запись профиля - атомарно в record_file
+def _run_job(command_file, record_file, timeout=None):
+    with open(command_file) as f:
+        command = f.read()
+    tags_file = command_file[:-len('.cmd')] + '.tags.json'
+    tags = {}
+    if os.path.exists(tags_file):
+        with open(tags_file) as f:
+            tags = json.load(f)
+    returncode, record = _profile_with_tags(command, tags, timeout)
+    tmp_file = record_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(record, f, ensure_ascii=False)
+    os.replace(tmp_file, record_file)
+    return returncode
+
+
+if __name__ == '__main__':
+    sys.exit(_run_job(sys.argv[1], sys.argv[2], float(sys.argv[3]) if len(sys.argv) > 3 else None))
@@ -0,0 +1,147 @@
+import gzip
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+# Файл читается блоками фиксированного размера, выровненными по концу строки
+CHUNK_SIZE = 1024 * 1024
+# '*' (неизвестный нуклеотид у NOVOPlasty) заменяется на 'N'
+AMBIGUITY_TABLE = bytes.maketrans(b'*', b'N')
+HEADER_PATTERN = re.compile(rb'^>[^\n]*', re.MULTILINE)
+
+
+def open_fasta(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def iter_chunks(handle, chunk_size=CHUNK_SIZE):
+    rest = b''
+    while True:
+        data = handle.read(chunk_size)
+        if not data:
+            break
+        data = rest + data
+        cut = data.rfind(b'\n') + 1
+        if cut == 0:
+            rest = data
+            continue
+        rest = data[cut:]
+        yield data[:cut]
+    if rest:
+        yield rest + b'\n'
+
+
+# Повторяющиеся заголовки получают номер: >contig, >contig(2), >contig(3), ...
+class HeaderRenamer:
+    def __init__(self):
+        self.seen_counts = {}
+
+    def __call__(self, header):
+        count = self.seen_counts.get(header, 0) + 1
+        self.seen_counts[header] = count
+        if count == 1:
+            return header
+        return header.rstrip() + b'(%d)' % count
+
+
+# Без переноса строк и фильтра по длине: блоки пишутся как есть, меняются только заголовки-дубликаты
+def _stream_chunks(chunks, write, renamer):
+    for chunk in chunks:
+        if renamer is None:
+            write(chunk)
+            continue
+        pieces, position = [], 0
+        for match in HEADER_PATTERN.finditer(chunk):
+            header = match.group()
+            renamed = renamer(header)
+            if renamed is not header:
+                pieces.append(chunk[position:match.start()])
+                pieces.append(renamed)
+                position = match.end()
+        pieces.append(chunk[position:])
+        write(b''.join(pieces))
+
+
+def _write_record(write, header, parts, renamer, line_width, min_length):
+    sequence = b''.join(parts)
+    if header is not None and len(sequence) < min_length:
+        return
+    if header is not None:
+        write((renamer(header) if renamer else header) + b'\n')
+    if line_width:
+        for start in range(0, len(sequence), line_width):
+            write(sequence[start:start + line_width] + b'\n')
+    elif sequence:
+        write(sequence + b'\n')
+
+
+# С переносом строк или фильтром по длине нужна вся последовательность записи (но не весь файл)
+def _stream_records(chunks, write, renamer, line_width, min_length):
+    header, parts = None, []
+    for chunk in chunks:
+        for line in chunk.split(b'\n')[:-1]:
+            if line.startswith(b'>'):
+                if header is not None or parts:
+                    _write_record(write, header, parts, renamer, line_width, min_length)
+                header, parts = line, []
+            else:
+                parts.append(line.strip())
+    if header is not None or parts:
+        _write_record(write, header, parts, renamer, line_width, min_length)
+
+
+# Нужна ли нормализация: есть '*' или повторяющиеся заголовки (файл читается, но не переписывается)
+def needs_normalization(path, chunk_size=CHUNK_SIZE):
+    headers = set()
+    with open_fasta(path) as handle:
+        for chunk in iter_chunks(handle, chunk_size):
+            if b'*' in chunk:
+                return True
+            for match in HEADER_PATTERN.finditer(chunk):
+                header = match.group()
+                if header in headers:
+                    return True
+                headers.add(header)
+    return False
+
+
+# Потоковая нормализация FASTA: '*' -> 'N', уникальные заголовки, по желанию перенос строк (line_width)
+# и удаление последовательностей короче min_length. Память не зависит от размера файла
+def normalize_fasta(input_file, output_file, unique_headers=True, line_width=None, min_length=0,
+                    chunk_size=CHUNK_SIZE):
+    renamer = HeaderRenamer() if unique_headers else None
+    tmp_file = output_file + '.tmp'
+    with open_fasta(input_file) as handle, open(tmp_file, 'wb') as out:
+        chunks = (chunk.translate(AMBIGUITY_TABLE) for chunk in iter_chunks(handle, chunk_size))
+        if line_width or min_length:
+            _stream_records(chunks, out.write, renamer, line_width, min_length)
+        else:
+            _stream_chunks(chunks, out.write, renamer)
+    os.replace(tmp_file, output_file)
+    return output_file
+
+
+def normalized_path(input_file, output_dir):
+    name = os.path.basename(input_file)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    return os.path.join(output_dir, name)
+
+
+# Нормализация пар (входной файл, выходной файл) в пуле процессов
+def normalize_to(input_files, output_files, workers=4, **options):
+    normalize = partial(normalize_fasta, **options)
+    if workers <= 1 or len(input_files) <= 1:
+        return [normalize(input_file, output_file) for input_file, output_file in zip(input_files, output_files)]
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=min(workers, len(input_files)), mp_context=context) as executor:
+        return list(executor.map(normalize, input_files, output_files))
+
+
+# Нормализация нескольких файлов в папку output_dir; возвращает пути к новым файлам в том же порядке
+def normalize_files(input_files, output_dir, workers=4, **options):
+    os.makedirs(output_dir, exist_ok=True)
+    output_files = [normalized_path(path, output_dir) for path in input_files]
+    return normalize_to(input_files, output_files, workers, **options)
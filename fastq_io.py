@@ -0,0 +1,382 @@
+import json
+import os
+import queue
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Размер несжатого блока, который сжимается в отдельный gzip-член
+BLOCK_SIZE = 4 * 1024 * 1024
+GZIP_LEVEL = 6
+# Индекс gzip-членов хранится рядом с файлом
+INDEX_SUFFIX = '.idx'
+# zlib: wbits=31 - формат gzip; 47 - автоопределение gzip/zlib при распаковке
+GZIP_WBITS = 31
+GUNZIP_WBITS = 47
+# Размер заголовка члена BGZF
+BGZF_HEADER = 18
+
+
+def compress_block(data, level=GZIP_LEVEL):
+    return zlib.compress(data, level, wbits=GZIP_WBITS)
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+# Индекс: для каждого gzip-члена - смещение в файле, сжатый размер, несжатый размер и число записей FASTQ
+def load_index(path):
+    idx = index_path(path)
+    if not path.endswith('.gz') or not os.path.exists(idx):
+        return None
+    if os.path.getmtime(idx) < os.path.getmtime(path):
+        return None
+    with open(idx) as f:
+        index = json.load(f)
+    if index.get('size') != os.path.getsize(path):
+        return None
+    return index['members']
+
+
+# Запись многочленного gzip: блоки сжимаются параллельно в пуле потоков (zlib отпускает GIL),
+# а в файл пишутся строго по порядку. Рядом пишется индекс членов
+class BlockGzipWriter:
+    def __init__(self, path, threads=4, level=GZIP_LEVEL, block_size=BLOCK_SIZE):
+        self.path = path
+        self.level = level
+        self.block_size = block_size
+        self.handle = open(path, 'wb')
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.max_pending = 2 * threads
+        self.pending = deque()
+        self.buffer = []
+        self.buffer_size = 0
+        self.buffer_records = 0
+        self.members = []
+        self.offset = 0
+
+    # data должна заканчиваться на границе записи, если передано records
+    def write(self, data, records=0):
+        self.buffer.append(data)
+        self.buffer_size += len(data)
+        self.buffer_records += records
+        if self.buffer_size >= self.block_size:
+            self._submit_buffer()
+
+    # Уже сжатый gzip-член (например, из процесса-обработчика)
+    def write_member(self, compressed, size, records=0):
+        self._submit_buffer()
+        self._enqueue(compressed, size, records)
+
+    def _submit_buffer(self):
+        if not self.buffer:
+            return
+        data = b''.join(self.buffer)
+        self._enqueue(self.pool.submit(compress_block, data, self.level), len(data), self.buffer_records)
+        self.buffer, self.buffer_size, self.buffer_records = [], 0, 0
+
+    def _enqueue(self, compressed, size, records):
+        self.pending.append((compressed, size, records))
+        while len(self.pending) > self.max_pending:
+            self._write_next()
+
+    def _write_next(self):
+        compressed, size, records = self.pending.popleft()
+        if not isinstance(compressed, bytes):
+            compressed = compressed.result()
+        if not compressed:
+            return
+        self.handle.write(compressed)
+        self.members.append([self.offset, len(compressed), size, records])
+        self.offset += len(compressed)
+
+    def close(self):
+        self._submit_buffer()
+        while self.pending:
+            self._write_next()
+        self.pool.shutdown()
+        self.handle.close()
+        with open(index_path(self.path), 'w') as f:
+            json.dump({'size': self.offset, 'members': self.members}, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _read_member(handle, offset, size):
+    handle.seek(offset)
+    return handle.read(size)
+
+
+def _decompress_member(data):
+    return zlib.decompress(data, GUNZIP_WBITS)
+
+
+# Распаковка нескольких gzip-членов подряд (zlib.decompress распаковывает только первый)
+def _decompress_members(data):
+    parts = []
+    while data:
+        decompressor = zlib.decompressobj(GUNZIP_WBITS)
+        parts.append(decompressor.decompress(data))
+        if not decompressor.eof:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+        data = decompressor.unused_data
+    return b''.join(parts)
+
+
+# Результаты func(item) по порядку: items обрабатываются в пуле потоков, не более read_ahead наперед
+def _ordered_map(func, items, threads, read_ahead):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(pool.submit(func, item))
+                if len(pending) >= read_ahead:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+            if hasattr(items, 'close'):
+                items.close()
+
+
+# Итератор items в фоновом потоке с очередью на read_ahead элементов: чтение и распаковка идут
+# одновременно с обработкой
+def _prefetch(items, read_ahead):
+    queue_ = queue.Queue(maxsize=read_ahead)
+    stop = threading.Event()
+    end = object()
+
+    def producer():
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                queue_.put(item)
+            queue_.put(end)
+        except Exception as e:
+            queue_.put(e)
+        finally:
+            if hasattr(items, 'close'):
+                items.close()
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = queue_.get()
+            if item is end:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        # Освобождаем место в очереди, чтобы поток чтения мог завершиться
+        while thread.is_alive():
+            try:
+                queue_.get_nowait()
+            except queue.Empty:
+                thread.join(0.01)
+
+
+# Распаковка членов [first, last) по индексу в пуле потоков с ограниченным опережающим чтением
+def _iter_indexed(path, members, first, last, threads, read_ahead):
+    with open(path, 'rb') as handle:
+        compressed = (_read_member(handle, offset, size) for offset, size, _, _ in members[first:last])
+        yield from _ordered_map(_decompress_member, compressed, threads, read_ahead)
+
+
+# Член BGZF (bgzip, samtools и многие программы секвенаторов): gzip с подполем BC, в котором записан
+# размер члена, поэтому границы членов известны без распаковки
+def _bgzf_member_size(data, offset):
+    header = data[offset:offset + BGZF_HEADER]
+    if (len(header) < BGZF_HEADER or header[:4] != b'\x1f\x8b\x08\x04' or header[10:12] != b'\x06\x00'
+            or header[12:16] != b'BC\x02\x00'):
+        return None
+    return int.from_bytes(header[16:18], 'little') + 1
+
+
+def is_bgzf(path):
+    with open(path, 'rb') as f:
+        return _bgzf_member_size(f.read(BGZF_HEADER), 0) is not None
+
+
+# Сжатые данные файла BGZF пачками целых членов примерно по block_size байт
+def _bgzf_batches(path, block_size=BLOCK_SIZE):
+    with open(path, 'rb') as handle:
+        rest = b''
+        while True:
+            chunk = handle.read(block_size)
+            if not chunk:
+                break
+            data = rest + chunk
+            end = 0
+            while end < len(data):
+                size = _bgzf_member_size(data, end)
+                if size is None:
+                    if len(data) - end >= BGZF_HEADER:
+                        raise ValueError(f"{path}: gzip member at offset {handle.tell() - len(data) + end} "
+                                         "is not BGZF")
+                    break
+                if end + size > len(data):
+                    break
+                end += size
+            if end:
+                yield data[:end]
+            rest = data[end:]
+        if rest:
+            raise EOFError(f"{path}: truncated BGZF member at the end of the file")
+
+
+def _read_raw(path, block_size=BLOCK_SIZE):
+    with open(path, 'rb') as handle:
+        yield from iter(lambda: handle.read(block_size), b'')
+
+
+# Потоковая распаковка gzip (в том числе многочленного) по сжатым блокам; контрольную сумму проверяет zlib
+def _inflate(chunks):
+    decompressor = zlib.decompressobj(GUNZIP_WBITS)
+    started = False
+    for chunk in chunks:
+        while chunk:
+            started = True
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(GUNZIP_WBITS)
+            started = False
+    if started:
+        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+
+
+# Файл без индекса (например, от Illumina). BGZF распаковывается параллельно по членам, как файл с индексом.
+# Обычный gzip - один поток сжатых данных, который не делится на части без распаковки, поэтому чтение файла
+# и распаковка идут в двух фоновых потоках одновременно друг с другом и с обработкой
+def _iter_stream(path, threads, read_ahead):
+    if not path.endswith('.gz'):
+        return _prefetch(_read_raw(path), read_ahead)
+    if is_bgzf(path):
+        return _ordered_map(_decompress_members, _prefetch(_bgzf_batches(path), read_ahead), threads, read_ahead)
+    return _prefetch(_inflate(_prefetch(_read_raw(path), read_ahead)), read_ahead)
+
+
+# Несжатые блоки файла по порядку; member_range=(first, last) - только часть файла по индексу
+def iter_blocks(path, threads=4, read_ahead=8, member_range=None):
+    members = load_index(path)
+    if members is not None:
+        first, last = member_range or (0, len(members))
+        return _iter_indexed(path, members, first, last, threads, read_ahead)
+    if member_range is not None:
+        raise ValueError(f"{path} has no gzip member index")
+    return _iter_stream(path, threads, read_ahead)
+
+
+# Деление пары R1/R2 на n частей по границам членов, в которых совпадает число записей в R1 и R2.
+# Возвращает список ((first, last) для R1, (first, last) для R2) или None, если индекса нет
+def split_pair(path_R1, path_R2, parts):
+    members_R1, members_R2 = load_index(path_R1), load_index(path_R2)
+    if members_R1 is None or members_R2 is None:
+        return None
+
+    # Общие границы: номера записей, на которых заканчивается член и в R1, и в R2
+    ends_R1 = {records: i + 1 for i, records in enumerate(np.cumsum([m[3] for m in members_R1]).tolist())}
+    ends_R2 = {records: i + 1 for i, records in enumerate(np.cumsum([m[3] for m in members_R2]).tolist())}
+    common = sorted(set(ends_R1) & set(ends_R2))
+    if not common or common[-1] != sum(m[3] for m in members_R1):
+        return None
+
+    total = common[-1]
+    ranges = []
+    start_R1 = start_R2 = 0
+    for part in range(1, parts + 1):
+        target = total * part / parts
+        boundary = next(records for records in common if records >= target)
+        end_R1, end_R2 = ends_R1[boundary], ends_R2[boundary]
+        if end_R1 > start_R1:
+            ranges.append(((start_R1, end_R1), (start_R2, end_R2)))
+            start_R1, start_R2 = end_R1, end_R2
+    return ranges
+
+
+# Чтение FASTQ блоками по целому числу записей (по 4 строки на запись).
+# Непрочитанный остаток хранится как список блоков с числом строк в каждом и смещением в первом блоке:
+# каждый вызов просматривает только отдаваемые данные, а не весь накопленный буфер
+class FastqBlockReader:
+    def __init__(self, path, threads=4, read_ahead=8, member_range=None):
+        self.name = path
+        self.blocks = iter_blocks(path, threads, read_ahead, member_range)
+        self.chunks = deque()  # [данные, смещение начала непрочитанной части, число строк в ней]
+        self.newlines = 0
+        self.eof = False
+
+    def _fill(self):
+        data = next(self.blocks, None)
+        if data is None:
+            self.eof = True
+            if self.chunks and not self.chunks[-1][0].endswith(b'\n'):
+                self.chunks.append([b'\n', 0, 1])
+                self.newlines += 1
+            return
+        count = data.count(b'\n')
+        self.chunks.append([data, 0, count])
+        self.newlines += count
+
+    # Позиция после needed-го перевода строки блока начиная со start (в блоке count >= needed строк).
+    # Просматривается окно по средней длине строки в блоке с запасом (при нехватке окно удваивается),
+    # а не весь остаток блока
+    @staticmethod
+    def _cut(data, start, count, needed):
+        window = int(needed * (len(data) - start) / count * 1.25) + 1024
+        while True:
+            end = min(start + window, len(data))
+            newline_positions = np.flatnonzero(np.frombuffer(data, dtype=np.uint8, count=end - start,
+                                                             offset=start) == 10)
+            if len(newline_positions) >= needed:
+                return start + int(newline_positions[needed - 1]) + 1
+            window *= 2
+
+    # Ровно n записей (меньше - только в конце файла)
+    def read_records(self, n):
+        needed = 4 * n
+        while not self.eof and self.newlines < needed:
+            self._fill()
+        if self.newlines < needed:
+            if self.newlines % 4:
+                raise ValueError(f"Truncated FASTQ record at the end of {self.name}")
+            needed = self.newlines
+        if needed == 0:
+            return b''
+        self.newlines -= needed
+        parts = []
+        while needed:
+            chunk = self.chunks[0]
+            data, start, count = chunk
+            if count < needed:
+                parts.append(memoryview(data)[start:])
+                needed -= count
+                self.chunks.popleft()
+                continue
+            cut = self._cut(data, start, count, needed)
+            parts.append(memoryview(data)[start:cut])
+            if cut < len(data):
+                chunk[1], chunk[2] = cut, count - needed
+            else:
+                self.chunks.popleft()
+            needed = 0
+        return b''.join(parts)
+
+    def close(self):
+        self.blocks.close()
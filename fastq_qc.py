@@ -0,0 +1,235 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fastq_io import FastqBlockReader
+
+PHRED_OFFSET = 33
+MAX_QUALITY = 64
+# Количество записей, которые обрабатываются за один раз
+BATCH_RECORDS = 100000
+# HyperLogLog для оценки числа уникальных последовательностей: 2**14 регистров (16 КБ памяти на файл)
+HLL_PRECISION = 14
+QC_SUFFIX = '_qc.json'
+SUMMARY_COLUMNS = ['file', 'reads', 'bases', 'mean_length', 'mean_quality', 'q30_percent',
+                   'gc_percent', 'n_percent', 'duplicate_percent']
+
+
+def _fastq_name(path):
+    name = os.path.basename(path)
+    for suffix in ('.gz', '.fastq', '.fq'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+
+# Множитель полиномиального хеша последовательностей (нечетный, арифметика по модулю 2**64)
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+
+# Финальное перемешивание splitmix64: младшие и старшие биты хеша зависят от всех битов входа
+def _mix64(values):
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+# 64-битные хеши последовательностей пакета, одинаковые во всех процессах и запусках (встроенный hash()
+# для bytes зависит от PYTHONHASHSEED). bases - основания всех прочтений подряд, offsets и lengths -
+# начало и длина каждого прочтения, positions - номер основания внутри прочтения
+def sequence_hashes(bases, offsets, lengths, positions):
+    powers = np.cumprod(np.full(int(lengths.max()) + 1, HASH_MULTIPLIER, dtype=np.uint64))
+    terms = bases.astype(np.uint64) * powers[positions]
+    hashes = np.zeros(len(lengths), dtype=np.uint64)
+    nonempty = lengths > 0
+    if nonempty.any():
+        hashes[nonempty] = np.add.reduceat(terms, offsets[nonempty])
+    return _mix64(hashes ^ lengths.astype(np.uint64))
+
+
+# Скетч HyperLogLog: память не зависит от числа прочтений
+class DistinctSketch:
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        hashes = hashes.astype(np.uint64)
+        index = (hashes & np.uint64((1 << self.precision) - 1)).astype(np.int64)
+        rest = hashes >> np.uint64(self.precision)
+        bits = 64 - self.precision
+        # Ранг - позиция старшей единицы, считая слева (число ведущих нулей + 1)
+        bit_length = np.zeros(len(rest), dtype=np.uint8)
+        for k in range(bits):
+            bit_length += (rest >= np.uint64(1 << k)).astype(np.uint8)
+        rank = (bits + 1 - bit_length).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = np.count_nonzero(self.registers == 0)
+        # Поправка для малых значений (linear counting)
+        if raw <= 2.5 * m and zeros:
+            return m * np.log(m / zeros)
+        return raw
+
+
+# Накопитель статистики по одному файлу за один проход
+class FastqStats:
+    def __init__(self):
+        self.reads = 0
+        self.quality_counts = np.zeros((0, MAX_QUALITY), dtype=np.int64)  # [позиция, качество]
+        self.n_counts = np.zeros(0, dtype=np.int64)
+        self.length_counts = np.zeros(0, dtype=np.int64)
+        self.gc_counts = np.zeros(101, dtype=np.int64)  # распределение GC (%) по прочтениям
+        self.gc_bases = 0
+        self.sketch = DistinctSketch()
+
+    def _grow(self, length):
+        if length > len(self.n_counts):
+            extra = length - len(self.n_counts)
+            self.quality_counts = np.vstack([self.quality_counts, np.zeros((extra, MAX_QUALITY), dtype=np.int64)])
+            self.n_counts = np.concatenate([self.n_counts, np.zeros(extra, dtype=np.int64)])
+
+    def add_block(self, block):
+        lines = block.split(b'\n')
+        seqs = lines[1::4]
+        quals = lines[3::4]
+        if not seqs:
+            return
+
+        lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+        max_length = int(lengths.max())
+        self._grow(max_length)
+        self.reads += len(seqs)
+
+        # Номер позиции каждого основания внутри своего прочтения
+        offsets = np.zeros(len(seqs), dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+        positions = np.arange(int(lengths.sum()), dtype=np.int64) - np.repeat(offsets, lengths)
+
+        q = np.frombuffer(b''.join(quals), dtype=np.uint8).astype(np.int64) - PHRED_OFFSET
+        q = np.clip(q, 0, MAX_QUALITY - 1)
+        counts = np.bincount(positions * MAX_QUALITY + q, minlength=max_length * MAX_QUALITY)
+        self.quality_counts[:max_length] += counts.reshape(max_length, MAX_QUALITY)
+
+        bases = np.frombuffer(b''.join(seqs), dtype=np.uint8)
+        self.n_counts[:max_length] += np.bincount(positions[(bases == ord('N')) | (bases == ord('n'))],
+                                                  minlength=max_length)
+
+        is_gc = np.isin(bases, np.frombuffer(b'GCgc', dtype=np.uint8))
+        nonempty = lengths > 0
+        gc_per_read = np.add.reduceat(is_gc.astype(np.int64), offsets[nonempty]) if nonempty.any() else np.zeros(0)
+        self.gc_bases += int(gc_per_read.sum())
+        gc_percent = np.round(100 * gc_per_read / lengths[nonempty]).astype(np.int64)
+        self.gc_counts += np.bincount(gc_percent, minlength=101)
+
+        length_counts = np.bincount(lengths)
+        if len(length_counts) > len(self.length_counts):
+            self.length_counts = np.concatenate(
+                [self.length_counts, np.zeros(len(length_counts) - len(self.length_counts), dtype=np.int64)])
+        self.length_counts[:len(length_counts)] += length_counts
+
+        self.sketch.add_hashes(sequence_hashes(bases, offsets, lengths, positions))
+
+    def _quantile(self, counts, fraction):
+        cumulative = np.cumsum(counts, axis=1)
+        totals = cumulative[:, -1:]
+        return np.argmax(cumulative >= np.maximum(totals * fraction, 1), axis=1)
+
+    def result(self, path):
+        per_position_bases = self.quality_counts.sum(axis=1)
+        bases = int(per_position_bases.sum())
+        quality_values = np.arange(MAX_QUALITY)
+        quality_sum = (self.quality_counts * quality_values).sum(axis=1)
+        covered = per_position_bases > 0
+        distinct = min(self.sketch.estimate(), self.reads) if self.reads else 0
+        lengths = np.arange(len(self.length_counts))
+
+        return {
+            'file': os.path.basename(path),
+            'reads': self.reads,
+            'bases': bases,
+            'mean_length': float((lengths * self.length_counts).sum() / self.reads) if self.reads else 0.0,
+            'mean_quality': float(quality_sum.sum() / bases) if bases else 0.0,
+            'q30_percent': float(100 * self.quality_counts[:, 30:].sum() / bases) if bases else 0.0,
+            'gc_percent': 100 * self.gc_bases / bases if bases else 0.0,
+            'n_percent': float(100 * self.n_counts.sum() / bases) if bases else 0.0,
+            'duplicate_percent': float(100 * (1 - distinct / self.reads)) if self.reads else 0.0,
+            'distinct_reads_estimate': int(distinct),
+            'length_histogram': {int(length): int(count) for length, count in enumerate(self.length_counts) if count},
+            'gc_histogram': self.gc_counts.tolist(),
+            'per_position': {
+                'mean_quality': np.where(covered, quality_sum / np.maximum(per_position_bases, 1), 0).round(2).tolist(),
+                'q10': self._quantile(self.quality_counts, 0.1).tolist(),
+                'q25': self._quantile(self.quality_counts, 0.25).tolist(),
+                'median': self._quantile(self.quality_counts, 0.5).tolist(),
+                'q75': self._quantile(self.quality_counts, 0.75).tolist(),
+                'q90': self._quantile(self.quality_counts, 0.9).tolist(),
+                'n_percent': (100 * self.n_counts / np.maximum(per_position_bases, 1)).round(3).tolist(),
+            },
+        }
+
+
+def qc_json_path(path, output_dir):
+    return os.path.join(output_dir, _fastq_name(path) + QC_SUFFIX)
+
+
+# Статистика одного файла FASTQ за один проход; результат пишется в JSON
+def qc_file(path, output_dir):
+    stats = FastqStats()
+    reader = FastqBlockReader(path)
+    try:
+        while True:
+            block = reader.read_records(BATCH_RECORDS)
+            if not block:
+                break
+            stats.add_block(block)
+    finally:
+        reader.close()
+
+    result = stats.result(path)
+    output_file = qc_json_path(path, output_dir)
+    tmp_file = output_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_file, output_file)
+    return result
+
+
+# Параллельная обработка файлов (по одному процессу на файл); возвращает время выполнения
+def qc_files(files, output_dir, workers=4):
+    start_time = time.time()
+    os.makedirs(output_dir, exist_ok=True)
+    context = multiprocessing.get_context('forkserver')
+    with ProcessPoolExecutor(max_workers=max(1, min(workers, len(files))), mp_context=context) as executor:
+        for result in executor.map(qc_file, files, [output_dir] * len(files)):
+            print(f"QC {result['file']}: {result['reads']} reads, mean quality {result['mean_quality']:.1f}, "
+                  f"GC {result['gc_percent']:.1f}%, duplicates ~{result['duplicate_percent']:.1f}%")
+    elapsed_time = time.time() - start_time
+    print(f"QC for {len(files)} files finished in {elapsed_time:.2f} seconds")
+    return elapsed_time
+
+
+# Сводная таблица по всем JSON в папке: TSV и список строк для отчета
+def write_qc_summary(output_dir, summary_file=None):
+    rows = []
+    for file_name in sorted(os.listdir(output_dir)):
+        if file_name.endswith(QC_SUFFIX):
+            with open(os.path.join(output_dir, file_name)) as f:
+                result = json.load(f)
+            rows.append({column: result[column] for column in SUMMARY_COLUMNS})
+
+    summary_file = summary_file or os.path.join(output_dir, 'qc_summary.tsv')
+    with open(summary_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
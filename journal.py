@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+from cache import path_digest, path_size
+from pipeline import DONE, RUNNING
+
+
+# Журнал состояния задач (образец + этап): pending, running, done, failed, skipped.
+# Записывается атомарно после каждого изменения, чтобы после падения узла можно было продолжить с места сбоя
+class RunJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    # save=False позволяет обновить много задач и записать журнал один раз
+    def update(self, task, state, exit_code=None, save=True):
+        if state == DONE:
+            # Размер и контрольная сумма, чтобы при --resume проверить, что результат не испорчен.
+            # Считаем вне блокировки: для больших файлов это долго
+            outputs = [{'path': path, 'size': path_size(path), 'digest': path_digest(path)}
+                       for path in task.outputs]
+        else:
+            outputs = [{'path': path} for path in task.outputs]
+
+        with self._lock:
+            entry = self.entries.get(task.name, {})
+            entry.update({'stage': task.stage, 'sample': task.sample, 'tier': task.tier,
+                          'state': state, 'exit_code': exit_code, 'outputs': outputs, 'updated': time.time()})
+            if state == RUNNING:
+                entry['started'] = time.time()
+            if state == DONE:
+                entry['elapsed_time'] = task.elapsed_time
+            self.entries[task.name] = entry
+            if save:
+                self._save()
+
+    # Результат выполненной задачи удален как промежуточный файл (lifecycle.py): при --resume его отсутствие
+    # не означает, что задачу нужно перезапускать
+    def mark_reclaimed(self, task, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self.entries.get(task.name)
+            if not entry or entry['state'] != DONE:
+                return
+            for item in entry['outputs']:
+                if os.path.abspath(item['path']) == path:
+                    item['reclaimed'] = True
+            self._save()
+
+    # Удаленные как промежуточные результаты задачи, которых по-прежнему нет на диске
+    def reclaimed_outputs(self, task):
+        with self._lock:
+            entry = self.entries.get(task.name, {})
+        return [item['path'] for item in entry.get('outputs', [])
+                if item.get('reclaimed') and not os.path.exists(item['path'])]
+
+    # Задача считается выполненной, если в журнале она done и все её выходные файлы совпадают по размеру и контрольной сумме
+    # (удаленные как промежуточные результаты не проверяются, см. reclaimed_outputs).
+    # Задачи без выходных файлов (сводные отчеты и графики) проверить нечем - они выполняются заново
+    def is_complete(self, task):
+        if not task.outputs:
+            return False
+        with self._lock:
+            entry = self.entries.get(task.name)
+        if not entry or entry['state'] != DONE:
+            return False
+        if [item['path'] for item in entry['outputs']] != task.outputs:
+            return False
+        for item in entry['outputs']:
+            path = item['path']
+            if item.get('reclaimed') and not os.path.exists(path):
+                continue
+            if not os.path.exists(path) or path_size(path) != item['size']:
+                return False
+            if path_digest(path) != item['digest']:
+                print(f"Checksum mismatch for {path}, rerunning {task.name}")
+                return False
+        return True
+
+    def elapsed_time(self, task):
+        with self._lock:
+            return self.entries.get(task.name, {}).get('elapsed_time')
@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+
+from contig_stats import contig_stats
+
+# Перебор k останавливается, если волна не улучшила лучший результат хотя бы на эту долю
+MIN_GAIN = 0.02
+SUMMARY_FILE = 'kmer_sweep.json'
+
+
+# Оценка сборки: N50, при равенстве - суммарная длина; сборка без контигов не оценивается
+def assembly_score(stats):
+    if not stats or not stats['contigs']:
+        return None
+    return (stats['n50'] or 0, stats['total_length'])
+
+
+def _gain(score, best):
+    if best is None:
+        return float('inf')
+    if score[0] != best[0]:
+        return (score[0] - best[0]) / max(best[0], 1)
+    return (score[1] - best[1]) / max(best[1], 1)
+
+
+# Перебор значений k волнами по width сборок: run_wave(kmers) запускает сборки волны параллельно и
+# возвращает {метка: время}, contigs_path(k) - файл контигов сборки. После каждой волны сборки
+# оцениваются по быстрой статистике контигов; перебор останавливается, когда patience волн подряд
+# не дают прироста больше min_gain. Возвращает сводку с оценками всех k и лучшим k
+def sweep_kmers(candidates, run_wave, contigs_path, genome_size=None, width=3, min_gain=MIN_GAIN, patience=1):
+    candidates = sorted(set(candidates))
+    results, best_k, best_score = {}, None, None
+    elapsed_time, stale_waves = 0, 0
+    for start in range(0, len(candidates), width):
+        wave = candidates[start:start + width]
+        elapsed_time += sum(run_wave(wave).values())
+        improved = False
+        for k in wave:
+            path = contigs_path(k)
+            stats = contig_stats(path, genome_size) if os.path.exists(path) else None
+            score = assembly_score(stats)
+            results[k] = {key: stats[key] for key in ('contigs', 'total_length', 'n50', 'ng50', 'largest_contig')} \
+                if stats else None
+            print(f"k={k}: " + (f"N50 {score[0]}, total length {score[1]}" if score else "no contigs"))
+            if score is None:
+                continue
+            if _gain(score, best_score) > min_gain:
+                improved = True
+            if best_score is None or score > best_score:
+                best_k, best_score = k, score
+        stale_waves = 0 if improved else stale_waves + 1
+        if stale_waves >= patience and start + width < len(candidates):
+            print(f"No gain above {min_gain:.0%} after k={wave[-1]}, "
+                  f"skipping k={', '.join(map(str, candidates[start + width:]))}")
+            break
+    return {'candidates': candidates, 'results': results, 'best_k': best_k, 'elapsed_time': elapsed_time}
+
+
+# Файлы лучшей сборки переносятся в output_folder (туда, где их ждут следующие этапы),
+# папки остальных сборок удаляются; сводка перебора сохраняется рядом
+def keep_best_run(sweep_dir, best_run_dir, output_folder, summary):
+    os.makedirs(output_folder, exist_ok=True)
+    if best_run_dir is not None:
+        for name in os.listdir(best_run_dir):
+            target = os.path.join(output_folder, name)
+            if os.path.isdir(target) and not os.path.islink(target):
+                shutil.rmtree(target)
+            os.replace(os.path.join(best_run_dir, name), target)
+    shutil.rmtree(sweep_dir, ignore_errors=True)
+    with open(os.path.join(output_folder, SUMMARY_FILE), 'w') as f:
+        json.dump(summary, f, indent=1)
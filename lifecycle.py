@@ -0,0 +1,274 @@
+import glob
+import gzip
+import os
+import shutil
+import threading
+
+from fastq_io import GZIP_LEVEL, index_path
+from pipeline import DONE, PENDING, RUNNING
+
+# Сколько ГБ должно оставаться свободными на томе результатов задачи после выделения ей места (disk_gb задачи)
+MIN_FREE_DISK_GB = 50
+# Интервал (с) опроса занятого места на томах и повторной проверки места для отложенных задач
+DISK_POLL_INTERVAL = 30
+
+DELETE = 'delete'
+COMPRESS = 'compress'
+
+
+def _has_magic(pattern):
+    return any(char in pattern for char in '*?[')
+
+
+# Ближайшая существующая папка пути (результаты задачи могут еще не существовать)
+def existing_parent(path):
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def _files(path):
+    if os.path.islink(path):
+        return
+    if os.path.isfile(path):
+        yield path
+        return
+    for root, _, files in os.walk(path):
+        for name in files:
+            file_path = os.path.join(root, name)
+            if not os.path.islink(file_path):
+                yield file_path
+
+
+# Число жестких ссылок на каждый файл (st_dev, st_ino) из папки кэша
+def _cache_links(cache_dir):
+    links = {}
+    if cache_dir:
+        for file_path in _files(cache_dir):
+            stat = os.stat(file_path)
+            links[(stat.st_dev, stat.st_ino)] = links.get((stat.st_dev, stat.st_ino), 0) + 1
+    return links
+
+
+# Место, которое освободится при удалении: (сразу, после вытеснения из кэша). Файлы, у которых кроме этой
+# есть только ссылки из кэша (cache_links), освободятся, когда кэш вытеснит запись; файлы с другими
+# ссылками не считаются
+def _freed_size(path, cache_links):
+    freed = held_by_cache = 0
+    for file_path in _files(path):
+        stat = os.stat(file_path)
+        other_links = stat.st_nlink - 1
+        if other_links == 0:
+            freed += stat.st_size
+        elif other_links <= cache_links.get((stat.st_dev, stat.st_ino), 0):
+            held_by_cache += stat.st_size
+    return freed, held_by_cache
+
+
+def _overlaps(path, other):
+    return path == other or other.startswith(path + os.sep)
+
+
+def gzip_file(path):
+    with open(path, 'rb') as source, gzip.open(path + '.gz', 'wb', compresslevel=GZIP_LEVEL) as target:
+        shutil.copyfileobj(source, target, 4 * 1024 * 1024)
+    os.remove(path)
+    return path + '.gz'
+
+
+# Промежуточные файлы задач графа (Task.intermediates: пары (действие, шаблон пути)) удаляются или сжимаются,
+# как только задача выполнена и файл не нужен ни одной задаче, которая еще ждет или выполняется.
+# Не трогаются объявленные результаты задач (и файлы, на которые они ссылаются), кроме явно перечисленных
+# в intermediates без шаблонов (например, прореженные прочтения после сборок), и папки, в которых они лежат;
+# такие удаленные результаты отмечаются в журнале (journal), чтобы --resume не перезапускал задачу.
+# Промежуточные файлы упавших задач остаются для разбора.
+# Удаление и сжатие идут в фоновом потоке (request_reclaim), а не в потоке, который допускает задачи.
+# Кроме того, задача допускается к запуску, только если на томе ее результатов останется MIN_FREE_DISK_GB,
+# и отслеживается пиковое занятое место на томах результатов за запуск
+class ArtifactLifecycle:
+    def __init__(self, tasks, min_free_gb=MIN_FREE_DISK_GB, reclaim=True, poll_interval=DISK_POLL_INTERVAL,
+                 journal=None, cache_dir=None):
+        self.tasks = list(tasks)
+        self.min_free_gb = min_free_gb
+        self.reclaim_enabled = reclaim
+        self.poll_interval = poll_interval
+        self.journal = journal
+        self.cache_dir = cache_dir  # папка записей кэша результатов (ResultCache.entries_dir)
+        self.lock = threading.Lock()
+        self.reclaimed = set()
+        self.reclaimed_bytes = 0
+        self.held_by_cache_bytes = 0  # часть reclaimed_bytes, которая освободится после вытеснения из кэша
+        self.compressed_bytes = 0  # на сколько уменьшились сжатые файлы
+        self.deferred = set()
+        # Один путь на каждый том (st_dev), на котором лежат результаты задач
+        self.volumes = {}
+        for task in self.tasks:
+            for path in task.outputs:
+                parent = existing_parent(path)
+                self.volumes.setdefault(os.stat(parent).st_dev, parent)
+        self.start_used = {device: shutil.disk_usage(path).used for device, path in self.volumes.items()}
+        self.peak_used = dict(self.start_used)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._on_reclaimed = None
+        # Состояния задач, при которых прошел последний проход освобождения: пока они не изменились,
+        # новый проход ничего не освободит
+        self._reclaimed_states = None
+
+    def sample(self):
+        with self.lock:
+            for device, path in self.volumes.items():
+                self.peak_used[device] = max(self.peak_used[device], shutil.disk_usage(path).used)
+
+    # Фоновый поток: опрос занятого места и освобождение промежуточных файлов по запросу
+    def _poll(self):
+        while not self._stop.is_set():
+            requested = self._wake.wait(self.poll_interval)
+            if self._stop.is_set():
+                break
+            self._wake.clear()
+            self.sample()
+            if requested:
+                states = self._states()
+                self.reclaim()
+                self._reclaimed_states = states
+                if self._on_reclaimed is not None:
+                    self._on_reclaimed()
+
+    def _states(self):
+        return tuple(task.state for task in self.tasks)
+
+    # Освобождать больше нечего: последний проход прошел при тех же состояниях задач
+    def exhausted(self):
+        return self._reclaimed_states == self._states()
+
+    # on_reclaimed - вызывается после прохода освобождения (например, чтобы граф снова проверил отложенные задачи)
+    def start(self, on_reclaimed=None):
+        self._on_reclaimed = on_reclaimed
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sample()
+
+    # Запрос освобождения в фоновом потоке; не блокирует вызывающий поток
+    def request_reclaim(self):
+        self._wake.set()
+
+    # Пути, которые нельзя удалять: входные файлы задач, которые еще ждут или выполняются,
+    # и результаты всех задач (с путями, на которые указывают ссылки)
+    def _protected(self):
+        literal = {os.path.abspath(pattern) for task in self.tasks
+                   for _, pattern in task.intermediates if not _has_magic(pattern)}
+        inputs, outputs = set(), set()
+        for task in self.tasks:
+            if task.state in (PENDING, RUNNING):
+                inputs.update(os.path.abspath(path) for path in task.inputs)
+            for path in task.outputs + task.optional_outputs:
+                path = os.path.abspath(path)
+                if path not in literal:
+                    outputs.update({path, os.path.realpath(path)})
+        return inputs, outputs
+
+    def _candidates(self):
+        for task in self.tasks:
+            if task.state != DONE:
+                continue
+            for action, pattern in task.intermediates:
+                for path in sorted(glob.glob(pattern)):
+                    path = os.path.abspath(path)
+                    if path not in self.reclaimed:
+                        yield task, action, path
+
+    def _apply(self, task, action, path, cache_links):
+        if action == COMPRESS:
+            if not os.path.isfile(path) or os.path.islink(path) or path.endswith('.gz'):
+                return
+            size = os.path.getsize(path)
+            compressed = gzip_file(path)
+            self.compressed_bytes += size - os.path.getsize(compressed)
+            print(f"Compressed intermediate {path}")
+        else:
+            # Индекс gzip-членов (.idx) удаляется вместе со своим файлом
+            sidecar = index_path(path)
+            paths = [path] + ([sidecar] if os.path.isfile(sidecar) and not os.path.isdir(path) else [])
+            for item in paths:
+                freed, held_by_cache = _freed_size(item, cache_links)
+                self.reclaimed_bytes += freed + held_by_cache
+                self.held_by_cache_bytes += held_by_cache
+                if os.path.isdir(item) and not os.path.islink(item):
+                    shutil.rmtree(item)
+                else:
+                    os.remove(item)
+            print(f"Removed intermediate {path}")
+            if self.journal is not None and path in map(os.path.abspath, task.outputs):
+                self.journal.mark_reclaimed(task, path)
+        self.reclaimed.add(path)
+
+    # Удаление и сжатие промежуточных файлов, которые больше не нужны; возвращает освобожденные байты.
+    # Вызывается из фонового потока (request_reclaim) и после завершения графа
+    def reclaim(self):
+        if not self.reclaim_enabled:
+            return 0
+        self.sample()
+        with self.lock:
+            before = self.reclaimed_bytes + self.compressed_bytes
+            inputs, outputs = self._protected()
+            candidates = list(self._candidates())
+            cache_links = _cache_links(self.cache_dir) if candidates else {}
+            for task, action, path in candidates:
+                real_path = os.path.realpath(path)
+                if any(_overlaps(path, other) or _overlaps(other, path) or _overlaps(real_path, other)
+                       for other in inputs):
+                    continue
+                if any(_overlaps(path, other) or _overlaps(real_path, other) for other in outputs):
+                    continue
+                try:
+                    self._apply(task, action, path, cache_links)
+                except OSError as e:
+                    print(f"Could not {action} {path}: {e}")
+            return self.reclaimed_bytes + self.compressed_bytes - before
+
+    def free_gb(self, path):
+        return shutil.disk_usage(existing_parent(path)).free / 1024 ** 3
+
+    # Задача допускается, если после выделения ей task.disk_gb на томе ее результатов останется min_free_gb;
+    # при нехватке места задача откладывается, а промежуточные файлы освобождаются в фоновом потоке
+    def can_admit(self, task):
+        if not task.outputs:
+            return True
+        needed_gb = task.disk_gb + self.min_free_gb
+        free_gb = self.free_gb(task.outputs[0])
+        if free_gb >= needed_gb:
+            self.deferred.discard(task.name)
+            return True
+        if not self.exhausted():
+            self.request_reclaim()
+        if task.name not in self.deferred:
+            print(f"Deferring {task.name}: {free_gb:.1f} GB free, {needed_gb:.1f} GB needed")
+            self.deferred.add(task.name)
+        return False
+
+    # Ошибка для задачи, которой места не хватит: ничего не выполняется и освобождать больше нечего
+    def disk_error(self, task):
+        return (f"not enough disk space for {task.name}: {self.free_gb(task.outputs[0]):.1f} GB free on "
+                f"{existing_parent(task.outputs[0])}, {task.disk_gb + self.min_free_gb:.1f} GB needed "
+                f"({task.disk_gb} GB for the task + {self.min_free_gb} GB kept free), no intermediates left to reclaim")
+
+    # Пиковое место, занятое за запуск (рост относительно начала, сумма по томам), и освобожденное место
+    def summary(self):
+        with self.lock:
+            peak_growth = sum(max(self.peak_used[device] - self.start_used[device], 0) for device in self.volumes)
+            return {
+                'peak_disk_gb': round(peak_growth / 1024 ** 3, 2),
+                'peak_used_gb': {path: round(self.peak_used[device] / 1024 ** 3, 2)
+                                 for device, path in self.volumes.items()},
+                'reclaimed_gb': round((self.reclaimed_bytes + self.compressed_bytes) / 1024 ** 3, 2),
+                'held_by_cache_gb': round(self.held_by_cache_bytes / 1024 ** 3, 2),
+            }
@@ -0,0 +1,75 @@
+import os
+from functools import lru_cache
+
+# Настройки NOVOPlasty для каждой органеллы
+ORGANELLES = {
+    'mito': {'Type': 'mito_plant', 'Genome Range': '400000-500000'},
+    'chloro': {'Type': 'chloro', 'Genome Range': '120000-200000'},
+}
+# Поля, значения которых очищаются (оставляем только ключевое слово и знак равенства)
+CLEARED_KEYS = ('Reference sequence', 'Chloroplast sequence', 'Insert size')
+KEY_WIDTH = 22
+
+
+# Шаблон конфигурации NOVOPlasty: строки файла и номер строки для каждого ключа
+class NovoConfigTemplate:
+    def __init__(self, lines):
+        self.lines = lines
+        self.keys = {}
+        for i, line in enumerate(lines):
+            if '=' in line:
+                self.keys.setdefault(line.split('=')[0].strip(), i)
+
+    # Текст конфигурации с подставленными значениями; ключи, которых нет в шаблоне, пропускаются
+    def render(self, values):
+        lines = list(self.lines)
+        for key in CLEARED_KEYS:
+            if key in self.keys:
+                i = self.keys[key]
+                lines[i] = f"{lines[i].split('=')[0]} =\n"
+        for key, value in values.items():
+            if key in self.keys:
+                lines[self.keys[key]] = f"{key:<{KEY_WIDTH}}= {value}\n"
+        return ''.join(lines)
+
+
+# Шаблон читается и разбирается один раз (пока файл не изменился) и используется всеми задачами
+@lru_cache(maxsize=None)
+def _load_template(path, mtime_ns):
+    with open(path) as f:
+        return NovoConfigTemplate(f.readlines())
+
+
+def load_template(path):
+    return _load_template(path, os.stat(path).st_mtime_ns)
+
+
+def config_values(sample, organelle, kmer_size, length, seed_file, input_file_R1, input_file_R2, output_folder,
+                  max_memory_gb=None):
+    values = {
+        'Project name': f"{sample}_{organelle}",
+        **ORGANELLES[organelle],
+        'K-mer': kmer_size,
+        'Seed Input': seed_file,
+        'Read Length': length,
+        'Forward reads': input_file_R1,
+        'Reverse reads': input_file_R2,
+        'Output path': output_folder,
+    }
+    if max_memory_gb:
+        values['Max memory'] = max_memory_gb
+    return values
+
+
+# Отдельный файл конфигурации для пары (образец, органелла); файл не перезаписывается, если текст не изменился
+def write_config(config_template, config_file_path, values):
+    text = load_template(config_template).render(values)
+    if os.path.exists(config_file_path):
+        with open(config_file_path) as f:
+            if f.read() == text:
+                return config_file_path
+    tmp_path = config_file_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, config_file_path)
+    return config_file_path
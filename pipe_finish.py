@@ -1,12 +1,39 @@
 import subprocess
-import time
 import os
+import sys
+import time
 import fnmatch
 import shutil
+import argparse
+from functools import partial
 import pandas as pd
 
+from artifacts import ArtifactIndex
+from staging import StagingArea
+from contig_stats import assembly_gate, filter_assemblies, pass_marker_path, write_contig_stats_summary
+from quast_cache import QuastCache, merge_reports
+from kmer_sweep import keep_best_run, sweep_kmers
+from scheduler import Job, ResourceScheduler
+from pipeline import Pipeline, Task
+from cache import ResultCache
+from journal import RunJournal
+from trimmer import TRIM_STEPS, trim_pair
+from fastq_qc import qc_files, qc_json_path, write_qc_summary
+from classify import classification_path, classify_sample, write_classification_summary
+from novo_config import config_values, write_config
+from telemetry import TelemetryStore
+from profiler import current_tags, forward_signals, task_context
+from retry import (Escalation, RetryPolicy, backoff_delay, command_resources, escalate_command, is_oom_like,
+                   stage_policy)
+from executors import EXECUTORS, LocalExecutor, make_executor
+from status import StatusBoard, StatusServer
+from lifecycle import COMPRESS, DELETE, MIN_FREE_DISK_GB, ArtifactLifecycle
+from assembly_report import assembly_sheets
+from subsample import subsample_json_path, subsample_sample, write_subsample_summary
+
 # Пути для программ
 FASTQC = "fastqc * -t 8" 
+FASTQC_BIN = "fastqc"
 trimmomatic_jar = 'trimmomatic'
 SPADES = "spades.py"
 NOVOPLASTY = "NOVOPlasty"
@@ -14,27 +41,209 @@ ABYSS_PE = "abyss-pe"
 QUAST = "quast.py"
 BUSCO = "busco"
 
-# Путь к файлу, где будет сохраняться информация о времени выполнения
-LOG_FILE = '/путь/к/time.log'
+# Движок фильтрации: 'trimmomatic' (внешняя программа) или 'native' (trimmer.py, те же шаги без запуска JVM)
+TRIM_ENGINE = 'trimmomatic'
+# Движок QC: 'fastqc' или 'native' (fastq_qc.py, JSON и сводная таблица за один проход по файлу)
+QC_ENGINE = 'fastqc'
+
+# База SQLite со временем и ресурсами каждой команды и каждой задачи по всем запускам;
+# отчет Excel и CSV строятся из нее
+TELEMETRY_DB = '/путь/к/telemetry.sqlite'
+# Индекс файлов результатов (папки, размеры, mtime), сохраняется между запусками
+ARTIFACT_INDEX_FILE = '/путь/к/artifacts.json'
+
+# Где выполняются команды: 'local' (этот узел), 'pool' (пул процессов этого узла),
+# 'slurm' (скрипты задач в очереди SLURM) или 'fake-slurm' (локальная имитация очереди для проверки)
+EXECUTOR = 'local'
+# Скрипты, журналы и записи профиля задач очереди; папка должна быть доступна с узлов кластера
+JOB_DIR = '/путь/к/jobs'
+SLURM_PARTITION = None
+
+# Общий бюджет ресурсов узла (или кластера для 'slurm') для одновременного запуска нескольких образцов
+TOTAL_CORES = 64
+TOTAL_MEM_GB = 256
+
+# Потоки, память (ГБ) и место на диске (ГБ, с промежуточными файлами) на одну задачу для каждого инструмента
+JOB_RESOURCES = {
+    'trimmomatic': {'threads': 4, 'mem_gb': 4, 'disk_gb': 10},
+    'spades': {'threads': 8, 'mem_gb': 32, 'disk_gb': 100},
+    'abyss': {'threads': 12, 'mem_gb': 30, 'disk_gb': 50},
+    'fastqc': {'threads': 2, 'mem_gb': 2, 'disk_gb': 1},
+    'novoplasty': {'threads': 1, 'mem_gb': 16, 'disk_gb': 5},
+    'quast': {'threads': 8, 'mem_gb': 8, 'disk_gb': 1},
+    'busco': {'threads': 12, 'mem_gb': 16, 'disk_gb': 10},
+}
+
+# Промежуточные файлы сборщиков (шаблоны относительно папки сборки образца), которые удаляются или сжимаются,
+# как только они не нужны ни одной задаче запуска (--keep-intermediates оставляет все).
+# contigs/scaffolds ABySS - ссылки на *-6.fa и *-8.fa, эти файлы не удаляются
+SPADES_INTERMEDIATES = [
+    (DELETE, 'K*'), (DELETE, 'corrected'), (DELETE, 'misc'), (DELETE, 'tmp'), (DELETE, 'split_input'),
+    (DELETE, 'pipeline_state'), (DELETE, 'before_rr.fasta'), (DELETE, 'first_pe_contigs.fasta'),
+    (COMPRESS, 'assembly_graph*.fastg'), (COMPRESS, 'assembly_graph*.gfa'), (COMPRESS, '*.paths'),
+]
+ABYSS_INTERMEDIATES = [
+    (DELETE, '*-[0-9].fa'), (DELETE, '*-[0-9].dot'), (DELETE, '*-[0-9].path*'), (DELETE, '*-[0-9].dist'),
+    (DELETE, '*-[0-9].adj'), (DELETE, '*-[0-9].hist'), (DELETE, '*-bubbles.fa'), (DELETE, '*-indel.fa'),
+    (DELETE, '*.sam.gz'),
+]
+
+# Перебор k для SPAdes и ABySS (--kmer-sweep): кандидаты, число сборок одного образца одновременно
+# и минимальный прирост N50 за волну, ниже которого перебор останавливается
+SPADES_KMER_CANDIDATES = [21, 33, 55, 77, 99, 127]
+ABYSS_KMER_CANDIDATES = [32, 48, 64, 80, 96]
+KMER_SWEEP_WIDTH = 3
+KMER_SWEEP_MIN_GAIN = 0.02
+
+# Политики запуска этапов: предел времени (с), число повторов с паузой и повышение памяти (а на пределе -
+# снижение числа потоков) после выхода, похожего на нехватку памяти. Политика ищется по имени этапа,
+# затем по первой части имени (quast_spades -> quast). Перед повтором с повышенной памятью резерв задачи
+# в общем планировщике увеличивается до новой памяти, а исполнитель получает новые память и число потоков
+STAGE_POLICIES = {
+    'spades': RetryPolicy(timeout_s=48 * 3600, retries=2, backoff_s=60,
+                          escalation=Escalation(r'-m (\d+)', r'-t (\d+)', mem_factor=2, max_mem_gb=TOTAL_MEM_GB // 2)),
+    'abyss': RetryPolicy(timeout_s=48 * 3600, retries=2, backoff_s=60,
+                         escalation=Escalation(r'B=(\d+)G', r'j=(\d+)', mem_factor=2, max_mem_gb=TOTAL_MEM_GB // 4)),
+    'novo': RetryPolicy(timeout_s=24 * 3600, retries=1, backoff_s=60),
+    'quast': RetryPolicy(timeout_s=6 * 3600, retries=1, backoff_s=30),
+    'busco': RetryPolicy(timeout_s=12 * 3600, retries=1, backoff_s=30),
+}
+
+# Размер генома (Мб) для оценки покрытия при классификации и прореживании
+GENOME_SIZE_MB = 1000
+
+# Пороги быстрой статистики контигов (этап contig_stats): сборки ниже порогов не передаются в QUAST и BUSCO
+CONTIG_THRESHOLDS = {
+    'min_total_length': 100000,
+    'min_n50': 1000,
+    'max_n_percent': 10,
+    'min_contigs': 1,
+}
+
+# BUSCO для набора сборок запускается по частям: число частей и потоки (-c) на часть
+BUSCO_SHARDS = 4
+BUSCO_SHARD_THREADS = 4
+
+# Пороги автоматического разделения образцов на good/bad (этап classify)
+CLASSIFY_THRESHOLDS = {
+    'genome_size_mb': GENOME_SIZE_MB,
+    'min_coverage': 10,
+    'min_mean_quality': 25,
+    'max_duplicate_percent': 60,
+    'min_insert_size': 0,
+}
+# С --cheap-bad-tier для группы bad запускаются только эти этапы, а SPAdes - с облегченными настройками
+BAD_TIER_STAGES = ['subsample', 'spades', 'contig_stats', 'quast_spades', 'busco_spades']
+SPADES_BAD_TIER_OPTIONS = '--only-assembler'
+
+# Целевое покрытие для этапа subsample: прочтения сверх него SPAdes и ABySS не получают
+SUBSAMPLE_TARGET_DEPTH = 100
+
+# Кэш результатов: квота по размеру и максимальный возраст записей
+CACHE_QUOTA_GB = 500
+CACHE_MAX_AGE_DAYS = 30
+
+# Команды для определения версии программ (версия входит в ключ кэша)
+VERSION_COMMANDS = {
+    trimmomatic_jar: f"{trimmomatic_jar} -version",
+    ABYSS_PE: f"{ABYSS_PE} version",
+    NOVOPLASTY: f"{NOVOPLASTY} --version",
+}
+
+telemetry = TelemetryStore(TELEMETRY_DB)
+# Общий бюджет ядер и памяти: по нему запускаются задачи графа и задачи run_jobs; в main создается заново
+# по --cores и --mem
+scheduler = ResourceScheduler(TOTAL_CORES, TOTAL_MEM_GB)
+# Исполнитель команд run_command; в main заменяется на выбранный через --executor
+executor = LocalExecutor()
+# Все этапы ищут сборки и отчеты через общий индекс, а не повторным os.listdir/os.walk
+artifact_index = ArtifactIndex(ARTIFACT_INDEX_FILE)
+
+
+# Функция для выполнения команды в терминале + запись времени и ресурсов в базу телеметрии.
+# Команда выполняется по политике этапа (policy или STAGE_POLICIES по метке задачи): с пределом времени,
+# повторами и повышением ресурсов при нехватке памяти. Каждая попытка записывается отдельно.
+# check=True - если все попытки неудачны, ошибка передается дальше (задача графа помечается failed,
+# и зависящие от нее QUAST/BUSCO пропускаются)
+def run_command(command, check=False, policy=None):
+    tags = current_tags()
+    policy = policy or stage_policy(STAGE_POLICIES, tags.get('stage'))
+    error = None
+    total_time = 0
+    resources = {}  # память и потоки повтора после повышения (для исполнителя)
+    extra_mem_gb = 0  # память, занятая в общем планировщике сверх выделенной задаче
+    try:
+        for attempt in range(1, policy.retries + 2):
+            print(f"Running command: {command}" + (f" (attempt {attempt})" if attempt > 1 else ""))
+            # Команда запускается исполнителем с замером CPU, пиковой памяти дерева процессов и ввода-вывода
+            with task_context(**resources):
+                returncode, record = executor.run(command, timeout=policy.timeout_s)
+            record['attempt'] = attempt
+            total_time += record['wall_s']
+            print(f"Command finished in {record['wall_s']:.2f} seconds (CPU {record['cpu_cores']} cores, "
+                  f"peak RSS {record['peak_rss_mb']} MB)")
+            telemetry.add_command(record)
+            if returncode == 0:
+                return total_time
+
+            error = subprocess.CalledProcessError(returncode, command)
+            print(f"Error occurred: {error}" + (" (time limit exceeded)" if record.get('timed_out') else ""))
+            if attempt > policy.retries:
+                break
+            if is_oom_like(record) and policy.escalation is not None:
+                escalated = escalate_command(command, policy.escalation)
+                if escalated is None:
+                    print("Out-of-memory-like exit, but memory and threads cannot be changed further")
+                    break
+                print(f"Out-of-memory-like exit, retrying with more memory or fewer threads: {escalated}")
+                command = escalated
+                resources, extra_mem_gb = escalated_resources(command, policy.escalation, tags, extra_mem_gb)
+            delay = backoff_delay(policy, attempt)
+            print(f"Retrying in {delay:.0f} seconds")
+            time.sleep(delay)
+    finally:
+        if extra_mem_gb:
+            scheduler.release(0, extra_mem_gb)
+
+    if check and error is not None:
+        raise error
+    return total_time
 
 
-# Функция для выполнения команды в терминале + запись времени в log-файл
-def run_command(command):
-    start_time = time.time() #Эта строка записывает текущее время в переменную start_time
-    print(f"Running command: {command}")
-    try:
-        subprocess.run(command, shell=True, check=True)
-    except subprocess.CalledProcessError as e:
-        print(f"Error occurred: {e}")
-    elapsed_time = time.time() - start_time # Эта строка вычисляет разницу между текущим временем и start_time, чтобы получить время, затраченное на выполнение команды.
-    print(f"Command finished in {elapsed_time:.2f} seconds")
-    # Записываем время выполнения в файл
-    with open(LOG_FILE, 'a') as log_file:
-        log_file.write(f"Command: {command}\nElapsed time: {elapsed_time:.2f} seconds\n\n")
-        
-    return elapsed_time
+# Ресурсы повтора с повышенной памятью: память и потоки из команды. Если память больше выделенной задаче
+# (tags - метки задачи, extra_mem_gb - уже занятое сверх них), недостающее занимается в общем планировщике
+# до запуска повтора. Возвращает ресурсы для исполнителя и память, занятую сверх выделенной задаче
+def escalated_resources(command, escalation, tags, extra_mem_gb):
+    mem_gb, threads = command_resources(command, escalation)
+    resources = {'cores': threads} if threads else {}
+    if mem_gb is None:
+        return resources, extra_mem_gb
+    if not tags.get('mem_gb'):
+        return {**resources, 'mem_gb': mem_gb}, extra_mem_gb
+    held_gb = tags['mem_gb'] + extra_mem_gb
+    if mem_gb > held_gb:
+        print(f"Reserving {mem_gb - held_gb} GB more memory for the retry")
+        scheduler.resize(0, held_gb, 0, mem_gb)
+        held_gb = mem_gb
+    return {**resources, 'mem_gb': held_gb}, held_gb - tags['mem_gb']
+
+# Запуск задач через общий планировщик. Задачи, запущенные изнутри задачи графа или другой задачи run_jobs
+# (части BUSCO, QUAST отдельных сборок, органеллы NOVOPlasty, перебор k), делят ресурсы, уже выделенные
+# этой задаче, а не получают весь бюджет заново
+def run_jobs(jobs):
+    tags = current_tags()
+    if tags.get('cores') and tags.get('mem_gb'):
+        return ResourceScheduler(tags['cores'], tags['mem_gb']).run_jobs(jobs, run_command)
+    return scheduler.run_jobs(jobs, run_command)
+
+def quality_control(fastq_files_path, output_dir, engine=QC_ENGINE):
+    if engine == 'native':
+        fastq_files = [os.path.join(fastq_files_path, file_name) for file_name in sorted(os.listdir(fastq_files_path))
+                       if fnmatch.fnmatch(file_name, '*.fastq.gz')]
+        elapsed_time = qc_files(fastq_files, output_dir, workers=TOTAL_CORES)
+        write_qc_summary(output_dir)
+        return elapsed_time
 
-def quality_control(fastq_files_path, output_dir):
     original_dir = os.getcwd()  # Сохраняем текущую рабочую директорию
     command = f"cd {fastq_files_path} && {FASTQC} -o {output_dir} && cd -"  # Добавляем cd - для возврата в исходную директорию
     run_command(command)
@@ -43,9 +252,27 @@ def quality_control(fastq_files_path, output_dir):
 
 # Фильтрация
 
-def trim_reads(fastq_files_path, output_dir, trimmomatic_jar):
-    total_elapsed_time = 0
+# Пути к выходным файлам Trimmomatic: paired_R1, unpaired_R1, paired_R2, unpaired_R2
+def trimmed_files(output_dir, folder_name):
+    return [os.path.join(output_dir, f"{folder_name}_{kind}_{read}.fastq.gz")
+            for read in ('R1', 'R2') for kind in ('paired', 'unpaired')]
+
+def trimmomatic_command(trimmomatic_jar, input_file_R1, input_file_R2, output_dir, folder_name):
+    threads = JOB_RESOURCES['trimmomatic']['threads']
+    outputs = ' '.join(trimmed_files(output_dir, folder_name))
+    return f"{trimmomatic_jar} PE -threads {threads} -phred33 {input_file_R1} {input_file_R2} {outputs} {TRIM_STEPS}"
+
+# Задача фильтрации одной пары: команда Trimmomatic или функция trim_pair с теми же шагами
+def trim_action(engine, trimmomatic_jar, input_file_R1, input_file_R2, output_dir, folder_name):
+    if engine == 'native':
+        return partial(trim_pair, input_file_R1, input_file_R2, trimmed_files(output_dir, folder_name),
+                       steps=TRIM_STEPS, workers=JOB_RESOURCES['trimmomatic']['threads'])
+    return trimmomatic_command(trimmomatic_jar, input_file_R1, input_file_R2, output_dir, folder_name)
+
+def trim_reads(fastq_files_path, output_dir, trimmomatic_jar, engine=TRIM_ENGINE):
     processed_pairs = set()  # Множество для хранения обработанных пар файлов
+    jobs = []
+    resources = JOB_RESOURCES['trimmomatic']
 
     # Перебор всех файлов в указанной директории
     for file_name in os.listdir(fastq_files_path):
@@ -57,26 +284,30 @@ def trim_reads(fastq_files_path, output_dir, trimmomatic_jar):
             file_pair = (input_file_R1, input_file_R2)
 
             if file_pair not in processed_pairs:  # Проверка, была ли пара файлов уже обработана
-                output_file_R1_paired = os.path.join(output_dir, f"{folder_name}_paired_R1.fastq.gz")
-                output_file_R1_unpaired = os.path.join(output_dir, f"{folder_name}_unpaired_R1.fastq.gz")
-                output_file_R2_paired = os.path.join(output_dir, f"{folder_name}_paired_R2.fastq.gz")
-                output_file_R2_unpaired = os.path.join(output_dir, f"{folder_name}_unpaired_R2.fastq.gz")
-                
-                # Команда для запуска Trimmomatic
-                command = f"{trimmomatic_jar} PE -phred33 {input_file_R1} {input_file_R2} {output_file_R1_paired} {output_file_R1_unpaired} {output_file_R2_paired} {output_file_R2_unpaired} LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:36 HEADCROP:20 CROP:265"
+                # Команда для запуска Trimmomatic (или функция встроенного движка)
+                command = trim_action(engine, trimmomatic_jar, input_file_R1, input_file_R2, output_dir, folder_name)
                 
-                elapsed_time = run_command(command)  # Запуск команды и получение времени выполнения
-                total_elapsed_time += elapsed_time  # Суммирование общего времени
+                jobs.append(Job(folder_name, command, resources['threads'], resources['mem_gb']))
                 processed_pairs.add(file_pair)  # Добавление пары файлов в множество processed_pairs
 
+    # Запуск всех пар параллельно и получение времени выполнения для каждого образца
+    elapsed_times = run_jobs(jobs)
+    total_elapsed_time = sum(elapsed_times.values())  # Суммирование общего времени
     print(f"Total time for processing: {total_elapsed_time:.2f} seconds")  # Вывод общего времени обработки (1327.12 сек)
+    return total_elapsed_time
 
 
 # Сборка
 # SPAdes
+def spades_command(input_file_R1, input_file_R2, output_folder, kmer_size, extra_options=''):
+    resources = JOB_RESOURCES['spades']
+    command = f"{SPADES} -1 {input_file_R1} -2 {input_file_R2} -o {output_folder} -k {kmer_size} -t {resources['threads']} -m {resources['mem_gb']}"
+    return f"{command} {extra_options}" if extra_options else command
+
 def assemble_spades(input_files, output_dir, kmer_size):
-    total_elapsed_time = 0
     processed_pairs = set()  # Множество для хранения обработанных пар файлов
+    jobs = []
+    resources = JOB_RESOURCES['spades']
 
     for file_name in os.listdir(input_files):
         if file_name.endswith("_paired_R1.fastq.gz"):
@@ -89,17 +320,18 @@ def assemble_spades(input_files, output_dir, kmer_size):
             file_pair = (input_file_R1, input_file_R2)
 
             if file_pair not in processed_pairs: #Проверка, была ли эта пара файлов уже обработана
-                command = f"{SPADES} -1 {input_file_R1} -2 {input_file_R2} -o {output_folder} -k {kmer_size}"
-                elapsed_time = run_command(command)
-                total_elapsed_time += elapsed_time
+                command = spades_command(input_file_R1, input_file_R2, output_folder, kmer_size)
+                jobs.append(Job(folder_name, command, resources['threads'], resources['mem_gb']))
                 processed_pairs.add(file_pair) #Добавление пары файлов в множество processed_pairs
 
+    elapsed_times = run_jobs(jobs)
+    total_elapsed_time = sum(elapsed_times.values())
     print(f"Total time for processing: {total_elapsed_time:.2f} seconds") #7039.27
     return total_elapsed_time
     
 # NOVOPlasty
 def assemble_novo(input_folder, output_dir, kmer_size, length, config_template, seed_file_mito, seed_file_chloro):
-    total_elapsed_time = 0 
+    jobs = []
 
     # Перебор файлов в указанной папке
     for file_name in os.listdir(input_folder):
@@ -108,92 +340,56 @@ def assemble_novo(input_folder, output_dir, kmer_size, length, config_template,
             folder_name = file_name.split("_paired")[0]
             output_folder = os.path.join(output_dir, folder_name) + '/'
             
-            # Создание папки для каждой пары файлов
-            os.makedirs(output_folder, exist_ok=True)
-            
             # Создание путей к файлам
             input_file_R1 = os.path.join(input_folder, file_name)
             input_file_R2 = os.path.join(input_folder, file_name.replace("_R1.fastq.gz", "_R2.fastq.gz"))
             
-            # Путь к скопированному файлу конфигурации
-            config_file_path = os.path.join(output_folder, 'config.txt')
-            
-            # Копируем шаблонный файл конфигурации в выходную папку
-            shutil.copy(config_template, config_file_path)
-
-            # Обработка для митохондрий
-            config_type = 'mito_plant'
-            genome_range = '400000-500000'
-            
-            # Обновляем конфигурационный файл для митохондрий
-            update_config_file(config_file_path, folder_name, config_type, genome_range, 
-                               kmer_size, seed_file_mito, length, input_file_R1, input_file_R2, output_folder)
-
-            # Формируем команду для запуска Novoplasty
-            command = f"{NOVOPLASTY} -c {config_file_path}"
-            elapsed_time = run_command(command)
-            total_elapsed_time += elapsed_time
-            
-            # Обработка для хлоропластов
-            config_type = 'chloro'
-            genome_range = '120000-200000'
-            
-            # Обновляем конфигурационный файл для хлоропластов
-            update_config_file(config_file_path, folder_name, config_type, genome_range, 
-                               kmer_size, seed_file_chloro, length, input_file_R1, input_file_R2, output_folder)
-
-            # Формируем команду для повторного запуска Novoplasty с новой конфигурацией
-            command = f"{NOVOPLASTY} -c {config_file_path}"
-            elapsed_time = run_command(command)
-            total_elapsed_time += elapsed_time
+            jobs.extend(novo_jobs(folder_name, input_file_R1, input_file_R2, output_folder,
+                                  kmer_size, length, config_template, seed_file_mito, seed_file_chloro))
 
+    # Органеллы всех образцов запускаются вместе в пределах общего бюджета памяти
+    total_elapsed_time = sum(run_jobs(jobs).values())
     print(f"Total elapsed time: {total_elapsed_time} seconds")
     return total_elapsed_time
-    
-def update_config_file(config_file_path, folder_name, config_type, genome_range, 
-                       kmer_size, seed_file, length, input_file_R1, input_file_R2, output_folder):
-    # Читаем шаблонный файл конфигурации
-    with open(config_file_path, 'r') as file:
-        lines = file.readlines()
-    
-    # Открываем файл для записи
-    with open(config_file_path, 'w') as file:
-        # Определяем окончание в зависимости от типа конфигурации
-        project_suffix = '_mito' if config_type == 'mito_plant' else '_chloro'
-        full_project_name = f"{folder_name}{project_suffix}"
-        
-        for line in lines:
-            if line.startswith("Project name"):
-                file.write(f"Project name          = {full_project_name}\n")
-            elif line.startswith("Type"):
-                file.write(f"Type                  = {config_type}\n")
-            elif line.startswith("Genome Range"):
-                file.write(f"Genome Range          = {genome_range}\n")
-            elif line.startswith("K-mer"):
-                file.write(f"K-mer                 = {kmer_size}\n")
-            elif line.startswith("Seed Input"):
-                file.write(f"Seed Input            = {seed_file}\n")
-            elif line.startswith("Read Length"):
-                file.write(f"Read Length           = {length}\n")
-            elif line.startswith("Forward reads"):
-                file.write(f"Forward reads         = {input_file_R1}\n")
-            elif line.startswith("Reverse reads"):
-                file.write(f"Reverse reads         = {input_file_R2}\n")
-            elif line.startswith("Output path"):
-                file.write(f"Output path           = {output_folder}\n")
-            elif line.startswith("Reference sequence") or \
-                 line.startswith("Chloroplast sequence") or \
-                 line.startswith("Insert size"):
-                file.write(f"{line.split('=')[0]} =\n")  # Оставляем только ключевое слово и знак равенства
-            else:
-                file.write(line)  # Не меняем остальные строки
-
 
+# Одна сборка NOVOPlasty (митохондрия или хлоропласт) в своей папке и со своим файлом конфигурации,
+# поэтому сборки органелл одного образца и разных образцов могут идти одновременно
+def assemble_novo_organelle(folder_name, organelle, input_file_R1, input_file_R2, output_folder,
+                            kmer_size, length, config_template, seed_file, max_memory_gb=None, check=False):
+    organelle_folder = os.path.join(output_folder, organelle) + '/'
+    os.makedirs(organelle_folder, exist_ok=True)
+    values = config_values(folder_name, organelle, kmer_size, length, seed_file,
+                           input_file_R1, input_file_R2, organelle_folder, max_memory_gb)
+    config_file_path = write_config(config_template, os.path.join(output_folder, f'config_{organelle}.txt'), values)
+    return run_command(f"{NOVOPLASTY} -c {config_file_path}", check=check)
+
+# Задачи NOVOPlasty для митохондрий и хлоропластов одного образца; память каждой задачи
+# ограничена через Max memory в конфигурации
+def novo_jobs(folder_name, input_file_R1, input_file_R2, output_folder,
+              kmer_size, length, config_template, seed_file_mito, seed_file_chloro):
+    resources = JOB_RESOURCES['novoplasty']
+    jobs = []
+    for organelle, seed_file in (('mito', seed_file_mito), ('chloro', seed_file_chloro)):
+        action = partial(assemble_novo_organelle, folder_name, organelle, input_file_R1, input_file_R2,
+                         output_folder, kmer_size, length, config_template, seed_file, resources['mem_gb'])
+        jobs.append(Job(f"{folder_name}_{organelle}", action, resources['threads'], resources['mem_gb']))
+    return jobs
+
+# Сборка митохондрий и хлоропластов NOVOPlasty для одного образца: обе органеллы запускаются параллельно
+def assemble_novo_sample(folder_name, input_file_R1, input_file_R2, output_folder,
+                         kmer_size, length, config_template, seed_file_mito, seed_file_chloro):
+    return sum(run_jobs(novo_jobs(folder_name, input_file_R1, input_file_R2, output_folder,
+                                  kmer_size, length, config_template, seed_file_mito, seed_file_chloro)).values())
 
 # ABySS
+def abyss_command(input_file_R1, input_file_R2, output_folder, folder_name, kmer_size):
+    resources = JOB_RESOURCES['abyss']
+    return f"{ABYSS_PE} k={kmer_size} name={folder_name} in='{input_file_R1} {input_file_R2}' -C {output_folder} j={resources['threads']} B={resources['mem_gb']}G"
+
 def assemble_abyss(input_files, output_dir, kmer_size):
-    total_elapsed_time = 0
     processed_pairs = set()  # Множество для хранения обработанных пар файлов
+    jobs = []
+    resources = JOB_RESOURCES['abyss']
 
     for file_name in os.listdir(input_files):
         if file_name.endswith("_paired_R1.fastq.gz"):
@@ -206,111 +402,168 @@ def assemble_abyss(input_files, output_dir, kmer_size):
             file_pair = (input_file_R1, input_file_R2)
 
             if file_pair not in processed_pairs: #Проверка, была ли эта пара файлов уже обработана
-                command = f"{ABYSS_PE} k={kmer_size} name={folder_name} in='{input_file_R1} {input_file_R2}' -C {output_folder} j=12 B=30G"
-                elapsed_time = run_command(command)
-                total_elapsed_time += elapsed_time
+                command = abyss_command(input_file_R1, input_file_R2, output_folder, folder_name, kmer_size)
+                jobs.append(Job(folder_name, command, resources['threads'], resources['mem_gb']))
                 processed_pairs.add(file_pair) #Добавление пары файлов в множество processed_pairs
 
+    elapsed_times = run_jobs(jobs)
+    total_elapsed_time = sum(elapsed_times.values())
     print(f"Total time for processing: {total_elapsed_time:.2f} seconds")
     return total_elapsed_time
 
+# Перебор k для одного образца: сборки с разными k идут волнами по width штук в пределах ресурсов задачи,
+# оцениваются по N50 и суммарной длине, перебор останавливается, когда прирост прекращается.
+# В output_folder остаются только файлы лучшей сборки и kmer_sweep.json с оценками всех k
+def kmer_sweep_sample(assembler, sample, input_file_R1, input_file_R2, output_folder, candidates,
+                      width=KMER_SWEEP_WIDTH, extra_options=''):
+    resources = JOB_RESOURCES[assembler]
+    sweep_dir = os.path.join(output_folder, 'kmer_sweep')
+
+    def run_dir(kmer_size):
+        return os.path.join(sweep_dir, f"k{kmer_size}")
+
+    def contigs_path(kmer_size):
+        if assembler == 'spades':
+            return os.path.join(run_dir(kmer_size), 'contigs.fasta')
+        return os.path.join(run_dir(kmer_size), f"{sample}-contigs.fa")
+
+    def run_wave(kmers):
+        jobs = []
+        for kmer_size in kmers:
+            os.makedirs(run_dir(kmer_size), exist_ok=True)
+            if assembler == 'spades':
+                command = spades_command(input_file_R1, input_file_R2, run_dir(kmer_size), kmer_size, extra_options)
+            else:
+                command = abyss_command(input_file_R1, input_file_R2, run_dir(kmer_size), sample, kmer_size)
+            jobs.append(Job(f"{sample} k={kmer_size}", command, resources['threads'], resources['mem_gb']))
+        # Волна выполняется в пределах ресурсов задачи (на width сборок)
+        return run_jobs(jobs)
+
+    summary = sweep_kmers(candidates, run_wave, contigs_path, GENOME_SIZE_MB * 1e6, width, KMER_SWEEP_MIN_GAIN)
+    best_k = summary['best_k']
+    print(f"Best k for {sample} ({assembler}): {best_k}")
+    keep_best_run(sweep_dir, run_dir(best_k) if best_k is not None else None, output_folder, summary)
+    return summary['elapsed_time']
+
 
 #quast
 
+def quast_command(contigs_files, output_dir):
+    threads = JOB_RESOURCES['quast']['threads']
+    return f"{QUAST} {' '.join(contigs_files)} -o {output_dir} -t {threads}"
+
+# Подпись сборки в отчете, как у QUAST: имя файла без расширения
+def assembly_label(path):
+    name = os.path.basename(path)
+    for suffix in ('.gz', '.fasta', '.fa', '.fna'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name
+
+# QUAST одной сборки в папку кэша; результат переносится в кэш только целиком
+def quast_assembly(contigs_file, entry_dir):
+    tmp_dir = entry_dir + '.tmp'
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    elapsed_time = run_command(quast_command([contigs_file], tmp_dir))
+    if os.path.exists(os.path.join(tmp_dir, 'report.tsv')):
+        if os.path.exists(entry_dir):
+            shutil.rmtree(entry_dir)
+        os.replace(tmp_dir, entry_dir)
+    return elapsed_time
+
+# QUAST только для новых или изменившихся сборок (кэш по SHA-256 файла контигов), новые сборки
+# оцениваются параллельно; общий report.tsv собирается из отчетов отдельных сборок
+def quast_incremental(contigs_files, output_dir, labels=None, cache_dir=None):
+    cache = QuastCache(cache_dir or os.path.join(output_dir, 'assemblies'))
+    labels = labels or [assembly_label(file) for file in contigs_files]
+    # Одинаковые имена (например, contigs.fasta в папке каждого образца) дополняем именем папки
+    if len(set(labels)) < len(labels):
+        labels = [f"{os.path.basename(os.path.dirname(os.path.abspath(file)))}_{label}"
+                  for file, label in zip(contigs_files, labels)]
+
+    digests = {label: cache.digest(file) for file, label in zip(contigs_files, labels)}
+    jobs, queued = [], set()
+    resources = JOB_RESOURCES['quast']
+    for file, label in zip(contigs_files, labels):
+        digest = digests[label]
+        if cache.report(digest) is None and digest not in queued:
+            queued.add(digest)
+            os.makedirs(os.path.dirname(cache.entry_dir(digest)), exist_ok=True)
+            jobs.append(Job(f"QUAST {label}", partial(quast_assembly, file, cache.entry_dir(digest)),
+                            resources['threads'], resources['mem_gb']))
+    cache.save_index()
+    print(f"QUAST: {len(jobs)} new or changed assemblies, {len(contigs_files) - len(jobs)} cached")
+    elapsed_time = sum(run_jobs(jobs).values()) if jobs else 0
+
+    reports = {label: cache.report(digest) for label, digest in digests.items()}
+    missing = [label for label, report in reports.items() if report is None]
+    if missing:
+        print(f"QUAST failed for: {', '.join(missing)}")
+    merge_reports({label: report for label, report in reports.items() if report}, output_dir)
+    return elapsed_time
+
+# Общий отчет QUAST для группы из отчетов отдельных образцов: reports - {подпись: report.tsv}
+def merge_quast_reports(reports, output_dir):
+    existing = {label: report for label, report in reports.items() if os.path.exists(report)}
+    if not existing:
+        print(f"No QUAST reports to merge into {output_dir}")
+        return 0
+    merge_reports(existing, output_dir)
+    print(f"Merged {len(existing)} QUAST reports into {output_dir}")
+    return 0
+
 def quast(contigs_dir, output_dir):
     all_contigs_files = []
     
-    # Проходим по всем папкам в contigs_dir
-    for folder_name in os.listdir(contigs_dir):
-        folder_path = os.path.join(contigs_dir, folder_name)
-        
-        # Проверяем, что это директория
-        if os.path.isdir(folder_path):
-            # Ищем все файлы, включающие в себя 'contigs.fa'
-            for file in os.listdir(folder_path):
-                if fnmatch.fnmatch(file, '*contigs.fa*'):
-                    all_contigs_files.append(os.path.join(folder_path, file))
+    # Ищем все файлы, включающие в себя 'contigs.fa', в папках образцов внутри contigs_dir
+    for artifact in artifact_index.query(contigs_dir, kind='contigs', max_depth=2):
+        if artifact.sample:
+            all_contigs_files.append(artifact.path)
     
     # Проверяем, найдены ли файлы
+    # Сборки ниже порогов быстрой статистики в QUAST не передаются
+    all_contigs_files = filter_assemblies(all_contigs_files, output_dir, CONTIG_THRESHOLDS, GENOME_SIZE_MB * 1e6)
     if all_contigs_files:
         # Создаем основную директорию для вывода, если она не существует
         os.makedirs(output_dir, exist_ok=True)
         
-        # Формируем команду с учетом всех файлов
-        contigs_files_str = ' '.join(all_contigs_files)
-        command = f"{QUAST} {contigs_files_str} -o {output_dir} -t 8"
-        
-        # Запускаем команду и измеряем время выполнения
-        elapsed_time = run_command(command)
+        # Оцениваем только новые сборки и собираем общий отчет
+        elapsed_time = quast_incremental(all_contigs_files, output_dir)
         return elapsed_time
     else:
         print("No files matching 'contigs.fa' found in the specified directory.")
 
-# Модификация файла NOVOPlasty для обработки программой QUAST 
-def modify_contig_files(contig_files, output_dir):
-    modified_contigs = []
-    for contig_file in contig_files:
-        modified_file = os.path.join(output_dir, os.path.basename(contig_file))
-        shutil.copy(contig_file, modified_file)
-
-        # Заменяем '*' на 'N'
-        with open(modified_file, 'r') as f:
-            content = f.read()
-        
-        content = content.replace('*', 'N')
-
-        with open(modified_file, 'w') as f:
-            f.write(content)
-        
-        # Добавляем модифицированный файл в список для команды
-        modified_contigs.append(modified_file)
-    
-    return modified_contigs
+# Поиск файлов NOVOPlasty в папке образца: Circularized, а если их нет - Contigs
+def find_novo_contigs(folder_path):
+    folder_path = os.path.abspath(folder_path)
+    # Один проход по индексу вместо os.listdir для каждой органеллы и каждого шаблона
+    subdirs = artifact_index.subdirs(folder_path)
+    artifacts = artifact_index.query(folder_path, max_depth=2, refresh=False)
+    found = {}
+    for organelle in ('mito', 'chloro'):
+        # Каждая органелла собирается в своей подпапке; старые результаты лежат прямо в папке образца
+        organelle_path = os.path.join(folder_path, organelle)
+        if organelle_path not in subdirs:
+            organelle_path = folder_path
+        files = {'circularized': [], 'novo_contigs': []}
+        for artifact in artifacts:
+            if artifact.kind in files and os.path.dirname(artifact.path) == organelle_path and \
+                    artifact.path.endswith(f'_{organelle}.fasta'):
+                files[artifact.kind].append(artifact.path)
+        # Contigs берутся, только если файлы Circularized не найдены
+        found[organelle] = files['circularized'] or files['novo_contigs']
+    return found['mito'], found['chloro']
 
 def quast_novo(contigs_dir, output_dir):
     contigs_to_modify_mito = []
     contigs_to_modify_chloro = []
 
-    # Проходим по всем папкам в contigs_dir
-    for folder_name in os.listdir(contigs_dir):
-        folder_path = os.path.join(contigs_dir, folder_name)
-
-        # Проверяем, что это директория
-        if os.path.isdir(folder_path):
-            # Первый цикл для митохондриальных файлов
-            found_circularized_mito = False
-
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-    
-                if fnmatch.fnmatch(file, 'Circularized*_mito.fasta'):
-                    contigs_to_modify_mito.append(file_path)
-                    found_circularized_mito = True
-
-            # Проверяем наличие Contigs, только если файлы Circularized не найдены
-            if not found_circularized_mito:
-                for file in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, file)
-                    if fnmatch.fnmatch(file, 'Contigs*_mito.fasta'):
-                        contigs_to_modify_mito.append(file_path)
-
-            # Второй цикл для хлоропластных файлов
-            found_circularized_chloro = False
-
-            for file in os.listdir(folder_path):
-                file_path = os.path.join(folder_path, file)
-    
-                if fnmatch.fnmatch(file, 'Circularized*_chloro.fasta'):
-                    contigs_to_modify_chloro.append(file_path)
-                    found_circularized_chloro = True
-
-            # Проверяем наличие Contigs, только если файлы Circularized не найдены
-            if not found_circularized_chloro:
-                for file in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, file)
-                    if fnmatch.fnmatch(file, 'Contigs*_chloro.fasta'):
-                        contigs_to_modify_chloro.append(file_path)
-                    
+    # Проходим по всем папкам образцов в contigs_dir
+    for folder_path in artifact_index.subdirs(contigs_dir):
+        mito, chloro = find_novo_contigs(folder_path)
+        contigs_to_modify_mito.extend(mito)
+        contigs_to_modify_chloro.extend(chloro)
 
     # Проверка на наличие файлов
     if not contigs_to_modify_mito and not contigs_to_modify_chloro:
@@ -323,72 +576,143 @@ def quast_novo(contigs_dir, output_dir):
     os.makedirs(mito_output_dir, exist_ok=True)
     os.makedirs(chloro_output_dir, exist_ok=True)
 
-    # Модифицируем файлы и получаем списки модифицированных файлов
-    modified_contigs_mito = modify_contig_files(contigs_to_modify_mito, mito_output_dir)
-    modified_contigs_chloro = modify_contig_files(contigs_to_modify_chloro, chloro_output_dir)
-
-    # Формируем команды для _mito и _chloro
-    command_mito = f"{QUAST} {' '.join(modified_contigs_mito)} -o {mito_output_dir} -t 12"
-    command_chloro = f"{QUAST} {' '.join(modified_contigs_chloro)} -o {chloro_output_dir} -t 12"
-
-    # Запускаем команды и измеряем время выполнения
-    total_time = run_command(command_mito) + run_command(command_chloro)
+    # Подготавливаем файлы (ссылки или нормализованные копии) и получаем списки путей для команды
+    staging = StagingArea(os.path.join(output_dir, 'staged'))
+    modified_contigs_mito = staging.view('mito', contigs_to_modify_mito)
+    modified_contigs_chloro = staging.view('chloro', contigs_to_modify_chloro)
+
+    # Оцениваем только новые сборки для _mito и _chloro и измеряем время выполнения
+    total_time = 0
+    if modified_contigs_mito:
+        total_time += quast_incremental(modified_contigs_mito, mito_output_dir)
+    if modified_contigs_chloro:
+        total_time += quast_incremental(modified_contigs_chloro, chloro_output_dir)
     print (f"Total time for processing: {total_time:.2f} seconds")
     return total_time
 
+# Файлы NOVOPlasty одной органеллы образца в общей папке staging_dir (представление образец_органелла):
+# QUAST и BUSCO этой органеллы используют одни и те же подготовленные файлы.
+# Отсутствие контигов органеллы - ошибка задачи, чтобы она не попала в журнал и кэш как выполненная
+def stage_novo_contigs(folder_path, organelle, staging_dir):
+    contigs_mito, contigs_chloro = find_novo_contigs(folder_path)
+    contigs = contigs_mito if organelle == 'mito' else contigs_chloro
+    if not contigs:
+        raise FileNotFoundError(f"No NOVOPlasty {organelle} contigs found in {folder_path}")
+    view = f"{os.path.basename(os.path.normpath(folder_path))}_{organelle}"
+    staging = StagingArea(staging_dir)
+    return staging.view(view, contigs), staging.view_dir(view)
+
+# QUAST для файлов NOVOPlasty одной органеллы образца
+def quast_novo_organelle(folder_path, organelle, output_dir, staging_dir):
+    contigs, _ = stage_novo_contigs(folder_path, organelle, staging_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    return run_command(quast_command(contigs, output_dir), check=True)
+
 #busco
 
+def busco_command(input_path, output_dir, lineage_dataset, name=None, threads=None):
+    threads = threads or JOB_RESOURCES['busco']['threads']
+    out_name = f" -o {name}" if name else ""
+    # -f: результаты прошлого (в том числе упавшего) запуска в папке out_path/name перезаписываются
+    return f"{BUSCO} -i {input_path}{out_name} -c {threads} --out_path {output_dir} --mode genome --offline -l {lineage_dataset} --metaeuk -f"
+
+# Файл short_summary, который BUSCO пишет для одной сборки в папку output_dir/name
+def busco_summary_path(output_dir, name, lineage_dataset):
+    lineage = os.path.basename(os.path.normpath(lineage_dataset))
+    return os.path.join(output_dir, name, f"short_summary.specific.{lineage}.{name}.txt")
+
+# Итоги пакетного режима BUSCO (-i папка) в папке output_dir/name
+def busco_batch_summary_path(output_dir, name):
+    return os.path.join(output_dir, name, 'batch_summary.txt')
+
+# Деление файлов на shards групп примерно равного суммарного размера (крупные файлы распределяются первыми)
+def split_shards(files, shards):
+    groups = [[] for _ in range(min(shards, len(files)))]
+    group_sizes = [0] * len(groups)
+    for file in sorted(files, key=os.path.getsize, reverse=True):
+        i = group_sizes.index(min(group_sizes))
+        groups[i].append(file)
+        group_sizes[i] += os.path.getsize(file)
+    return groups
+
+# Общий batch_summary.txt из файлов отдельных частей (заголовок - один раз)
+def merge_busco_batch_summaries(output_dir, shard_names):
+    header, rows = None, []
+    for name in shard_names:
+        batch_summary = os.path.join(output_dir, name, 'batch_summary.txt')
+        if not os.path.exists(batch_summary):
+            continue
+        with open(batch_summary) as f:
+            lines = f.readlines()
+        if lines:
+            header = header or lines[0]
+            rows.extend(lines[1:])
+    if header:
+        with open(os.path.join(output_dir, 'batch_summary.txt'), 'w') as f:
+            f.writelines([header] + rows)
+
+# BUSCO по частям: каждая часть - отдельный запуск со своим -c и своей папкой ссылок на сборки,
+# части выполняются параллельно в пределах бюджета ядер и памяти. Файлы short_summary остаются
+# в папках частей и собираются в result так же, как после одного запуска
+def busco_sharded(files, output_dir, lineage_dataset, names=None, normalize=False,
+                  shards=BUSCO_SHARDS, threads=BUSCO_SHARD_THREADS):
+    names = names or [os.path.basename(file) for file in files]
+    staged_names = dict(zip(files, names))
+    staging = StagingArea(output_dir)
+    jobs, shard_names = [], []
+    for i, shard in enumerate(split_shards(files, shards), start=1):
+        view = f"temp_scaffolds_{i}"
+        staging.view(view, shard, [staged_names[file] for file in shard], normalize=normalize)
+        shard_names.append(f"shard_{i}")
+        command = busco_command(staging.view_dir(view), output_dir, lineage_dataset, name=shard_names[-1],
+                                threads=threads)
+        jobs.append(Job(f"BUSCO {shard_names[-1]}", command, threads, JOB_RESOURCES['busco']['mem_gb']))
+    elapsed_time = sum(run_jobs(jobs).values())
+    merge_busco_batch_summaries(output_dir, shard_names)
+    return elapsed_time
+
+# Файлы short_summary в папке BUSCO (кроме уже собранных в папке result)
+def busco_summary_files(output_dir, result_dir, organelle=None):
+    result_dir = os.path.abspath(result_dir) + os.sep
+    return [artifact.path for artifact in artifact_index.query(output_dir, kind='busco_summary', organelle=organelle)
+            if not artifact.path.startswith(result_dir)]
+
+# Сбор файлов short_summary в папку result и построение диаграммы
+def plot_busco_summaries(output_dir, result_dir, code_dir, pattern='short_summary.*.txt'):
+    summary_files = [path for path in busco_summary_files(output_dir, result_dir)
+                     if fnmatch.fnmatch(os.path.basename(path), pattern)]
+
+    if not summary_files:
+        print(f"No files matching '{pattern}' found in {output_dir}")
+        return 0
+
+    os.makedirs(result_dir, exist_ok=True)
+    for file in summary_files:
+        shutil.copy(file, result_dir)
+    return run_command(f"python3 {code_dir} -wd {result_dir}")
+
 def busco(scaffolds_dir, output_dir, lineage_dataset, code_dir):
     all_scaffolds_files = []
-    temp_scaffolds_dir = os.path.join(output_dir, "temp_scaffolds")
     result_dir = os.path.join(output_dir, "result")
 
-    # Проходим по всем папкам в scaffolds_dir
-    for folder_name in os.listdir(scaffolds_dir):
-        folder_path = os.path.join(scaffolds_dir, folder_name)
-
-        # Проверяем, что это директория
-        if os.path.isdir(folder_path):
-            # Ищем файлы с именем 'scaffolds.fa' и 'Contigs*.fasta'
-            for file in os.listdir(folder_path):
-                if fnmatch.fnmatch(file, '*scaffolds.fa*') or fnmatch.fnmatch(file, 'Contigs*.fasta'):
-                    # Добавляем найденные файлы в список
-                    all_scaffolds_files.append(os.path.join(folder_path, file))
+    # Ищем файлы с именем 'scaffolds.fa' и 'Contigs*.fasta' в папках образцов внутри scaffolds_dir
+    for artifact in artifact_index.query(scaffolds_dir, max_depth=2):
+        if artifact.sample and artifact.kind in ('scaffolds', 'novo_contigs'):
+            all_scaffolds_files.append(artifact.path)
                     
     print (all_scaffolds_files)
+    all_scaffolds_files = filter_assemblies(all_scaffolds_files, output_dir, CONTIG_THRESHOLDS, GENOME_SIZE_MB * 1e6)
     # Проверяем, найдены ли файлы
     if all_scaffolds_files:
-        # Создаем временную директорию для копирования файлов, если она не существует
-        os.makedirs(temp_scaffolds_dir, exist_ok=True)
-
-        # Копируем все найденные файлы во временную директорию с изменением имени
-        for file in all_scaffolds_files:
-            # Извлекаем имя родительской папки для использования в новом имени файла
-            folder_name = os.path.basename(os.path.dirname(file))
-            # Получаем только расширение файла
-            _, extension = os.path.splitext(os.path.basename(file))
-            # Формируем новое имя файла с расширением
-            new_file_name = f"{folder_name}{extension}"
-            # Копируем файл во временную директорию с новым именем
-            shutil.copy(file, os.path.join(temp_scaffolds_dir, new_file_name))     
-
-        # Формируем команду с учетом временной директории
-        command = f"{BUSCO} -i {temp_scaffolds_dir} -c 12 --out_path {output_dir} --mode genome --offline -l {lineage_dataset} --metaeuk"
-        
-        # Запускаем команду и измеряем время выполнения
-        elapsed_time_busco = run_command(command)
-        
-        # Удаляем временную директорию после завершения анализа
-        shutil.rmtree(temp_scaffolds_dir)
+        # Файлы во временных директориях - ссылки на найденные файлы с именем родительской папки и расширением
+        new_file_names = [os.path.basename(os.path.dirname(file)) + os.path.splitext(file)[1]
+                          for file in all_scaffolds_files]
+
+        # Запускаем BUSCO по частям и измеряем время выполнения
+        elapsed_time_busco = busco_sharded(all_scaffolds_files, output_dir, lineage_dataset, new_file_names)
         
         # Ищем файлы результатов
-        all_summary_files = []
-        
-        # Проходим по всем папкам в output_dir
-        for root, dirs, files in os.walk(output_dir):
-            for file in files:
-                if fnmatch.fnmatch(file, 'short_summary.*.txt'):
-                    all_summary_files.append(os.path.join(root, file))
+        all_summary_files = busco_summary_files(output_dir, result_dir)
         
         # Проверяем, найдены ли файлы
         if all_summary_files:
@@ -415,108 +739,21 @@ def busco(scaffolds_dir, output_dir, lineage_dataset, code_dir):
             return total_elapsed_time
 
 #Модификация файлов NOVOPlasty для обработки программой BUSCO
-def process_file(file_path, temp_scaffolds_dir):
-    # Открываем текущий файл для чтения
-    with open(file_path, 'r') as f:
-        lines = f.readlines()  # Читаем все строки файла
-
-    # Словарь для отслеживания количества заголовков
-    seen_counts = {}
-    new_lines = []
-
-    # Проходим по каждой строке в файле
-    for line in lines:
-        # Заменяем '*' на 'N' в строке
-        line = line.replace('*', 'N')
-        if line.startswith('>'):  # Проверяем, начинается ли строка с символа '>'
-            if line in seen_counts:
-                seen_counts[line] += 1  # Увеличиваем счетчик для дубликата
-                new_line = f"{line.strip()}({seen_counts[line]})\n"
-                new_lines.append(new_line)  # Добавляем обновленную строку в список
-            else:
-                seen_counts[line] = 1  # Если уникальная, добавляем ее в словарь
-                new_lines.append(line)  # Добавляем строку без изменений
-        else:
-            new_lines.append(line)  # Если не заголовок, добавляем без изменений
-
-    # Сохраняем обновленный файл во временной директории
-    output_file_path = os.path.join(temp_scaffolds_dir, os.path.basename(file_path))
-    with open(output_file_path, 'w') as f_out:
-        f_out.writelines(new_lines)  # Записываем все обновленные строки в новый файл 
-           
 def busco_novo(scaffolds_dir, output_dir, lineage_dataset, code_dir):
-    temp_scaffolds_dir = os.path.join(output_dir, "temp_scaffolds")
     result_dir = os.path.join(output_dir, "result")
     
-    # Создаем временную директорию, если она не существует
-    os.makedirs(temp_scaffolds_dir, exist_ok=True)
-
-    # Проходим по всем папкам в scaffolds_dir
-    for folder_name in os.listdir(scaffolds_dir):
-        folder_path = os.path.join(scaffolds_dir, folder_name)
-
-        # Проверяем, что это директория
-        if os.path.isdir(folder_path):
-            contigs_to_modify_mito = []
-            contigs_to_modify_chloro = []
-
-            # Проверяем, что это директория
-            if os.path.isdir(folder_path):
-                # Первый цикл для митохондриальных файлов
-                found_circularized_mito = False
-
-                for file in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, file)
-    
-                    if fnmatch.fnmatch(file, 'Circularized*_mito.fasta'):
-                        contigs_to_modify_mito.append(file_path)
-                        found_circularized_mito = True
-
-                # Проверяем наличие Contigs, только если файлы Circularized не найдены
-                if not found_circularized_mito:
-                    for file in os.listdir(folder_path):
-                        file_path = os.path.join(folder_path, file)
-                        if fnmatch.fnmatch(file, 'Contigs*_mito.fasta'):
-                            contigs_to_modify_mito.append(file_path)
-
-                # Второй цикл для хлоропластных файлов
-                found_circularized_chloro = False
-
-                for file in os.listdir(folder_path):
-                    file_path = os.path.join(folder_path, file)
-    
-                    if fnmatch.fnmatch(file, 'Circularized*_chloro.fasta'):
-                        contigs_to_modify_chloro.append(file_path)
-                        found_circularized_chloro = True
-
-                # Проверяем наличие Contigs, только если файлы Circularized не найдены
-                if not found_circularized_chloro:
-                    for file in os.listdir(folder_path):
-                        file_path = os.path.join(folder_path, file)
-                        if fnmatch.fnmatch(file, 'Contigs*_chloro.fasta'):
-                            contigs_to_modify_chloro.append(file_path)
-   
-            # Обработка файлов для митохондрий
-            for file_path in contigs_to_modify_mito:
-                process_file(file_path, temp_scaffolds_dir)
-
-            # Обработка файлов для хлоропластов
-            for file_path in contigs_to_modify_chloro:
-                process_file(file_path, temp_scaffolds_dir)
-
-    # Формируем команду с учетом временной директории
-    command = f"{BUSCO} -i {temp_scaffolds_dir} -c 12 --out_path {output_dir} --mode genome --offline -l {lineage_dataset} --metaeuk"
-    elapsed_time_busco = run_command(command)
-    shutil.rmtree(temp_scaffolds_dir)
-    mito_files = []
-    chloro_files = []
-    
-    for root, dirs, files in os.walk(output_dir):
-        for file in files:
-            if fnmatch.fnmatch(file, 'short_summary.*mito*.txt'):
-                mito_files.append(os.path.join(root, file))
-            elif fnmatch.fnmatch(file, 'short_summary.*chloro*.txt'):
-                chloro_files.append(os.path.join(root, file))
+    novo_contigs = []
+
+    # Проходим по всем папкам образцов в scaffolds_dir
+    for folder_path in artifact_index.subdirs(scaffolds_dir):
+        contigs_to_modify_mito, contigs_to_modify_chloro = find_novo_contigs(folder_path)
+        novo_contigs.extend(contigs_to_modify_mito + contigs_to_modify_chloro)
+
+    # Ссылки на файлы митохондрий и хлоропластов; нормализуются только файлы с '*' или повторами заголовков.
+    # BUSCO запускается по частям
+    elapsed_time_busco = busco_sharded(novo_contigs, output_dir, lineage_dataset, normalize=True)
+    mito_files = busco_summary_files(output_dir, result_dir, 'mito')
+    chloro_files = busco_summary_files(output_dir, result_dir, 'chloro')
     
      # Создание директории для копирования
     if mito_files or chloro_files:
@@ -543,132 +780,522 @@ def busco_novo(scaffolds_dir, output_dir, lineage_dataset, code_dir):
         return total_elapsed_time
 
     
+# BUSCO для файлов NOVOPlasty одной органеллы образца: пакетный режим по папке подготовленных файлов,
+# результаты - в папке output_dir/органелла
+def busco_novo_organelle(folder_path, organelle, output_dir, lineage_dataset, staging_dir):
+    _, staged_dir = stage_novo_contigs(folder_path, organelle, staging_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    return run_command(busco_command(staged_dir, output_dir, lineage_dataset, name=organelle), check=True)
+
+def plot_busco_novo_summaries(output_dir, code_dir):
+    result_dir = os.path.join(output_dir, 'result')
+    return (plot_busco_summaries(output_dir, os.path.join(result_dir, 'mito'), code_dir, 'short_summary.*mito*.txt') +
+            plot_busco_summaries(output_dir, os.path.join(result_dir, 'chloro'), code_dir, 'short_summary.*chloro*.txt'))
+
 # Функция для создания отчета в excel
-def create_excel_report(output_file, program_info):
-    # Преобразуем данные в DataFrame
-    df = pd.DataFrame(list(program_info.items()), columns=['Название программы', 'Время выполнения (с)'])
-
-    # Проверяем, существует ли файл
-    if os.path.exists(output_file):
-        # Если файл существует, то добавляем данные в конец
-        with pd.ExcelWriter(output_file, engine='openpyxl', mode='a', if_sheet_exists='overlay') as writer:
-            # Найдем последнюю строку, чтобы добавить новые данные после старых
-            startrow = writer.sheets['Sheet1'].max_row
-            df.to_excel(writer, index=False, header=False, startrow=startrow)
-        print(f"Новые данные добавлены в {output_file}")
-    else:
-        # Если файл не существует, создаем новый и записываем данные
-        df.to_excel(output_file, index=False)
-        print(f"Отчет сохранен в {output_file}")
-    
+# Отчет Excel строится заново из базы телеметрии за один проход: лист Sheet1 - время этапов по всем запускам,
+# остальные листы - extra_sheets (имя листа -> строки сводной таблицы или DataFrame: QC, прореживание, сборки)
+def create_excel_report(output_file, history, extra_sheets=None):
+    df = pd.DataFrame([[row['run_id'], row['started'], row['program'], row['elapsed_s']] for row in history],
+                      columns=['Запуск', 'Дата', 'Название программы', 'Время выполнения (с)'])
+    extra_sheets = {name: rows for name, rows in (extra_sheets or {}).items() if len(rows)}
+    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
+        df.to_excel(writer, sheet_name='Sheet1', index=False)
+        for name, rows in extra_sheets.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=name, index=False)
+    print(f"Отчет сохранен в {output_file}")
+
+# Старый отчет (две колонки на листе Sheet1, строки дописывались после каждого запуска) переносится в базу
+# один раз, чтобы история не потерялась при первой перезаписи отчета
+def import_excel_history(output_file):
+    if not os.path.exists(output_file):
+        return 0
+    df = pd.read_excel(output_file, sheet_name='Sheet1')
+    if list(df.columns) != ['Название программы', 'Время выполнения (с)']:
+        return 0
+    imported = telemetry.import_history(list(df.itertuples(index=False, name=None)))
+    if imported:
+        print(f"Imported {imported} rows from {output_file} into {telemetry.path}")
+    return imported
+
+# Отчеты QUAST и BUSCO всех сборок для сравнения сборщиков: (тип, путь, ключ сборки)
+def assembly_result_files(config, tiers):
+    files = []
+    for tier in tiers:
+        for assembler in ASSEMBLERS:
+            for kind, stage in (('quast_report', f'quast_{assembler}'), ('busco_summary', f'busco_{assembler}')):
+                root = config[stage][tier]
+                if not os.path.isdir(root):
+                    continue
+                # В папке result - копии short_summary для диаграммы
+                for artifact in artifact_index.query(root, kind=kind):
+                    if artifact.sample in (None, 'result'):
+                        continue
+                    files.append((kind, artifact.path, {'sample': artifact.sample, 'assembler': assembler,
+                                                        'tier': tier, 'organelle': artifact.organelle or ''}))
+    return files
+
+# Граф конвейера
+# Этапы, которые можно выбрать из командной строки
+STAGES = ['qc', 'trim', 'classify', 'subsample', 'spades', 'novo', 'abyss', 'contig_stats',
+          'quast_spades', 'quast_abyss', 'quast_novo',
+          'busco_spades', 'busco_abyss', 'busco_novo']
+TIERS = ['good', 'bad']
+ASSEMBLERS = ['spades', 'abyss', 'novo']
+# Этапы, время и CPU которых считаются стоимостью сборки в сравнении сборщиков
+ASSEMBLY_STAGES = ['spades', 'abyss', 'novo_mito', 'novo_chloro']
+
+# Названия этапов для отчета в excel
+STAGE_LABELS = {
+    'qc': 'FastQC',
+    'trim': 'Trimmomatic',
+    'classify': 'Classification',
+    'subsample': 'Subsampling',
+    'spades': 'SPAdes',
+    'novo_mito': 'NOVOPlasty_mito',
+    'novo_chloro': 'NOVOPlasty_chloro',
+    'abyss': 'ABySS',
+    'contig_stats_spades': 'Contig_stats_spades',
+    'contig_stats_abyss': 'Contig_stats_abyss',
+    'quast_spades': 'QUAST_spades',
+    'quast_abyss': 'QUAST_abyss',
+    'quast_novo': 'QUAST_novo',
+    'quast_novo_mito': 'QUAST_novo_mito',
+    'quast_novo_chloro': 'QUAST_novo_chloro',
+    'quast_report': 'QUAST_report',
+    'busco_spades': 'BUSCO_spades',
+    'busco_abyss': 'BUSCO_abyss',
+    'busco_novo': 'BUSCO_novo',
+    'busco_novo_mito': 'BUSCO_novo_mito',
+    'busco_novo_chloro': 'BUSCO_novo_chloro',
+}
+
+# count - число одновременных запусков инструмента внутри задачи (перебор k)
+def task_resources(tool, count=1):
+    resources = JOB_RESOURCES[tool]
+    return {'cores': resources['threads'] * count, 'mem_gb': resources['mem_gb'] * count,
+            'disk_gb': resources['disk_gb'] * count}
+
+# Имена образцов по файлам с заданным окончанием
+def list_samples(directory, suffix):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(file_name[:-len(suffix)] for file_name in os.listdir(directory) if file_name.endswith(suffix))
+
+def paired_reads(reads_dir, sample):
+    return [os.path.join(reads_dir, f"{sample}_paired_{read}.fastq.gz") for read in ('R1', 'R2')]
+
+# Задачи QC и фильтрации для одного образца из папки с исходными FASTQ
+def raw_sample_tasks(config, stages, sample):
+    tasks = []
+    fastq_dir = config['fastq']
+    input_file_R1 = os.path.join(fastq_dir, f"{sample}_R1_001.fastq.gz")
+    input_file_R2 = os.path.join(fastq_dir, f"{sample}_R2_001.fastq.gz")
+    raw_reads = [input_file_R1, input_file_R2]
+
+    if 'qc' in stages:
+        qc_dir = config['qc_output']
+        os.makedirs(qc_dir, exist_ok=True)
+        threads = JOB_RESOURCES['fastqc']['threads']
+        if config['qc_engine'] == 'native':
+            reports = [qc_json_path(path, qc_dir) for path in raw_reads]
+            task_action = {'func': partial(qc_files, raw_reads, qc_dir, workers=threads), 'tool': 'python3'}
+        else:
+            reports = [os.path.join(qc_dir, f"{sample}_{read}_001_fastqc.html") for read in ('R1', 'R2')]
+            task_action = {'command': f"{FASTQC_BIN} {input_file_R1} {input_file_R2} -t {threads} -o {qc_dir}"}
+        tasks.append(Task('qc', sample, inputs=raw_reads, outputs=reports, **task_action,
+                          **task_resources('fastqc')))
+
+    if 'trim' in stages:
+        trimmed_dir = config['trimmed']
+        os.makedirs(trimmed_dir, exist_ok=True)
+        action = trim_action(config['trim_engine'], trimmomatic_jar, input_file_R1, input_file_R2, trimmed_dir, sample)
+        if callable(action):
+            task_action = {'func': action, 'tool': 'python3'}
+        else:
+            task_action = {'command': action}
+        # Непарные прочтения дальше не используются и могут оказаться пустыми
+        paired_R1, unpaired_R1, paired_R2, unpaired_R2 = trimmed_files(trimmed_dir, sample)
+        tasks.append(Task('trim', sample, inputs=raw_reads, outputs=[paired_R1, paired_R2],
+                          optional_outputs=[unpaired_R1, unpaired_R2], **task_action, **task_resources('trimmomatic')))
+    return tasks
+
+# Задачи сборки, QUAST и BUSCO для одного образца из группы good/bad
+def tier_sample_tasks(config, stages, tier, sample):
+    tasks = []
+    reads = paired_reads(config['reads'][tier], sample)
+    lineage_dataset = config['lineage_dataset']
+
+    spades_folder = os.path.join(config['spades'][tier], sample)
+    spades_contigs = os.path.join(spades_folder, 'contigs.fasta')
+    spades_scaffolds = os.path.join(spades_folder, 'scaffolds.fasta')
+    abyss_folder = os.path.join(config['abyss'][tier], sample)
+    abyss_contigs = os.path.join(abyss_folder, f"{sample}-contigs.fa")
+    abyss_scaffolds = os.path.join(abyss_folder, f"{sample}-scaffolds.fa")
+    novo_folder = os.path.join(config['novo'][tier], sample)
+
+    # SPAdes и ABySS собирают прореженные прочтения, NOVOPlasty - полные (ему нужна вся глубина по органеллам)
+    assembly_reads = reads
+    if 'subsample' in stages:
+        subsample_dir = config['subsampled'][tier]
+        assembly_reads = paired_reads(subsample_dir, sample)
+        metrics_file = classification_path(config['classify_output'], sample)
+        func = partial(subsample_sample, sample, reads, assembly_reads, config['target_depth'],
+                       CLASSIFY_THRESHOLDS['genome_size_mb'], metrics_file)
+        # Прореженные прочтения нужны только сборщикам и удаляются после них
+        tasks.append(Task('subsample', sample, func=func, inputs=reads,
+                          outputs=assembly_reads + [subsample_json_path(subsample_dir, sample)],
+                          intermediates=[(DELETE, path) for path in assembly_reads],
+                          tier=tier, tool='python3', cores=2, mem_gb=2))
+
+    # С --kmer-sweep сборка - перебор k в одной задаче, которой выделены ресурсы на width сборок сразу
+    sweep_width = config['kmer_sweep_width'] if config['kmer_sweep'] else 1
+
+    if 'spades' in stages:
+        extra_options = SPADES_BAD_TIER_OPTIONS if config['cheap_bad_tier'] and tier == 'bad' else ''
+        if config['kmer_sweep']:
+            func = partial(kmer_sweep_sample, 'spades', sample, *assembly_reads, spades_folder,
+                           config['spades_kmer_candidates'], sweep_width, extra_options)
+            task_action = {'func': func, 'tool': SPADES}
+        else:
+            task_action = {'command': spades_command(*assembly_reads, spades_folder, config['spades_kmer'],
+                                                     extra_options)}
+        intermediates = [(action, os.path.join(spades_folder, pattern)) for action, pattern in SPADES_INTERMEDIATES]
+        tasks.append(Task('spades', sample, inputs=assembly_reads, outputs=[spades_contigs, spades_scaffolds],
+                          intermediates=intermediates, tier=tier, **task_action,
+                          **task_resources('spades', sweep_width)))
+
+    # Митохондрии и хлоропласты - отдельные задачи: они идут параллельно, пока хватает памяти
+    novo_outputs = [os.path.join(novo_folder, organelle) for organelle in ('mito', 'chloro')]
+    if 'novo' in stages:
+        for organelle, organelle_folder in zip(('mito', 'chloro'), novo_outputs):
+            seed_file = config[f'seed_{organelle}']
+            func = partial(assemble_novo_organelle, sample, organelle, *reads, novo_folder, config['novo_kmer'],
+                           config['read_length'], config['config_template'], seed_file,
+                           JOB_RESOURCES['novoplasty']['mem_gb'], check=True)
+            tasks.append(Task(f'novo_{organelle}', sample, func=func,
+                              inputs=reads + [config['config_template'], seed_file], outputs=[organelle_folder],
+                              tier=tier, tool=NOVOPLASTY, **task_resources('novoplasty')))
+
+    if 'abyss' in stages:
+        os.makedirs(abyss_folder, exist_ok=True)
+        if config['kmer_sweep']:
+            func = partial(kmer_sweep_sample, 'abyss', sample, *assembly_reads, abyss_folder,
+                           config['abyss_kmer_candidates'], sweep_width)
+            task_action = {'func': func, 'tool': ABYSS_PE}
+        else:
+            task_action = {'command': abyss_command(*assembly_reads, abyss_folder, sample, config['abyss_kmer'])}
+        intermediates = [(action, os.path.join(abyss_folder, pattern)) for action, pattern in ABYSS_INTERMEDIATES]
+        tasks.append(Task('abyss', sample, inputs=assembly_reads, outputs=[abyss_contigs, abyss_scaffolds],
+                          intermediates=intermediates, tier=tier, **task_action,
+                          **task_resources('abyss', sweep_width)))
+
+    # Быстрая статистика контигов: QUAST и BUSCO запускаются, только если сборка прошла пороги
+    # (задача статистики создает файл-метку, который добавляется к их входным файлам).
+    # Задача не кэшируется (tool не задан): метка должна создаваться заново при каждом запуске
+    gates = {'spades': [], 'abyss': []}
+    if 'contig_stats' in stages:
+        stats_dir = config['contig_stats'][tier]
+        for assembler, contigs in (('spades', spades_contigs), ('abyss', abyss_contigs)):
+            name = f"{sample}_{assembler}"
+            gates[assembler] = [pass_marker_path(stats_dir, name)]
+            func = partial(assembly_gate, contigs, stats_dir, name, CONTIG_THRESHOLDS, GENOME_SIZE_MB * 1e6)
+            tasks.append(Task(f'contig_stats_{assembler}', sample, func=func, inputs=[contigs],
+                              outputs=[os.path.join(stats_dir, f"{name}_contig_stats.json")],
+                              optional_outputs=gates[assembler], tier=tier, cores=1, mem_gb=2))
+
+    for assembler, contigs in (('spades', spades_contigs), ('abyss', abyss_contigs)):
+        stage = f'quast_{assembler}'
+        if stage in stages:
+            quast_dir = os.path.join(config[stage][tier], sample)
+            tasks.append(Task(stage, sample, command=quast_command([contigs], quast_dir),
+                              inputs=[contigs] + gates[assembler],
+                              outputs=[os.path.join(quast_dir, 'report.tsv')], tier=tier, **task_resources('quast')))
+
+    # QUAST и BUSCO для NOVOPlasty - по задаче на органеллу, как и сборка. Вход - папка органеллы,
+    # а для старых результатов, которые лежат прямо в папке образца, - папка образца
+    novo_inputs = {organelle: [folder] if 'novo' in stages or os.path.isdir(folder) else [novo_folder]
+                   for organelle, folder in zip(('mito', 'chloro'), novo_outputs)}
+    if 'quast_novo' in stages:
+        for organelle in ('mito', 'chloro'):
+            quast_dir = os.path.join(config['quast_novo'][tier], sample, organelle)
+            func = partial(quast_novo_organelle, novo_folder, organelle, quast_dir, config['staging'][tier])
+            tasks.append(Task(f'quast_novo_{organelle}', sample, func=func, inputs=novo_inputs[organelle],
+                              outputs=[os.path.join(quast_dir, 'report.tsv')], tier=tier, tool=QUAST,
+                              **task_resources('quast')))
+
+    for assembler, scaffolds in (('spades', spades_scaffolds), ('abyss', abyss_scaffolds)):
+        stage = f'busco_{assembler}'
+        if stage in stages:
+            busco_dir = config[stage][tier]
+            command = busco_command(scaffolds, busco_dir, lineage_dataset, name=sample)
+            tasks.append(Task(stage, sample, command=command, inputs=[scaffolds] + gates[assembler],
+                              outputs=[busco_summary_path(busco_dir, sample, lineage_dataset)], tier=tier,
+                              **task_resources('busco')))
+
+    # Кроме итогов пакетного режима результатом объявлена вся папка запуска органеллы: файлы short_summary
+    # лежат в ее подпапках под именами подготовленных файлов и должны сохраняться в кэше
+    if 'busco_novo' in stages:
+        busco_dir = os.path.join(config['busco_novo'][tier], sample)
+        for organelle in ('mito', 'chloro'):
+            func = partial(busco_novo_organelle, novo_folder, organelle, busco_dir, lineage_dataset,
+                           config['staging'][tier])
+            tasks.append(Task(f'busco_novo_{organelle}', sample, func=func, inputs=novo_inputs[organelle],
+                              outputs=[busco_batch_summary_path(busco_dir, organelle),
+                                       os.path.join(busco_dir, organelle)],
+                              tier=tier, tool=BUSCO, **task_resources('busco')))
+    return tasks
+
+# У каждого сборщика и каждого этапа QUAST/BUSCO своя папка результатов: при общей папке папка образца была бы
+# результатом нескольких задач, и восстановление одной из них из кэша задело бы файлы другой
+def check_output_roots(config, tiers):
+    for tier in tiers:
+        roots = {}
+        for stage in ['spades', 'abyss', 'novo', 'quast_report', 'staging'] + STAGES[STAGES.index('quast_spades'):]:
+            root = os.path.abspath(config[stage][tier])
+            if root in roots:
+                raise ValueError(f"Stages {roots[root]} and {stage} share the output folder {root} ({tier} reads)")
+            roots[root] = stage
+
+# Построение графа: по одному узлу на (этап, образец), плюс сводные графики BUSCO для каждой группы
+def build_pipeline(config, stages, tiers):
+    check_output_roots(config, tiers)
+    tasks = []
+    raw_samples = list_samples(config['fastq'], '_R1_001.fastq.gz')
+    for sample in raw_samples:
+        tasks.extend(raw_sample_tasks(config, stages, sample))
+
+    # Образцы, которые появятся после фильтрации
+    trimmed_samples = set(list_samples(config['trimmed'], '_paired_R1.fastq.gz'))
+    if 'trim' in stages:
+        trimmed_samples.update(raw_samples)
+
+    # Классификация: ссылки на прочтения появятся только в папке одной из групп,
+    # задачи другой группы будут пропущены из-за отсутствия входных файлов
+    if 'classify' in stages:
+        tier_dirs = {tier: config['reads'][tier] for tier in TIERS}
+        for sample in sorted(trimmed_samples):
+            input_files = paired_reads(config['trimmed'], sample)
+            links = [path for tier_dir in tier_dirs.values() for path in paired_reads(tier_dir, sample)]
+            func = partial(classify_sample, sample, input_files, tier_dirs, config['classify_output'],
+                           CLASSIFY_THRESHOLDS)
+            tasks.append(Task('classify', sample, func=func, inputs=input_files,
+                              outputs=[classification_path(config['classify_output'], sample)],
+                              optional_outputs=links, cores=2, mem_gb=1))
+
+    for tier in tiers:
+        tier_stages = stages
+        if config['cheap_bad_tier'] and tier == 'bad':
+            tier_stages = [stage for stage in stages if stage in BAD_TIER_STAGES]
+
+        samples = set(list_samples(config['reads'][tier], '_paired_R1.fastq.gz'))
+        # Если образца нет в папке группы после фильтрации/классификации, его задачи будут пропущены
+        if 'trim' in stages or 'classify' in stages:
+            samples.update(trimmed_samples)
+        samples = sorted(samples)
+
+        for sample in samples:
+            tasks.extend(tier_sample_tasks(config, tier_stages, tier, sample))
+
+        # Общая таблица QUAST: SPAdes, ABySS и NOVOPlasty всех образцов группы
+        reports, quast_inputs = {}, []
+        for stage in ('quast_spades', 'quast_abyss'):
+            if stage in tier_stages:
+                for sample in samples:
+                    report = os.path.join(config[stage][tier], sample, 'report.tsv')
+                    reports[f"{sample}_{stage[len('quast_'):]}"] = report
+                    quast_inputs.append(report)
+        if 'quast_novo' in tier_stages:
+            for sample in samples:
+                for organelle in ('mito', 'chloro'):
+                    report = os.path.join(config['quast_novo'][tier], sample, organelle, 'report.tsv')
+                    reports[f"{sample}_novo_{organelle}"] = report
+                    quast_inputs.append(report)
+        if reports:
+            func = partial(merge_quast_reports, reports, config['quast_report'][tier])
+            tasks.append(Task('quast_report', 'result', func=func, inputs=quast_inputs, tier=tier,
+                              require_all=False))
+
+        # Графики BUSCO строятся по итогам задач BUSCO образцов и пропускаются, если ни одна из них их не создала
+        for stage in ('busco_spades', 'busco_abyss', 'busco_novo'):
+            if stage in tier_stages:
+                busco_dir = config[stage][tier]
+                if stage == 'busco_novo':
+                    func = partial(plot_busco_novo_summaries, busco_dir, config['code_dir'])
+                    inputs = [busco_batch_summary_path(os.path.join(busco_dir, sample), organelle)
+                              for sample in samples for organelle in ('mito', 'chloro')]
+                else:
+                    func = partial(plot_busco_summaries, busco_dir, os.path.join(busco_dir, 'result'), config['code_dir'])
+                    inputs = [busco_summary_path(busco_dir, sample, config['lineage_dataset']) for sample in samples]
+                tasks.append(Task(stage, 'result', func=func, inputs=inputs, tier=tier, require_all=False))
+    return tasks
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="De novo assembly pipeline: QC, trimming, SPAdes/NOVOPlasty/ABySS, QUAST, BUSCO")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help=f"Comma-separated stages to run: {','.join(STAGES)}")
+    parser.add_argument('--tiers', default=','.join(TIERS),
+                        help=f"Comma-separated read sets to assemble: {','.join(TIERS)}")
+    parser.add_argument('--cores', type=int, default=TOTAL_CORES, help="Total cores available to the pipeline")
+    parser.add_argument('--mem', type=int, default=TOTAL_MEM_GB, help="Total memory (GB) available to the pipeline")
+    parser.add_argument('--report', default='quast.xlsx', help="Excel report with elapsed time per stage")
+    parser.add_argument('--qc-engine', choices=['fastqc', 'native'], default=QC_ENGINE,
+                        help="Run FastQC or the built-in single-pass QC statistics")
+    parser.add_argument('--trim-engine', choices=['trimmomatic', 'native'], default=TRIM_ENGINE,
+                        help="Run Trimmomatic or the built-in NumPy trimmer with the same steps")
+    parser.add_argument('--cheap-bad-tier', action='store_true',
+                        help=f"Run only {','.join(BAD_TIER_STAGES)} with lighter SPAdes settings on the bad read set")
+    parser.add_argument('--target-depth', type=float, default=SUBSAMPLE_TARGET_DEPTH,
+                        help="Coverage the subsample stage reduces reads to before SPAdes and ABySS")
+    parser.add_argument('--csv-dir', help="Also export the telemetry tables (runs, tasks, commands) as CSV here")
+    parser.add_argument('--executor', choices=EXECUTORS, default=EXECUTOR,
+                        help="Run commands locally, in a local process pool or as batch scheduler jobs")
+    parser.add_argument('--job-dir', default=JOB_DIR, help="Shared directory for batch job scripts and results")
+    parser.add_argument('--partition', default=SLURM_PARTITION, help="SLURM partition for submitted jobs")
+    parser.add_argument('--kmer-sweep', action='store_true',
+                        help="Try several k values for SPAdes and ABySS per sample and keep the best assembly")
+    parser.add_argument('--kmer-sweep-width', type=int, default=KMER_SWEEP_WIDTH,
+                        help="Number of k values assembled at the same time for one sample during --kmer-sweep")
+    parser.add_argument('--min-free-disk', type=float, default=MIN_FREE_DISK_GB,
+                        help="Start a task only if this many GB stay free on its output volume after its own share")
+    parser.add_argument('--keep-intermediates', action='store_true',
+                        help="Keep assembler intermediates and subsampled reads instead of removing them when "
+                             "no remaining task needs them")
+    parser.add_argument('--status-port', type=int,
+                        help="Serve live task status as JSON (/status) and text (/text) on this local port")
+    parser.add_argument('--resume', action='store_true',
+                        help="Rerun only failed or missing tasks recorded in the run journal")
+    parser.add_argument('--no-cache', action='store_true', help="Rerun every stage even if its inputs are unchanged")
+    args = parser.parse_args()
+
+    args.stages = [stage for stage in args.stages.split(',') if stage]
+    args.tiers = [tier for tier in args.tiers.split(',') if tier]
+    unknown = [stage for stage in args.stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)}")
+    unknown = [tier for tier in args.tiers if tier not in TIERS]
+    if unknown:
+        parser.error(f"Unknown tiers: {', '.join(unknown)}")
+    return args
+
 # Main
 def main():
+    global executor, scheduler
+    args = parse_args()
+    # Для очереди --cores и --mem - бюджет всех задач в очереди, а не одного узла
+    executor = make_executor(args.executor, args.job_dir, args.cores, args.cores, args.mem, args.partition)
+
     # Пути к входным и выходным данным
-    fastq_files_path = '/путь/к/Fastq'
-    output_dir = '/путь/к/Fastq_output'
-    #trimmed_files = '/путь/к/Trim'
-    
-    trimmed_files_good = '/путь/к/good_reads'
-    trimmed_files_bad = '/путь/к/bad_reads'
-    
-    novo_output_good = '/путь/к/novo_good'
-    novo_output_bad = '/путь/к/novo_bad'
-    config_template = '/путь/к/config.txt'
-    
+    config = {
+        'fastq': '/путь/к/Fastq',
+        'qc_output': '/путь/к/Fastq_output',
+        'trimmed': '/путь/к/Trim',
+        'reads': {'good': '/путь/к/good_reads', 'bad': '/путь/к/bad_reads'},
+        'classify_output': '/путь/к/classification',
+        'subsampled': {'good': '/путь/к/subsampled_good', 'bad': '/путь/к/subsampled_bad'},
+        'target_depth': args.target_depth,
+        'cheap_bad_tier': args.cheap_bad_tier,
+
+        'novo': {'good': '/путь/к/novo_good', 'bad': '/путь/к/novo_bad'},
+        'config_template': '/путь/к/config.txt',
         # Путь к seed файлам для NOVOPlasty
-    seed_file_mito = '/путь/к/seed.fasta'
-    seed_file_chloro = '/путь/к/Seed_RUBP.fasta'
-    
-    spades_output_good = '/путь/к/spades_good'
-    spades_output_bad = '/путь/к/spades_bad'
-    
-    abyss_output_good = '/путь/к/abyss_good'
-    abyss_output_bad = '/путь/к/abyss_bad'
-    
-    quast_output_spades_good = '/путь/к/spades_good'
-    quast_output_spades_bad = '/путь/к/spades_bad'
-    
-    quast_output_abyss_good = '/путь/к/abyss_good'
-    quast_output_abyss_bad = '/путь/к/abyss_bad'
-    
-    quast_output_novo_good = '/путь/к/novo_good'
-    quast_output_novo_bad = '/путь/к/novo_bad'
-    
-      #Пути к библиотеке для BUSCO и к коду для построения диаграммы 
-    lineage_dataset = '/путь/к/lineage_dataset'
-    code_dir = '/путь/к/generate_plot.py'
-    
-    busco_output_spades_good = '/путь/к/spades_good'
-    busco_output_spades_bad = '/путь/к/spades_bad'
-    
-    busco_output_abyss_good = '/путь/к/abyss_good'
-    busco_output_abyss_bad = '/путь/к/abyss_bad'
-    
-    busco_output_novo_good = '/путь/к/novo_good2'
-    busco_output_novo_bad = '/путь/к/novo_bad'
-    
-    
-    # Запуск функций
-    # QC
-    #quality_control(fastq_files_path, output_dir)
-    
-    # Trimming
-    #trim_reads(fastq_files_path, trimmed_files, trimmomatic_jar)
-    
-    # Assembling 
-    #spades_good = assemble_spades(trimmed_files_good, spades_output_good, 55)
-    #spades_bad = assemble_spades(trimmed_files_bad, spades_output_bad, 55)
-    
-    #novo_good = assemble_novo(trimmed_files_good, novo_output_good, 55, 265, config_template, seed_file_mito, seed_file_chloro)
-    #novo_bad = assemble_novo(trimmed_files_bad, novo_output_bad, 55, 265, config_template, seed_file_mito, seed_file_chloro)
-    
-    #abyss_good = assemble_abyss(trimmed_files_good, abyss_output_good, 64)
-    #abyss_bad = assemble_abyss(trimmed_files_bad, abyss_output_bad, 64)
-
-    #quast_spades_good = quast(spades_output_good, quast_output_spades_good)
-    #quast_spades_bad = quast(spades_output_bad, quast_output_spades_bad)
-    
-    #quast_abyss_good = quast(abyss_output_good, quast_output_abyss_good)
-    #quast_abyss_bad = (abyss_output_bad, quast_output_abyss_bad)
-    
-    #quast_novo_good = quast_novo(novo_output_good, quast_output_novo_good)
-    #quast_novo_bad = quast_novo(novo_output_bad, quast_output_novo_bad)
-    
-    #busco_spades_good = busco(spades_output_good, busco_output_spades_good, lineage_dataset,code_dir)
-    #busco_spades_bad = busco(spades_output_bad, busco_output_spades_bad, lineage_dataset,code_dir)
-    
-    #busco_abyss_good = busco(abyss_output_good, busco_output_abyss_good, lineage_dataset,code_dir)
-    #busco_abyss_bad = busco(abyss_output_bad, busco_output_abyss_bad, lineage_dataset,code_dir)
-    
-    #busco_novo_good = busco_novo(novo_output_good, busco_output_novo_good, lineage_dataset,code_dir)
-    #busco_novo_bad = busco_novo(novo_output_bad, busco_output_novo_bad, lineage_dataset,code_dir)
-    
-    #создание таблицы excel
-    #program_info = {}
-    #program_info['SPAdes_good'] = spades_good
-    #program_info['SPAdes_bad'] = spades_bad
-    #program_info['NOVOPlasty_good'] = novo_good
-    #program_info['NOVOPlasty_bad'] = novo_bad
-    #program_info['ABySS_good'] = abyss_good
-    #program_info['ABySS_bad'] = abyss_good
-    #program_info['QUAST_spades_good'] = quast_spades_good
-    #program_info['QUAST_spades_bad'] = quast_spades_bad
-    #program_info['QUAST_abyss_good'] = quast_abyss_good
-    #program_info['QUAST_abyss_bad'] = quast_abyss_bad
-    #program_info['QUAST_novo_good'] = quast_novo_good
-    #program_info['QUAST_novo_bad'] = quast_novo_bad
-    #program_info['BUSCO_spades_good'] = busco_spades_good
-    #program_info['BUSCO_spades_bad'] = busco_spades_bad
-    #program_info['BUSCO_abyss_good'] = busco_abyss_good
-    #program_info['BUSCO_abyss_bad'] = busco_abyss_bad
-    #program_info['BUSCO_novo_good'] = busco_novo_good
-    #program_info['BUSCO_novo_bad'] = busco_novo_bad
-    
-    # Создаем отчет
-    #create_excel_report('quast.xlsx', program_info)
+        'seed_mito': '/путь/к/seed.fasta',
+        'seed_chloro': '/путь/к/Seed_RUBP.fasta',
+
+        'spades': {'good': '/путь/к/spades_good', 'bad': '/путь/к/spades_bad'},
+        'abyss': {'good': '/путь/к/abyss_good', 'bad': '/путь/к/abyss_bad'},
+
+        # Быстрая статистика контигов SPAdes и ABySS
+        'contig_stats': {'good': '/путь/к/contig_stats_good', 'bad': '/путь/к/contig_stats_bad'},
+
+        # У каждого этапа QUAST и BUSCO своя папка, отдельная от папок сборщиков
+        'quast_spades': {'good': '/путь/к/quast_spades_good', 'bad': '/путь/к/quast_spades_bad'},
+        'quast_abyss': {'good': '/путь/к/quast_abyss_good', 'bad': '/путь/к/quast_abyss_bad'},
+        'quast_novo': {'good': '/путь/к/quast_novo_good', 'bad': '/путь/к/quast_novo_bad'},
+        # Общая таблица QUAST по всем сборщикам для каждой группы
+        'quast_report': {'good': '/путь/к/quast_report_good', 'bad': '/путь/к/quast_report_bad'},
+        # Подготовленные для QUAST и BUSCO файлы NOVOPlasty (ссылки или нормализованные копии)
+        'staging': {'good': '/путь/к/staging_good', 'bad': '/путь/к/staging_bad'},
+
+        # Пути к библиотеке для BUSCO и к коду для построения диаграммы
+        'lineage_dataset': '/путь/к/lineage_dataset',
+        'code_dir': '/путь/к/generate_plot.py',
+
+        'busco_spades': {'good': '/путь/к/busco_spades_good', 'bad': '/путь/к/busco_spades_bad'},
+        'busco_abyss': {'good': '/путь/к/busco_abyss_good', 'bad': '/путь/к/busco_abyss_bad'},
+        'busco_novo': {'good': '/путь/к/busco_novo_good', 'bad': '/путь/к/busco_novo_bad'},
+
+        # Параметры сборщиков
+        'spades_kmer': 55,
+        'novo_kmer': 55,
+        'read_length': 265,
+        'abyss_kmer': 64,
+        'kmer_sweep': args.kmer_sweep,
+        'kmer_sweep_width': args.kmer_sweep_width,
+        'spades_kmer_candidates': SPADES_KMER_CANDIDATES,
+        'abyss_kmer_candidates': ABYSS_KMER_CANDIDATES,
+        'trim_engine': args.trim_engine,
+        'qc_engine': args.qc_engine,
+
+        # Кэш результатов этапов и журнал состояния задач
+        'cache': '/путь/к/cache',
+        'journal': '/путь/к/journal.json',
+    }
+
+    # Запуск графа: каждый этап образца стартует, как только готовы его входные файлы
+    tasks = build_pipeline(config, args.stages, args.tiers)
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(config['cache'], CACHE_QUOTA_GB, CACHE_MAX_AGE_DAYS, VERSION_COMMANDS)
+    journal = RunJournal(config['journal'])
+    lifecycle = ArtifactLifecycle(tasks, args.min_free_disk, reclaim=not args.keep_intermediates, journal=journal,
+                                  cache_dir=cache.entries_dir if cache is not None else None)
+    scheduler = ResourceScheduler(args.cores, args.mem)
+    pipeline = Pipeline(tasks, scheduler, partial(run_command, check=True), cache, journal, lifecycle)
+    import_excel_history(args.report)
+    # Страница состояния: время задач сравнивается с медианами прошлых запусков (до начала этого)
+    status_server = None
+    if args.status_port is not None:
+        status_server = StatusServer(StatusBoard(pipeline, telemetry.stage_medians()), port=args.status_port).start()
+        print(f"Live status at {status_server.url}status and {status_server.url}text")
+    telemetry.start_run(sys.argv)
+    # Ctrl-C и SIGTERM пересылаются командам с пределом времени (они в своих группах процессов)
+    forward_signals()
+    try:
+        pipeline.run_all(resume=args.resume)
+    finally:
+        if status_server is not None:
+            status_server.stop()
+    print(f"Tasks by state: {pipeline.summary()}")
+    disk = lifecycle.summary()
+    print(f"Peak disk usage {disk['peak_disk_gb']} GB above start, {disk['reclaimed_gb']} GB of intermediates reclaimed")
+    telemetry.add_tasks(pipeline.tasks)
+    telemetry.finish_run(peak_disk_gb=disk['peak_disk_gb'], reclaimed_gb=disk['reclaimed_gb'])
+    # Индекс сохраняется, чтобы следующий запуск перечитывал только изменившиеся папки
+    artifact_index.save()
+
+    # Создаем отчет в excel (история этапов и ресурсы команд этого запуска берутся из базы телеметрии)
+    extra_sheets = {}
+    if 'qc' in args.stages and args.qc_engine == 'native' and os.path.isdir(config['qc_output']):
+        extra_sheets['QC'] = write_qc_summary(config['qc_output'])
+    if 'classify' in args.stages and os.path.isdir(config['classify_output']):
+        write_classification_summary(config['classify_output'])
+    if 'subsample' in args.stages:
+        for tier in args.tiers:
+            if os.path.isdir(config['subsampled'][tier]):
+                rows = write_subsample_summary(config['subsampled'][tier])
+                extra_sheets[f'Subsampling_{tier}'] = rows
+    if 'contig_stats' in args.stages:
+        for tier in args.tiers:
+            if os.path.isdir(config['contig_stats'][tier]):
+                extra_sheets[f'Contig_stats_{tier}'] = write_contig_stats_summary(config['contig_stats'][tier])
+    # Метрики QUAST/BUSCO всех сборок и стоимость качества по сборщикам
+    extra_sheets.update(assembly_sheets(assembly_result_files(config, args.tiers),
+                                        telemetry.stage_costs(ASSEMBLY_STAGES)))
+    extra_sheets['Resources'] = telemetry.commands(telemetry.run_id)
+    create_excel_report(args.report, telemetry.stage_history(STAGE_LABELS), extra_sheets)
+    if args.csv_dir:
+        telemetry.export_csv(args.csv_dir)
 
 if __name__ == "__main__":
     main()
-
-
-
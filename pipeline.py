@@ -0,0 +1,342 @@
+import inspect
+import os
+import subprocess
+import threading
+import time
+from functools import partial
+
+from profiler import task_context
+
+# Состояния узлов графа
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+# Узел графа: один этап для одного образца.
+# Рёбра задаются файлами: задача зависит от той задачи, которая производит её входной файл
+class Task:
+    def __init__(self, stage, sample, command=None, func=None, inputs=(), outputs=(),
+                 cores=1, mem_gb=1, tier=None, require_all=True, tool=None, optional_outputs=(), intermediates=(),
+                 disk_gb=0):
+        self.stage = stage
+        self.sample = sample
+        self.tier = tier
+        self.command = command  # Команда для run_command
+        self.func = func  # Либо функция Python, которая возвращает время выполнения
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        # Файлы, которые задача может и не создать (например, ссылки на прочтения только в одной из групп);
+        # они нужны только для построения рёбер графа
+        self.optional_outputs = list(optional_outputs)
+        # Промежуточные файлы задачи: пары (действие 'delete' или 'compress', путь или шаблон glob),
+        # которые можно освободить, когда они больше никому не нужны (см. lifecycle.py)
+        self.intermediates = list(intermediates)
+        self.cores = cores
+        self.mem_gb = mem_gb
+        self.disk_gb = disk_gb  # место, которое задача займет на томе своих результатов
+        # Для сводных задач (например, графики BUSCO) достаточно части входных файлов
+        self.require_all = require_all
+        # Программа, версия которой входит в ключ кэша; для команд - первое слово команды
+        self.tool = tool or (command.split()[0] if command else None)
+        self.state = PENDING
+        self.elapsed_time = None
+        self.exit_code = None
+        self.cached = False
+        # Время (time.time()) запуска и завершения задачи в этом запуске - для страницы состояния
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def stage_name(self):
+        return f"{self.stage}_{self.tier}" if self.tier else self.stage
+
+    @property
+    def name(self):
+        return f"{self.stage_name}:{self.sample}"
+
+    # Полная строка запуска: команда или функция с аргументами
+    @property
+    def signature(self):
+        if self.command is not None:
+            return self.command
+        if isinstance(self.func, partial):
+            return f"{self.func.func.__name__}{self.func.args}{self.func.keywords}"
+        return getattr(self.func, '__name__', repr(self.func))
+
+    # Файл модуля, в котором определена функция задачи (None для команд)
+    @property
+    def source_file(self):
+        func = self.func
+        while isinstance(func, partial):
+            func = func.func
+        module = inspect.getmodule(func) if func is not None else None
+        return getattr(module, '__file__', None)
+
+    def __repr__(self):
+        return f"Task({self.name}, {self.state})"
+
+
+# Выполнение графа задач: задача запускается, как только готовы все её входные файлы
+# и в планировщике есть свободные ядра и память, не дожидаясь остальных образцов
+class Pipeline:
+    def __init__(self, tasks, scheduler, run, cache=None, journal=None, lifecycle=None):
+        self.tasks = list(tasks)
+        self.scheduler = scheduler
+        self.run = run
+        self.cache = cache
+        self.journal = journal
+        # Освобождение промежуточных файлов и допуск задач по свободному месту (ArtifactLifecycle)
+        self.lifecycle = lifecycle
+        self._cond = threading.Condition()
+
+        names = [task.name for task in self.tasks]
+        if len(names) != len(set(names)):
+            raise ValueError("Duplicate task names in pipeline graph")
+
+        # Для каждого файла запоминаем задачу, которая его производит
+        producers = {}
+        for task in self.tasks:
+            for output in task.outputs + task.optional_outputs:
+                producers.setdefault(output, task)
+
+        self.deps = {}
+        for task in self.tasks:
+            self.deps[task.name] = [producers[path] for path in task.inputs
+                                    if path in producers and producers[path] is not task]
+        self._check_cycles()
+        self.uncacheable = self._shared_outputs()
+        for name in sorted(self.uncacheable):
+            print(f"Not caching {name}: its outputs are shared with other tasks")
+
+    # Задачи, результаты которых совпадают с результатами другой задачи или содержат файлы других задач.
+    # Восстановление такой папки из кэша задело бы чужие файлы (в том числе те, что сейчас читаются),
+    # поэтому такие задачи не кэшируются. Допустимы входы, которые производит сама задача (результат целиком
+    # или файл внутри папки-результата): задача, которая их читает, зависит от нее
+    def _shared_outputs(self):
+        owners = {}
+        for task in self.tasks:
+            for path in task.outputs:
+                owners.setdefault(os.path.abspath(path), set()).add(task.name)
+        shared = {name for names in owners.values() if len(names) > 1 for name in names}
+        for task in self.tasks:
+            inputs = {os.path.abspath(path) for path in task.inputs}
+            for path in inputs | {os.path.abspath(path) for path in task.outputs + task.optional_outputs}:
+                exempt = {task.name} | (owners.get(path, set()) if path in inputs else set())
+                parent = os.path.dirname(path)
+                while parent != os.path.dirname(parent):
+                    shared.update(owners.get(parent, set()) - exempt)
+                    parent = os.path.dirname(parent)
+        return shared
+
+    def _check_cycles(self):
+        visiting, visited = set(), set()
+
+        def visit(task):
+            if task.name in visited:
+                return
+            if task.name in visiting:
+                raise ValueError(f"Cycle in pipeline graph at {task.name}")
+            visiting.add(task.name)
+            for dep in self.deps[task.name]:
+                visit(dep)
+            visiting.discard(task.name)
+            visited.add(task.name)
+
+        for task in self.tasks:
+            visit(task)
+
+    def _ready(self, task):
+        return all(dep.state in (DONE, FAILED, SKIPPED) for dep in self.deps[task.name])
+
+    # Задачу пропускаем, если упала зависимость или входной файл так и не появился
+    def _should_skip(self, task):
+        if not task.require_all:
+            if task.inputs and not any(os.path.exists(path) for path in task.inputs):
+                return "no inputs available"
+            return None
+        for dep in self.deps[task.name]:
+            if dep.state != DONE:
+                return f"dependency {dep.name} is {dep.state}"
+        for path in task.inputs:
+            if not os.path.exists(path):
+                return f"missing input {path}"
+        return None
+
+    def _set_state(self, task, state):
+        task.state = state
+        if state == RUNNING:
+            task.started_at = time.time()
+        elif state in (DONE, FAILED, SKIPPED):
+            task.finished_at = time.time()
+        if self.journal is not None:
+            self.journal.update(task, state, task.exit_code)
+
+    # Метки задачи видны run_command (в том числе при вызове из функций Python) для профиля ресурсов
+    def _execute(self, task):
+        with task_context(stage=task.stage, tier=task.tier, sample=task.sample, tool=task.tool,
+                          cores=task.cores, mem_gb=task.mem_gb):
+            if task.command is not None:
+                return self.run(task.command)
+            return task.func()
+
+    # Кэшируются только задачи с объявленными выходными файлами, которые не пересекаются с файлами других задач.
+    # Для функций Python в ключ входит исходный код их модуля: правка trimmer.py или subsample.py
+    # делает старые результаты недействительными
+    def _cache_key(self, task):
+        if self.cache is None or not task.outputs or task.tool is None or task.name in self.uncacheable:
+            return None
+        sources = [task.source_file] if task.source_file else []
+        return self.cache.key(task.signature, task.inputs, task.tool, sources)
+
+    def _worker(self, task):
+        try:
+            key = self._cache_key(task)
+            if key is not None:
+                elapsed_time = self.cache.restore(key, task.outputs)
+                if elapsed_time is not None:
+                    print(f"Cache hit for {task.name}: restored outputs ({elapsed_time:.2f} seconds recorded)")
+                    task.elapsed_time = elapsed_time
+                    task.cached = True
+                    task.exit_code = 0
+                    self._set_state(task, DONE)
+                    return
+
+            task.elapsed_time = self._execute(task) or 0
+            task.exit_code = 0
+            # Пустой файл (например, контиги сборщика, завершившегося без результата) - тоже отсутствие результата
+            missing = [path for path in task.outputs
+                       if not os.path.exists(path) or (os.path.isfile(path) and os.path.getsize(path) == 0)]
+            if missing:
+                print(f"Task {task.name} finished without outputs (missing or empty): {missing}")
+                self._set_state(task, FAILED)
+            else:
+                if key is not None:
+                    self.cache.store(key, task.signature, task.outputs, task.elapsed_time)
+                self._set_state(task, DONE)
+        except subprocess.CalledProcessError as e:
+            task.exit_code = e.returncode
+            self._set_state(task, FAILED)
+        except Exception as e:
+            print(f"Task {task.name} failed: {e}")
+            self._set_state(task, FAILED)
+        finally:
+            self.scheduler.release(task.cores, task.mem_gb)
+            if self.lifecycle is not None:
+                self.lifecycle.request_reclaim()
+            self._notify()
+
+    def _notify(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    # При resume задачи, которые по журналу выполнены и чьи выходные файлы не изменились, не запускаются повторно.
+    # Задача, которая зависит (в том числе через другие задачи) от перезапускаемой, тоже запускается снова:
+    # ее результаты построены по старым входным файлам.
+    # Задача, часть результатов которой удалена как промежуточные файлы, не перезапускается, пока выполнены
+    # все задачи, которые их читают; иначе она запускается снова, чтобы заново создать эти файлы
+    def _restore_from_journal(self, resume):
+        complete = {task.name for task in self.tasks if resume and self.journal.is_complete(task)}
+        changed = True
+        while changed:
+            changed = False
+            for task in self.tasks:
+                if task.name not in complete:
+                    continue
+                reclaimed = set(self.journal.reclaimed_outputs(task))
+                if (any(dep.name not in complete for dep in self.deps[task.name])
+                        or any(other.name not in complete and reclaimed.intersection(other.inputs)
+                               for other in self.tasks)):
+                    complete.discard(task.name)
+                    changed = True
+        for task in self.tasks:
+            if task.name in complete:
+                print(f"Resuming: {task.name} already done")
+                task.elapsed_time = self.journal.elapsed_time(task) or 0
+                task.exit_code = 0
+                task.state = DONE
+            else:
+                task.state = PENDING
+                self.journal.update(task, PENDING, save=False)
+        self.journal.save()
+
+    def run_all(self, resume=False):
+        threads = []
+        start_time = time.time()
+        if self.journal is not None:
+            self._restore_from_journal(resume)
+        if self.lifecycle is not None:
+            self.lifecycle.start(self._notify)
+
+        with self._cond:
+            while True:
+                pending = [task for task in self.tasks if task.state == PENDING]
+                if not pending:
+                    break
+
+                started = False
+                deferred = []
+                for task in pending:
+                    if not self._ready(task):
+                        continue
+                    reason = self._should_skip(task)
+                    if reason:
+                        print(f"Skipping {task.name}: {reason}")
+                        self._set_state(task, SKIPPED)
+                        started = True
+                        continue
+                    if self.lifecycle is not None and not self.lifecycle.can_admit(task):
+                        deferred.append(task)
+                        continue
+                    if not self.scheduler.try_acquire(task.cores, task.mem_gb, task.name):
+                        continue
+                    self._set_state(task, RUNNING)
+                    print(f"Starting {task.name}: {task.cores} cores, {task.mem_gb} GB")
+                    thread = threading.Thread(target=self._worker, args=(task,))
+                    thread.start()
+                    threads.append(thread)
+                    started = True
+
+                # Места для отложенных задач не появится, если ничего не выполняется и освобождать нечего
+                if (deferred and not started and not any(task.state == RUNNING for task in self.tasks)
+                        and self.lifecycle.exhausted()):
+                    for task in deferred:
+                        print(f"Task {task.name} failed: {self.lifecycle.disk_error(task)}")
+                        self._set_state(task, FAILED)
+                        self.scheduler.cancel(task.name)
+                    continue
+
+                # Ждём завершения какой-либо задачи, если ничего нового запустить нельзя;
+                # отложенные из-за места на диске задачи проверяются снова после освобождения места
+                # или через интервал опроса
+                if not started:
+                    self._cond.wait(self.lifecycle.poll_interval if deferred else None)
+
+        for thread in threads:
+            thread.join()
+        if self.lifecycle is not None:
+            self.lifecycle.reclaim()
+            self.lifecycle.stop()
+
+        wall_time = time.time() - start_time
+        print(f"Pipeline finished in {wall_time:.2f} seconds")
+        return wall_time
+
+    # Суммарное время по каждому этапу (для отчета в excel)
+    def stage_times(self, labels=None):
+        labels = labels or {}
+        times = {}
+        for task in self.tasks:
+            if task.state == DONE:
+                label = labels.get(task.stage, task.stage)
+                key = f"{label}_{task.tier}" if task.tier else label
+                times[key] = times.get(key, 0) + task.elapsed_time
+        return times
+
+    def summary(self):
+        counts = {}
+        for task in self.tasks:
+            counts[task.state] = counts.get(task.state, 0) + 1
+        return counts
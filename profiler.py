@@ -0,0 +1,298 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+
+# Интервал опроса /proc (с)
+POLL_INTERVAL = 0.5
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+# После SIGTERM по истечении времени команде дается столько секунд, затем SIGKILL
+KILL_GRACE = 30
+
+# Метки текущей задачи графа (этап, образец, выделенные ресурсы) для потока, в котором она выполняется
+_context = threading.local()
+# Выполняющиеся сейчас команды этого процесса (pid -> команда, метки, время старта, опрос ресурсов)
+_running = {}
+_running_lock = threading.Lock()
+
+
+@contextmanager
+def task_context(**tags):
+    previous = getattr(_context, 'tags', {})
+    _context.tags = {**previous, **tags}
+    try:
+        yield
+    finally:
+        _context.tags = previous
+
+
+def current_tags():
+    return dict(getattr(_context, 'tags', {}))
+
+
+# Родитель каждого процесса по /proc/<pid>/stat
+def _parent_map():
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat', 'rb') as f:
+                fields = f.read().rsplit(b')', 1)[1].split()
+        except OSError:
+            continue
+        parents[int(name)] = int(fields[1])
+    return parents
+
+
+# Последний обход /proc: время и потомки каждого процесса. Общий для всех опрашивающих потоков, поэтому
+# при нескольких выполняющихся командах /proc читается не чаще раза за max_age, а не каждым потоком
+_children_scan = {'time': None, 'children': {}}
+_children_lock = threading.Lock()
+
+
+def _children_map(max_age=0):
+    with _children_lock:
+        now = time.monotonic()
+        if _children_scan['time'] is None or now - _children_scan['time'] >= max_age:
+            children = {}
+            for pid, parent in _parent_map().items():
+                children.setdefault(parent, []).append(pid)
+            _children_scan.update(time=now, children=children)
+        return _children_scan['children']
+
+
+# Процесс и все его потомки; max_age (с) - допустимый возраст общего обхода /proc
+def process_tree(root, max_age=0):
+    children = _children_map(max_age)
+    tree, stack = [], [root]
+    while stack:
+        pid = stack.pop()
+        tree.append(pid)
+        stack.extend(children.get(pid, ()))
+    return tree
+
+
+# CPU (с), RSS (байт), число потоков и байты ввода-вывода одного процесса; None, если процесс уже завершился
+def _sample_process(pid):
+    try:
+        with open(f'/proc/{pid}/stat', 'rb') as f:
+            raw = f.read()
+        fields = raw.rsplit(b')', 1)[1].split()
+        sample = {
+            'start': int(fields[19]),
+            'cpu_s': (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+            'rss': int(fields[21]) * PAGE_SIZE,
+            'threads': int(fields[17]),
+            'read_bytes': 0,
+            'write_bytes': 0,
+        }
+    except (OSError, IndexError, ValueError):
+        return None
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            for line in f:
+                key, value = line.split(':')
+                if key in ('read_bytes', 'write_bytes'):
+                    sample[key] = int(value)
+    except OSError:
+        pass
+    return sample
+
+
+# Фоновый поток: опрашивает дерево процессов, запоминает пиковую суммарную RSS и число потоков,
+# а для каждого процесса - последние значения CPU и ввода-вывода (завершившиеся процессы тоже учитываются)
+class TreeSampler(threading.Thread):
+    def __init__(self, pid, interval=POLL_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.peak_rss = 0
+        self.peak_threads = 0
+        self.rss = 0  # по последнему опросу
+        self.threads = 0
+        self.last = {}  # (pid, время старта) -> последний замер
+
+    def sample(self):
+        total_rss = total_threads = 0
+        for pid in process_tree(self.pid, self.interval):
+            sample = _sample_process(pid)
+            if sample is None:
+                continue
+            self.last[(pid, sample['start'])] = sample
+            total_rss += sample['rss']
+            total_threads += sample['threads']
+        self.rss, self.threads = total_rss, total_threads
+        self.peak_rss = max(self.peak_rss, total_rss)
+        self.peak_threads = max(self.peak_threads, total_threads)
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.sample()
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+    # Может вызываться из других потоков во время опроса, поэтому берется копия замеров
+    def totals(self):
+        samples = list(self.last.values())
+        return {key: sum(sample[key] for sample in samples) for key in ('cpu_s', 'read_bytes', 'write_bytes')}
+
+
+# Сигнал всей группе процессов команды (оболочка и запущенные ею программы)
+def _signal_group(pid, signum):
+    try:
+        os.killpg(pid, signum)
+    except ProcessLookupError:
+        pass
+
+
+# Пересылка сигнала выполняющимся командам, запущенным в своей группе процессов: сигнал с терминала
+# до них не доходит, и без пересылки они остаются работать после остановки конвейера
+def signal_running(signum):
+    with _running_lock:
+        groups = [pid for pid, entry in _running.items() if entry['own_group']]
+    for pid in groups:
+        _signal_group(pid, signum)
+
+
+# Обработчики SIGINT и SIGTERM (вызывать из основного потока): сигнал пересылается группам процессов
+# команд, затем срабатывает прежний обработчик (для SIGINT - KeyboardInterrupt, для SIGTERM - выход)
+def forward_signals(signums=(signal.SIGINT, signal.SIGTERM)):
+    for signum in signums:
+        previous = signal.getsignal(signum)
+        if previous == signal.SIG_IGN:
+            continue
+
+        def handler(signum, frame, previous=previous):
+            signal_running(signum)
+            if callable(previous):
+                previous(signum, frame)
+            else:
+                raise SystemExit(128 + signum)
+        signal.signal(signum, handler)
+
+
+# Запуск команды с замером ресурсов: CPU из rusage (wait4) всего поддерева, пиковая RSS и ввод-вывод
+# по опросу /proc. timeout - предел времени (с), после которого команда останавливается.
+# Возвращает код возврата и запись профиля
+def profile_command(command, interval=POLL_INTERVAL, timeout=None):
+    tags = current_tags()
+    started = datetime.now().isoformat(timespec='seconds')
+    start_time = time.time()
+    # С пределом времени команда запускается в своей группе процессов, чтобы остановить ее вместе с потомками
+    sampler, timers, timed_out = None, [], threading.Event()
+    process = subprocess.Popen(command, shell=True, start_new_session=timeout is not None)
+    # Прерывание возможно уже до начала ожидания, поэтому запуск опроса и таймеров тоже внутри try
+    try:
+        sampler = TreeSampler(process.pid, interval) if os.path.isdir('/proc') else None
+        if sampler is not None:
+            sampler.start()
+        with _running_lock:
+            _running[process.pid] = {'command': command, 'tags': tags, 'start_time': start_time,
+                                     'sampler': sampler, 'own_group': timeout is not None}
+        if timeout is not None:
+            def terminate():
+                timed_out.set()
+                print(f"Command exceeded {timeout} seconds, terminating: {command}")
+                _signal_group(process.pid, signal.SIGTERM)
+            timers = [threading.Timer(timeout, terminate),
+                      threading.Timer(timeout + KILL_GRACE, _signal_group, (process.pid, signal.SIGKILL))]
+            for timer in timers:
+                timer.daemon = True
+                timer.start()
+        _, status, usage = os.wait4(process.pid, 0)
+    except BaseException:
+        # Ожидание прервано (KeyboardInterrupt, SystemExit): команда останавливается вместе с потомками
+        # и дожидается завершения, чтобы не остаться сиротой
+        stop = partial(_signal_group, process.pid) if timeout is not None else process.send_signal
+        stop(signal.SIGTERM)
+        try:
+            process.wait(KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            stop(signal.SIGKILL)
+            process.wait()
+        if sampler is not None and sampler.is_alive():
+            sampler.stop()
+        raise
+    finally:
+        with _running_lock:
+            _running.pop(process.pid, None)
+        for timer in timers:
+            timer.cancel()
+    process.returncode = os.waitstatus_to_exitcode(status)
+    wall_s = time.time() - start_time
+
+    # ru_maxrss (КБ) - только для одного процесса и может включать память родителя до exec,
+    # поэтому используется, лишь если команда завершилась раньше первого опроса /proc
+    peak_rss = usage.ru_maxrss * 1024
+    peak_threads = 0
+    read_bytes = write_bytes = 0
+    user_s, sys_s = usage.ru_utime, usage.ru_stime
+    if sampler is not None:
+        sampler.stop()
+        totals = sampler.totals()
+        peak_rss = sampler.peak_rss or peak_rss
+        peak_threads = sampler.peak_threads
+        read_bytes, write_bytes = totals['read_bytes'], totals['write_bytes']
+        # Потомки, которых не дождался их родитель, в rusage не попадают
+        if totals['cpu_s'] > user_s + sys_s:
+            user_s += totals['cpu_s'] - (user_s + sys_s)
+
+    cpu_cores = (user_s + sys_s) / wall_s if wall_s else 0.0
+    cores, mem_gb = tags.get('cores'), tags.get('mem_gb')
+    record = {
+        'stage': tags.get('stage'),
+        'tier': tags.get('tier'),
+        'sample': tags.get('sample'),
+        'tool': tags.get('tool') or (os.path.basename(command.split()[0]) if command.split() else None),
+        'command': command,
+        'started': started,
+        'wall_s': round(wall_s, 2),
+        'user_s': round(user_s, 2),
+        'sys_s': round(sys_s, 2),
+        'cpu_cores': round(cpu_cores, 2),  # среднее число занятых ядер
+        'cpu_efficiency': round(cpu_cores / cores, 3) if cores else None,  # доля выделенных ядер
+        'peak_rss_mb': round(peak_rss / 1024 ** 2, 1),
+        'mem_efficiency': round(peak_rss / (mem_gb * 1024 ** 3), 3) if mem_gb else None,  # доля выделенной памяти
+        'peak_threads': peak_threads,
+        'read_mb': round(read_bytes / 1024 ** 2, 1),
+        'write_mb': round(write_bytes / 1024 ** 2, 1),
+        'exit_code': process.returncode,
+        'timed_out': timed_out.is_set(),
+    }
+    return process.returncode, record
+
+
+# Текущее состояние выполняющихся команд (для страницы состояния): время с начала, средняя загрузка CPU,
+# RSS и число потоков дерева процессов по последнему опросу /proc
+def running_commands():
+    with _running_lock:
+        running = list(_running.items())
+    now = time.time()
+    commands = []
+    for pid, entry in running:
+        tags, sampler = entry['tags'], entry['sampler']
+        elapsed = now - entry['start_time']
+        cpu_s = sampler.totals()['cpu_s'] if sampler is not None else 0
+        commands.append({
+            'pid': pid,
+            'stage': tags.get('stage'),
+            'tier': tags.get('tier'),
+            'sample': tags.get('sample'),
+            'command': entry['command'],
+            'elapsed_s': round(elapsed, 1),
+            'cpu_cores': round(cpu_s / elapsed, 2) if elapsed else 0.0,
+            'rss_mb': round(sampler.rss / 1024 ** 2, 1) if sampler is not None else None,
+            'threads': sampler.threads if sampler is not None else None,
+            'mem_gb': tags.get('mem_gb'),
+        })
+    return commands
@@ -0,0 +1,93 @@
+import csv
+import json
+import os
+import threading
+
+from cache import path_digest
+
+REPORT_FILE = 'report.tsv'
+TRANSPOSED_REPORT_FILE = 'transposed_report.tsv'
+INDEX_FILE = 'digests.json'
+
+
+# Результаты QUAST для отдельных сборок, по одной папке на содержимое файла контигов (SHA-256).
+# Сборка, которая не менялась, повторно не оценивается, даже если файл переименован или скопирован
+class QuastCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self.lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    # Хеш файла запоминается по (размер, mtime), чтобы не читать неизменившиеся сборки заново
+    def digest(self, path):
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self.lock:
+            cached = self.index.get(key)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+        digest = path_digest(path)
+        with self.lock:
+            self.index[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+    def save_index(self):
+        with self.lock:
+            tmp_path = f"{self.index_path}.tmp{threading.get_ident()}"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+
+    def entry_dir(self, digest):
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def report(self, digest):
+        report = os.path.join(self.entry_dir(digest), REPORT_FILE)
+        return report if os.path.exists(report) else None
+
+
+# Метрики из report.tsv QUAST: список (метрика, значение) для каждой сборки в отчете
+def read_report(path):
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f, delimiter='\t'))
+    if not rows:
+        return {}
+    assemblies = rows[0][1:]
+    metrics = {assembly: [] for assembly in assemblies}
+    for row in rows[1:]:
+        for assembly, value in zip(assemblies, row[1:]):
+            metrics[assembly].append((row[0], value))
+    return metrics
+
+
+# Общий отчет из отчетов отдельных сборок: reports - {подпись сборки: report.tsv}.
+# Пишутся report.tsv (метрики по строкам) и transposed_report.tsv (сборки по строкам), как у QUAST
+def merge_reports(reports, output_dir):
+    columns = {}
+    metric_names = []
+    for label, report in reports.items():
+        for metrics in read_report(report).values():
+            for metric, _ in metrics:
+                if metric not in metric_names:
+                    metric_names.append(metric)
+            columns[label] = dict(metrics)
+            break
+
+    os.makedirs(output_dir, exist_ok=True)
+    labels = list(columns)
+    with open(os.path.join(output_dir, REPORT_FILE), 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(['Assembly'] + labels)
+        for metric in metric_names:
+            writer.writerow([metric] + [columns[label].get(metric, '') for label in labels])
+    with open(os.path.join(output_dir, TRANSPOSED_REPORT_FILE), 'w', newline='') as f:
+        writer = csv.writer(f, delimiter='\t', lineterminator='\n')
+        writer.writerow(['Assembly'] + metric_names)
+        for label in labels:
+            writer.writerow([label] + [columns[label].get(metric, '') for metric in metric_names])
+    return os.path.join(output_dir, REPORT_FILE)
@@ -0,0 +1,65 @@
+import re
+from collections import namedtuple
+
+# Повышение ресурсов в команде при нехватке памяти: регулярные выражения для числа ГБ памяти и числа потоков
+# (первая группа - число), во сколько раз увеличивать память и ее предел
+Escalation = namedtuple('Escalation', ['mem_pattern', 'threads_pattern', 'mem_factor', 'max_mem_gb'],
+                        defaults=(None, None, 2, None))
+# Политика запуска этапа: предел времени (с), число повторов, пауза перед повтором (с) и ее рост,
+# повышение ресурсов при нехватке памяти
+RetryPolicy = namedtuple('RetryPolicy', ['timeout_s', 'retries', 'backoff_s', 'backoff_factor', 'escalation'],
+                         defaults=(None, 0, 60, 2, None))
+NO_RETRY = RetryPolicy()
+
+# Коды завершения, похожие на нехватку памяти: SIGKILL (OOM killer, лимит cgroup) и SIGABRT (std::bad_alloc)
+OOM_EXIT_CODES = {-9, 137, -6, 134}
+# Доля выделенной памяти, при которой упавшая команда считается упершейся в память
+OOM_MEM_EFFICIENCY = 0.95
+
+
+# Политика для этапа: сначала по полному имени (quast_spades), затем по первой части (quast)
+def stage_policy(policies, stage):
+    if not stage:
+        return NO_RETRY
+    return policies.get(stage) or policies.get(stage.split('_')[0]) or NO_RETRY
+
+
+def is_oom_like(record):
+    if record['exit_code'] == 0 or record.get('timed_out'):
+        return False
+    return record['exit_code'] in OOM_EXIT_CODES or (record.get('mem_efficiency') or 0) >= OOM_MEM_EFFICIENCY
+
+
+# Команда с увеличенной памятью, а если память уже на пределе - с вдвое меньшим числом потоков
+# (память многих сборщиков растет с числом потоков). None, если повышать нечего
+def escalate_command(command, escalation):
+    if escalation is None:
+        return None
+    if escalation.mem_pattern:
+        match = re.search(escalation.mem_pattern, command)
+        if match:
+            mem_gb = int(match.group(1))
+            new_mem_gb = int(mem_gb * escalation.mem_factor)
+            if escalation.max_mem_gb:
+                new_mem_gb = min(new_mem_gb, escalation.max_mem_gb)
+            if new_mem_gb > mem_gb:
+                return command[:match.start(1)] + str(new_mem_gb) + command[match.end(1):]
+    if escalation.threads_pattern:
+        match = re.search(escalation.threads_pattern, command)
+        if match and int(match.group(1)) > 1:
+            threads = max(int(match.group(1)) // 2, 1)
+            return command[:match.start(1)] + str(threads) + command[match.end(1):]
+    return None
+
+
+# Память (ГБ) и число потоков, указанные в команде по шаблонам повышения; None, если шаблона нет в команде
+def command_resources(command, escalation):
+    values = []
+    for pattern in (escalation.mem_pattern, escalation.threads_pattern):
+        match = re.search(pattern, command) if pattern else None
+        values.append(int(match.group(1)) if match else None)
+    return tuple(values)
+
+
+def backoff_delay(policy, attempt):
+    return policy.backoff_s * policy.backoff_factor ** (attempt - 1)
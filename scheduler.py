@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import namedtuple
+
+from profiler import current_tags, task_context
+
+# Задача для планировщика: метка (обычно имя образца), команда (или функция Python) и запрошенные ресурсы
+Job = namedtuple('Job', ['label', 'command', 'cores', 'mem_gb'])
+# Сколько секунд задача может ждать ресурсов, пока её обходят меньшие (backfill). Затем для самой давно
+# ждущей задачи ресурсы резервируются: остальные допускаются, только если помещаются в свободные ресурсы
+# за вычетом её запроса, иначе широкие запросы (например, перебор k-меров) могут не дождаться запуска
+BACKFILL_WAIT_LIMIT = 60
+
+
+# Планировщик, который запускает несколько задач одновременно в пределах общего бюджета ядер и памяти
+class ResourceScheduler:
+    def __init__(self, total_cores, total_mem_gb, backfill_limit=BACKFILL_WAIT_LIMIT):
+        self.total_cores = total_cores
+        self.total_mem_gb = total_mem_gb
+        self.free_cores = total_cores
+        self.free_mem_gb = total_mem_gb
+        self.backfill_limit = backfill_limit
+        self._cond = threading.Condition()
+        # Задачи, которым отказано в ресурсах: ключ -> (время первого отказа, ядра, память)
+        self._blocked = {}
+
+    # Запрос не может превышать весь бюджет, иначе задача никогда не будет допущена
+    def _clamp(self, cores, mem_gb):
+        return min(cores, self.total_cores), min(mem_gb, self.total_mem_gb)
+
+    def _fits(self, cores, mem_gb):
+        cores, mem_gb = self._clamp(cores, mem_gb)
+        return cores <= self.free_cores and mem_gb <= self.free_mem_gb
+
+    def _take(self, cores, mem_gb):
+        cores, mem_gb = self._clamp(cores, mem_gb)
+        self.free_cores -= cores
+        self.free_mem_gb -= mem_gb
+
+    # Блокирует поток, пока не освободятся нужные ресурсы
+    def acquire(self, cores, mem_gb):
+        with self._cond:
+            while not self._fits(cores, mem_gb):
+                self._cond.wait()
+            self._take(cores, mem_gb)
+
+    # Резерв самой давно ждущей задачи, если она ждёт дольше backfill_limit и это не задача key
+    def _reserved(self, key):
+        if not self._blocked:
+            return 0, 0
+        oldest = min(self._blocked, key=lambda blocked: self._blocked[blocked][0])
+        since, cores, mem_gb = self._blocked[oldest]
+        if oldest == key or time.monotonic() - since < self.backfill_limit:
+            return 0, 0
+        return self._clamp(cores, mem_gb)
+
+    # Занимает ресурсы, если они свободны с учётом резерва; иначе запоминает отказ для задачи key
+    def _admit(self, key, cores, mem_gb):
+        reserved_cores, reserved_mem_gb = self._reserved(key)
+        clamped_cores, clamped_mem_gb = self._clamp(cores, mem_gb)
+        if (clamped_cores + reserved_cores <= self.free_cores
+                and clamped_mem_gb + reserved_mem_gb <= self.free_mem_gb):
+            self._blocked.pop(key, None)
+            self._take(cores, mem_gb)
+            return True
+        if key is not None:
+            self._blocked.setdefault(key, (time.monotonic(), cores, mem_gb))
+        return False
+
+    # Неблокирующий вариант: занимает ресурсы, только если они свободны прямо сейчас.
+    # key - имя задачи, которая будет запрашивать ресурсы снова, пока не получит их (для резерва)
+    def try_acquire(self, cores, mem_gb, key=None):
+        with self._cond:
+            return self._admit(key, cores, mem_gb)
+
+    # Задача key больше не ждёт ресурсов (например, завершилась ошибкой, не начавшись)
+    def cancel(self, key):
+        with self._cond:
+            self._blocked.pop(key, None)
+            self._cond.notify_all()
+
+    def release(self, cores, mem_gb):
+        cores, mem_gb = self._clamp(cores, mem_gb)
+        with self._cond:
+            self.free_cores += cores
+            self.free_mem_gb += mem_gb
+            self._cond.notify_all()
+
+    # Замена уже занятых ресурсов на новые (например, больше памяти для повтора после нехватки памяти).
+    # Старые ресурсы сначала возвращаются, чтобы две растущие задачи не ждали друг друга бесконечно
+    def resize(self, cores, mem_gb, new_cores, new_mem_gb):
+        with self._cond:
+            self._take(-cores, -mem_gb)
+            self._cond.notify_all()
+            while not self._fits(new_cores, new_mem_gb):
+                self._cond.wait()
+            self._take(new_cores, new_mem_gb)
+
+    # Метки задачи графа, из которой запущены задачи, передаются в их потоки вместе с ресурсами задачи
+    def _worker(self, job, run, results, tags):
+        try:
+            with task_context(**{**tags, 'cores': job.cores, 'mem_gb': job.mem_gb}):
+                if callable(job.command):
+                    results[job.label] = job.command()
+                else:
+                    results[job.label] = run(job.command)
+        finally:
+            self.release(job.cores, job.mem_gb)
+
+    # Запускает список задач; задача допускается только при наличии свободных ресурсов.
+    # Если первая задача в очереди не помещается, запускается следующая подходящая (backfill),
+    # пока первая не прождёт дольше backfill_limit.
+    # Возвращает словарь {метка: время выполнения}
+    def run_jobs(self, jobs, run):
+        results = {}
+        threads = []
+        pending = list(jobs)
+        start_time = time.time()
+        tags = current_tags()
+
+        with self._cond:
+            while pending:
+                # Ключ - сам объект задачи: метки разных вызовов run_jobs могут совпадать
+                job = next((j for j in pending if self._admit(id(j), j.cores, j.mem_gb)), None)
+                if job is None:
+                    self._cond.wait()
+                    continue
+                pending.remove(job)
+                print(f"Starting {job.label}: {job.cores} cores, {job.mem_gb} GB "
+                      f"(free: {self.free_cores} cores, {self.free_mem_gb} GB)")
+                thread = threading.Thread(target=self._worker, args=(job, run, results, tags))
+                thread.start()
+                threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+        wall_time = time.time() - start_time
+        print(f"Wall-clock time for {len(threads)} jobs: {wall_time:.2f} seconds")
+        return results
@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+from collections import defaultdict
+
+from fasta_norm import needs_normalization, normalize_to
+
+# Описание подготовленных файлов: для каждого представления - имя файла, источник и способ подготовки
+MANIFEST_FILE = 'staged.json'
+
+_lock = threading.Lock()
+_view_locks = defaultdict(threading.Lock)
+
+
+def _source_key(path):
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+def link_file(source, target):
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        os.symlink(os.path.abspath(source), target)
+
+
+# Папка с подготовленными для QUAST/BUSCO сборками. Каждое представление (view) - отдельная папка,
+# в которой лежат только нужные файлы под нужными именами: жёсткие или символические ссылки на исходные
+# файлы, а нормализованная копия (fasta_norm) создается, только если файл действительно нужно менять.
+# Представления сохраняются между запусками и переиспользуются, пока исходные файлы не изменились
+class StagingArea:
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def _save_view(self, name, entries):
+        with _lock:
+            manifest = self._load()
+            manifest[name] = entries
+            tmp_path = f"{self.manifest_path}.tmp{threading.get_ident()}"
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=1)
+            os.replace(tmp_path, self.manifest_path)
+
+    def view_dir(self, name):
+        return os.path.join(self.root, name)
+
+    # Файлы sources в папке представления name под именами names (по умолчанию - исходные имена).
+    # normalize=True: файлы с '*' или повторяющимися заголовками нормализуются, остальные связываются ссылками.
+    # Возвращает пути к подготовленным файлам в том же порядке
+    def view(self, name, sources, names=None, normalize=True, workers=4):
+        names = names or [os.path.basename(source) for source in sources]
+        view_dir = self.view_dir(name)
+        os.makedirs(view_dir, exist_ok=True)
+
+        with _lock:
+            view_lock = _view_locks[os.path.abspath(view_dir)]
+        with view_lock:
+            with _lock:
+                previous = self._load().get(name, {})
+            entries, targets = {}, []
+            to_link, to_normalize = [], []
+            for source, staged_name in zip(sources, names):
+                key = _source_key(source)
+                entry = previous.get(staged_name)
+                if entry and entry['source'] == key and os.path.exists(os.path.join(view_dir, entry['file'])):
+                    entries[staged_name] = entry
+                elif normalize and needs_normalization(source):
+                    file_name = staged_name[:-3] if staged_name.endswith('.gz') else staged_name
+                    entries[staged_name] = {'source': key, 'file': file_name, 'mode': 'normalized'}
+                    to_normalize.append((source, os.path.join(view_dir, file_name)))
+                else:
+                    entries[staged_name] = {'source': key, 'file': staged_name, 'mode': 'link'}
+                    to_link.append((source, os.path.join(view_dir, staged_name)))
+                targets.append(os.path.join(view_dir, entries[staged_name]['file']))
+
+            for source, target in to_link:
+                link_file(source, target)
+            if to_normalize:
+                normalize_to([source for source, _ in to_normalize], [target for _, target in to_normalize], workers)
+
+            # Убираем из представления файлы, которых больше нет в списке (например, от прошлых запусков)
+            keep = {entry['file'] for entry in entries.values()}
+            for file_name in os.listdir(view_dir):
+                if file_name not in keep:
+                    path = os.path.join(view_dir, file_name)
+                    if os.path.isfile(path) or os.path.islink(path):
+                        os.remove(path)
+
+            reused = len(sources) - len(to_link) - len(to_normalize)
+            print(f"Staged {len(sources)} files in {view_dir}: {len(to_link)} linked, "
+                  f"{len(to_normalize)} normalized, {reused} reused")
+            self._save_view(name, entries)
+        return targets
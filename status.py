@@ -0,0 +1,198 @@
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pipeline import DONE, FAILED, PENDING, RUNNING, SKIPPED
+from profiler import running_commands
+
+STATUS_HOST = '127.0.0.1'
+# Задача, которая идет дольше медианы прошлых запусков в столько раз, помечается как медленная
+SLOW_FACTOR = 2
+# Команда, которая после IDLE_AFTER_S секунд в среднем занимает меньше IDLE_CPU_CORES ядер, помечается как простаивающая
+IDLE_CPU_CORES = 0.05
+IDLE_AFTER_S = 600
+# Доля выделенной памяти, начиная с которой команда помечается как упершаяся в память
+MEMORY_WARNING = 0.9
+
+
+def _timestamp(seconds):
+    return datetime.fromtimestamp(seconds).isoformat(timespec='seconds') if seconds else None
+
+
+# Состояние запуска графа для страницы состояния: выполняющиеся и ожидающие задачи, их время против медианы
+# прошлых запусков (medians из TelemetryStore.stage_medians), ресурсы выполняющихся команд и прогноз окончания.
+# Читает задачи графа без блокировок: снимок может на мгновение отставать от планировщика
+class StatusBoard:
+    def __init__(self, pipeline, medians=None):
+        self.pipeline = pipeline
+        self.medians = medians or {}
+        self.started_at = time.time()
+
+    def _median(self, task):
+        return self.medians.get((task.stage, task.tier))
+
+    # Ожидающая задача в очереди, если все ее зависимости завершены (ждет только ресурсов)
+    def _queued(self, task):
+        return all(dep.state in (DONE, FAILED, SKIPPED) for dep in self.pipeline.deps[task.name])
+
+    @staticmethod
+    def _command_flags(command):
+        flags = []
+        if command['elapsed_s'] > IDLE_AFTER_S and command['cpu_cores'] < IDLE_CPU_CORES:
+            flags.append('idle')
+        if command['mem_gb'] and command['rss_mb'] and command['rss_mb'] >= MEMORY_WARNING * command['mem_gb'] * 1024:
+            flags.append('memory')
+        return flags
+
+    def _running_task(self, task, now, commands):
+        elapsed = now - task.started_at if task.started_at else 0
+        median = self._median(task)
+        task_commands = [{**command, 'flags': self._command_flags(command)} for command in commands
+                         if (command['stage'], command['tier'], command['sample']) == (task.stage, task.tier,
+                                                                                         task.sample)]
+        flags = sorted({flag for command in task_commands for flag in command['flags']})
+        if median and elapsed > SLOW_FACTOR * median:
+            flags.insert(0, 'slow')
+        return {
+            'task': task.name,
+            'stage': task.stage,
+            'tier': task.tier,
+            'sample': task.sample,
+            'cores': task.cores,
+            'mem_gb': task.mem_gb,
+            'started': _timestamp(task.started_at),
+            'elapsed_s': round(elapsed, 1),
+            'median_s': round(median, 1) if median else None,
+            'progress': round(elapsed / median, 2) if median else None,
+            'flags': flags,
+            'commands': task_commands,
+        }
+
+    # Прогноз окончания: оставшееся по медианам время задач (ядро-секунды), распределенное по всем ядрам
+    # планировщика, но не раньше, чем закончится самая долгая из выполняющихся задач. Задачи без истории
+    # оцениваются средней медианой
+    def _projection(self, running, pending, now):
+        known = list(self.medians.values())
+        default = sum(known) / len(known) if known else 0
+        longest = 0
+        core_seconds = 0
+        for item in running:
+            remaining = max((item['median_s'] or default) - item['elapsed_s'], 0)
+            longest = max(longest, remaining)
+            core_seconds += remaining * item['cores']
+        for task in pending:
+            core_seconds += (self._median(task) or default) * task.cores
+        total_cores = getattr(self.pipeline.scheduler, 'total_cores', None) or 1
+        remaining = max(longest, core_seconds / total_cores)
+        return {
+            'remaining_s': round(remaining),
+            'projected_finish': _timestamp(now + remaining),
+            'estimated_from_history': bool(known),
+        }
+
+    def snapshot(self):
+        now = time.time()
+        tasks = list(self.pipeline.tasks)
+        commands = running_commands()
+        running = [self._running_task(task, now, commands) for task in tasks if task.state == RUNNING]
+        pending = [task for task in tasks if task.state == PENDING]
+        queued = [{'task': task.name, 'sample': task.sample, 'cores': task.cores, 'mem_gb': task.mem_gb,
+                   'median_s': self._median(task), 'queued': self._queued(task)} for task in pending]
+
+        samples, states = {}, {}
+        for task in tasks:
+            states[task.state] = states.get(task.state, 0) + 1
+            sample_states = samples.setdefault(task.sample, {})
+            sample_states[task.state] = sample_states.get(task.state, 0) + 1
+        finished = [task.finished_at - self.started_at for task in tasks
+                    if task.state == DONE and not task.cached and task.finished_at]
+        elapsed = now - self.started_at
+        scheduler = self.pipeline.scheduler
+        return {
+            'time': _timestamp(now),
+            'started': _timestamp(self.started_at),
+            'elapsed_s': round(elapsed),
+            'states': states,
+            # Выполненных (не из кэша) задач в час с начала запуска
+            'throughput_per_hour': round(len(finished) / elapsed * 3600, 2) if elapsed else 0.0,
+            'free_cores': getattr(scheduler, 'free_cores', None),
+            'free_mem_gb': getattr(scheduler, 'free_mem_gb', None),
+            'running': running,
+            'queued': queued,
+            'samples': samples,
+            'projection': self._projection(running, pending, now),
+        }
+
+
+def _format_seconds(seconds):
+    if seconds is None:
+        return '-'
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+# Текстовое представление снимка (для watch curl .../text)
+def format_status(snapshot):
+    projection = snapshot['projection']
+    lines = [f"{snapshot['time']}  running for {_format_seconds(snapshot['elapsed_s'])}  "
+             f"tasks: {', '.join(f'{state} {count}' for state, count in sorted(snapshot['states'].items()))}",
+             f"free: {snapshot['free_cores']} cores, {snapshot['free_mem_gb']} GB  "
+             f"projected finish: {projection['projected_finish']} "
+             f"(in {_format_seconds(projection['remaining_s'])})", '',
+             f"{'task':<40} {'elapsed':>9} {'median':>9} {'cpu':>6} {'rss MB':>9}  flags"]
+    for item in snapshot['running']:
+        cpu = sum(command['cpu_cores'] for command in item['commands'])
+        rss = sum(command['rss_mb'] or 0 for command in item['commands'])
+        lines.append(f"{item['task']:<40} {_format_seconds(item['elapsed_s']):>9} "
+                     f"{_format_seconds(item['median_s']):>9} {cpu:>6.2f} {rss:>9.1f}  {' '.join(item['flags'])}")
+    queued = [item['task'] for item in snapshot['queued'] if item['queued']]
+    lines += ['', f"queued ({len(queued)}): {', '.join(queued)}",
+              f"waiting for inputs: {len(snapshot['queued']) - len(queued)}"]
+    return '\n'.join(lines) + '\n'
+
+
+class _StatusHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        snapshot = self.server.board.snapshot()
+        if self.path.rstrip('/') == '/text':
+            body, content_type = format_status(snapshot).encode(), 'text/plain; charset=utf-8'
+        elif self.path.rstrip('/') in ('', '/status'):
+            body, content_type = json.dumps(snapshot, indent=1).encode(), 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Запросы не выводятся в журнал конвейера
+    def log_message(self, format, *args):
+        pass
+
+
+# Локальный HTTP-сервер состояния в фоновом потоке: / и /status - JSON, /text - таблица.
+# port=0 - любой свободный порт (см. url)
+class StatusServer:
+    def __init__(self, board, host=STATUS_HOST, port=0):
+        self.httpd = ThreadingHTTPServer((host, port), _StatusHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.board = board
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
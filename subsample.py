@@ -0,0 +1,148 @@
+import csv
+import json
+import os
+import time
+import zlib
+
+import numpy as np
+
+from fastq_io import BlockGzipWriter, FastqBlockReader
+
+BATCH_RECORDS = 100000
+SUBSAMPLE_SUFFIX = '_subsample.json'
+SUMMARY_COLUMNS = ['sample', 'target_depth', 'estimated_depth', 'retained_depth', 'fraction', 'pairs_in', 'pairs_out']
+
+
+# Подсчет прочтений и оснований за один проход (без разбора на записи)
+def count_bases(path):
+    reads = bases = 0
+    reader = FastqBlockReader(path)
+    try:
+        while True:
+            block = reader.read_records(BATCH_RECORDS)
+            if not block:
+                break
+            lines = block.split(b'\n')
+            reads += len(lines) // 4
+            bases += sum(map(len, lines[1::4]))
+    finally:
+        reader.close()
+    return reads, bases
+
+
+# Идентификатор прочтения без /1, /2 и комментария, одинаковый у R1 и R2
+def _read_id(header):
+    read_id = header.split(None, 1)[0]
+    if read_id.endswith((b'/1', b'/2')):
+        read_id = read_id[:-2]
+    return read_id
+
+
+# Решение принимается по хешу идентификатора: выборка детерминирована и не требует памяти под весь файл
+def _keep_mask(headers, fraction):
+    threshold = int(fraction * 0xFFFFFFFF)
+    hashes = np.fromiter((zlib.crc32(_read_id(header)) for header in headers), dtype=np.uint32, count=len(headers))
+    return hashes <= threshold
+
+
+def _select(lines, mask):
+    out = []
+    for i in np.flatnonzero(mask):
+        out.append(b'\n'.join(lines[4 * i:4 * i + 4]))
+    return b'\n'.join(out) + b'\n' if out else b''
+
+
+# Прореживание пары до целевой глубины покрытия за один потоковый проход; пары не разрываются
+def downsample_pair(input_files, output_files, fraction):
+    reader_R1, reader_R2 = FastqBlockReader(input_files[0]), FastqBlockReader(input_files[1])
+    writers = [BlockGzipWriter(path) for path in output_files]
+    pairs_in = pairs_out = bases_out = 0
+    try:
+        while True:
+            block_R1 = reader_R1.read_records(BATCH_RECORDS)
+            if not block_R1:
+                break
+            block_R2 = reader_R2.read_records(block_R1.count(b'\n') // 4)
+            lines_R1, lines_R2 = block_R1.split(b'\n')[:-1], block_R2.split(b'\n')[:-1]
+            if len(lines_R1) != len(lines_R2):
+                raise ValueError(f"{input_files[0]} and {input_files[1]} have different numbers of reads")
+
+            mask = _keep_mask(lines_R1[0::4], fraction)
+            pairs_in += len(mask)
+            pairs_out += int(mask.sum())
+            for lines, writer in ((lines_R1, writers[0]), (lines_R2, writers[1])):
+                bases_out += sum(len(seq) for seq, keep in zip(lines[1::4], mask) if keep)
+                writer.write(_select(lines, mask), int(mask.sum()))
+    finally:
+        reader_R1.close()
+        reader_R2.close()
+        for writer in writers:
+            writer.close()
+    return pairs_in, pairs_out, bases_out
+
+
+def subsample_json_path(output_dir, sample):
+    return os.path.join(output_dir, sample + SUBSAMPLE_SUFFIX)
+
+
+# Число пар и оснований берется из JSON классификации (metrics_file), если он есть, иначе - подсчетом
+def _count_pair(input_files, metrics_file=None):
+    if metrics_file and os.path.exists(metrics_file) and \
+            os.path.getmtime(metrics_file) >= max(os.path.getmtime(path) for path in input_files):
+        with open(metrics_file) as f:
+            metrics = json.load(f)
+        if 'pairs' in metrics and 'bases' in metrics:
+            return metrics['pairs'], metrics['bases']
+    counts = [count_bases(path) for path in input_files]
+    return counts[0][0], sum(count[1] for count in counts)
+
+
+# Оценка покрытия и прореживание до target_depth; если покрытие уже ниже цели, файлы просто связываются ссылками
+def subsample_sample(sample, input_files, output_files, target_depth, genome_size_mb, metrics_file=None):
+    start_time = time.time()
+    genome_size = genome_size_mb * 1e6
+    pairs, bases = _count_pair(input_files, metrics_file)
+    estimated_depth = bases / genome_size
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_files[0])), exist_ok=True)
+    if estimated_depth <= target_depth:
+        fraction = 1.0
+        for input_file, output_file in zip(input_files, output_files):
+            if os.path.lexists(output_file):
+                os.remove(output_file)
+            try:
+                os.link(input_file, output_file)
+            except OSError:
+                os.symlink(os.path.abspath(input_file), output_file)
+        pairs_out, retained_bases = pairs, bases
+    else:
+        fraction = target_depth / estimated_depth
+        _, pairs_out, retained_bases = downsample_pair(input_files, output_files, fraction)
+
+    result = {'sample': sample, 'target_depth': target_depth, 'estimated_depth': round(estimated_depth, 2),
+              'retained_depth': round(retained_bases / genome_size, 2), 'fraction': round(fraction, 4),
+              'pairs_in': pairs, 'pairs_out': pairs_out}
+    output_dir = os.path.dirname(os.path.abspath(output_files[0]))
+    with open(subsample_json_path(output_dir, sample), 'w') as f:
+        json.dump(result, f, indent=1)
+
+    elapsed_time = time.time() - start_time
+    print(f"Subsampled {sample}: depth {result['estimated_depth']}x -> {result['retained_depth']}x "
+          f"in {elapsed_time:.2f} seconds")
+    return elapsed_time
+
+
+def write_subsample_summary(output_dir, summary_file=None):
+    rows = []
+    for file_name in sorted(os.listdir(output_dir)):
+        if file_name.endswith(SUBSAMPLE_SUFFIX):
+            with open(os.path.join(output_dir, file_name)) as f:
+                result = json.load(f)
+            rows.append({column: result[column] for column in SUMMARY_COLUMNS})
+
+    summary_file = summary_file or os.path.join(output_dir, 'subsample_summary.tsv')
+    with open(summary_file, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS, delimiter='\t')
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
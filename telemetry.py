@@ -0,0 +1,173 @@
+import csv
+import os
+import socket
+import sqlite3
+import statistics
+import threading
+import uuid
+from datetime import datetime
+
+# Одна строка на команду (запись профиля run_command) и одна строка на задачу графа (этап образца)
+COMMAND_COLUMNS = ['run_id', 'stage', 'tier', 'sample', 'tool', 'command', 'started', 'wall_s', 'queue_s',
+                   'user_s', 'sys_s', 'cpu_cores', 'cpu_efficiency', 'peak_rss_mb', 'mem_efficiency',
+                   'peak_threads', 'read_mb', 'write_mb', 'exit_code', 'timed_out', 'attempt']
+TASK_COLUMNS = ['run_id', 'stage', 'tier', 'sample', 'tool', 'state', 'elapsed_s', 'cached', 'exit_code',
+                'cores', 'mem_gb', 'finished']
+RUN_COLUMNS = ['run_id', 'started', 'finished', 'host', 'argv', 'peak_disk_gb', 'reclaimed_gb']
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs ({', '.join(RUN_COLUMNS)}, PRIMARY KEY (run_id));
+CREATE TABLE IF NOT EXISTS commands (id INTEGER PRIMARY KEY, {', '.join(COMMAND_COLUMNS)});
+CREATE TABLE IF NOT EXISTS tasks (id INTEGER PRIMARY KEY, {', '.join(TASK_COLUMNS)});
+CREATE INDEX IF NOT EXISTS commands_stage ON commands (stage, tool);
+CREATE INDEX IF NOT EXISTS tasks_run ON tasks (run_id, stage);
+"""
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+# Журнал запусков в SQLite: строки только добавляются, отчеты Excel и CSV строятся запросами к нему.
+# WAL и timeout позволяют писать из потоков и из нескольких одновременных запусков конвейера.
+# База открывается при первой записи или запросе
+class TelemetryStore:
+    def __init__(self, path):
+        self.path = path
+        self.run_id = None
+        self.lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.executescript(SCHEMA)
+            self._add_missing_columns(connection)
+            self._connection = connection
+        return self._connection
+
+    # Базы, созданные раньше, дополняются новыми колонками (старые строки получают NULL)
+    @staticmethod
+    def _add_missing_columns(connection):
+        for table, columns in (('runs', RUN_COLUMNS), ('tasks', TASK_COLUMNS), ('commands', COMMAND_COLUMNS)):
+            existing = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for column in columns:
+                if column not in existing:
+                    connection.execute(f"ALTER TABLE {table} ADD COLUMN {column}")
+
+    def _insert(self, table, columns, rows):
+        placeholders = ', '.join('?' * len(columns))
+        with self.lock:
+            with self.connection:
+                self.connection.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+                                            [[row.get(column) for column in columns] for row in rows])
+
+    def start_run(self, argv=()):
+        self.run_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        self._insert('runs', RUN_COLUMNS, [{'run_id': self.run_id, 'started': _now(), 'host': socket.gethostname(),
+                                            'argv': ' '.join(argv)}])
+        return self.run_id
+
+    # values - итоговые значения запуска из RUN_COLUMNS (например, пиковое место на диске)
+    def finish_run(self, **values):
+        values = {'finished': _now(), **{key: value for key, value in values.items() if key in RUN_COLUMNS}}
+        assignments = ', '.join(f"{key} = ?" for key in values)
+        with self.lock:
+            with self.connection:
+                self.connection.execute(f"UPDATE runs SET {assignments} WHERE run_id = ?",
+                                        (*values.values(), self.run_id))
+
+    # Команды вне main (функции этапов, вызванные напрямую) записываются в отдельный запуск
+    def add_command(self, record):
+        if self.run_id is None:
+            self.start_run()
+        self._insert('commands', COMMAND_COLUMNS, [{**record, 'run_id': self.run_id}])
+
+    # Итог задач графа после запуска; кэшированные задачи записываются с временем из кэша
+    def add_tasks(self, tasks):
+        finished = _now()
+        rows = [{'run_id': self.run_id, 'stage': task.stage, 'tier': task.tier, 'sample': task.sample,
+                 'tool': task.tool, 'state': task.state, 'elapsed_s': task.elapsed_time, 'cached': int(task.cached),
+                 'exit_code': task.exit_code, 'cores': task.cores, 'mem_gb': task.mem_gb, 'finished': finished}
+                for task in tasks]
+        self._insert('tasks', TASK_COLUMNS, rows)
+
+    def query(self, sql, params=()):
+        with self.lock:
+            cursor = self.connection.execute(sql, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def commands(self, run_id=None):
+        if run_id is None:
+            return self.query(f"SELECT {', '.join(COMMAND_COLUMNS)} FROM commands ORDER BY id")
+        return self.query(f"SELECT {', '.join(COMMAND_COLUMNS)} FROM commands WHERE run_id = ? ORDER BY id",
+                          (run_id,))
+
+    # Суммарное время выполненных задач по этапам и группам для каждого запуска (история для отчета)
+    def stage_history(self, labels=None):
+        labels = labels or {}
+        rows = self.query("SELECT runs.run_id, runs.started, tasks.stage, tasks.tier, SUM(tasks.elapsed_s) AS elapsed_s "
+                          "FROM tasks JOIN runs USING (run_id) WHERE tasks.state = 'done' "
+                          "GROUP BY runs.run_id, tasks.stage, tasks.tier ORDER BY runs.started, MIN(tasks.id)")
+        history = []
+        for row in rows:
+            label = labels.get(row['stage'], row['stage'])
+            history.append({'run_id': row['run_id'], 'started': row['started'],
+                            'program': f"{label}_{row['tier']}" if row['tier'] else label,
+                            'elapsed_s': row['elapsed_s']})
+        return history
+
+    # Медиана времени выполненных (не восстановленных из кэша) задач по этапу и группе во всех прошлых запусках:
+    # {(этап, группа): секунды}
+    def stage_medians(self):
+        rows = self.query("SELECT stage, tier, elapsed_s FROM tasks "
+                          "WHERE state = 'done' AND NOT cached AND elapsed_s > 0 AND run_id != 'legacy'")
+        times = {}
+        for row in rows:
+            times.setdefault((row['stage'], row['tier']), []).append(row['elapsed_s'])
+        return {key: statistics.median(values) for key, values in times.items()}
+
+    # Время и CPU (с) команд этапов stages для каждого образца и группы - из последнего запуска, в котором
+    # команды этапа выполнялись (сборки, восстановленные из кэша, берутся из запуска, где они собирались);
+    # повторные попытки входят в стоимость
+    def stage_costs(self, stages):
+        placeholders = ', '.join('?' * len(stages))
+        rows = self.query(f"SELECT commands.stage, commands.tier, commands.sample, SUM(commands.wall_s) AS wall_s, "
+                          f"SUM(commands.user_s + commands.sys_s) AS cpu_s FROM commands JOIN runs USING (run_id) "
+                          f"WHERE commands.stage IN ({placeholders}) "
+                          f"GROUP BY runs.run_id, commands.stage, commands.tier, commands.sample "
+                          f"ORDER BY runs.started, MIN(commands.id)", tuple(stages))
+        latest = {(row['stage'], row['tier'], row['sample']): row for row in rows}
+        return list(latest.values())
+
+    # Время из старого отчета Excel (лист Sheet1) переносится один раз как запуск 'legacy'
+    def import_history(self, rows):
+        with self.lock:
+            exists = self.connection.execute("SELECT 1 FROM runs WHERE run_id = 'legacy'").fetchone()
+        if exists or not rows:
+            return 0
+        self._insert('runs', RUN_COLUMNS, [{'run_id': 'legacy', 'started': '', 'argv': 'imported from Excel'}])
+        self._insert('tasks', TASK_COLUMNS, [{'run_id': 'legacy', 'stage': program, 'state': 'done',
+                                              'elapsed_s': elapsed_s, 'cached': 0} for program, elapsed_s in rows])
+        return len(rows)
+
+    # Выгрузка таблиц в CSV (по одному файлу на таблицу)
+    def export_csv(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        for table, columns in (('runs', RUN_COLUMNS), ('tasks', TASK_COLUMNS), ('commands', COMMAND_COLUMNS)):
+            rows = self.query(f"SELECT {', '.join(columns)} FROM {table}")
+            with open(os.path.join(output_dir, f"{table}.csv"), 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(rows)
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
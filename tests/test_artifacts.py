@@ -0,0 +1,92 @@
+import os
+
+from artifacts import ArtifactIndex, artifact_organelle
+
+
+def write(path, text='>c1\nACGT\n'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def make_tree(root):
+    write(os.path.join(root, 'S1', 'mito', 'contigs.fasta'))
+    write(os.path.join(root, 'S1', 'chloro', 'scaffolds.fasta'))
+    write(os.path.join(root, 'S2', 'mito', 'contigs.fasta'))
+    write(os.path.join(root, 'S2', 'deep', 'x', 'contigs.fasta'))
+
+
+def test_query_by_kind_sample_and_depth(tmp_path):
+    root = str(tmp_path / 'assemblies')
+    make_tree(root)
+    index = ArtifactIndex()
+    contigs = index.query(root, kind='contigs')
+    assert [(a.sample, a.organelle) for a in contigs] == [('S1', 'mito'), ('S2', None), ('S2', 'mito')]
+    assert [a.path for a in index.query(root, sample='S1')] == [
+        os.path.join(root, 'S1', 'chloro', 'scaffolds.fasta'), os.path.join(root, 'S1', 'mito', 'contigs.fasta')]
+    assert len(index.query(root, kind='contigs', max_depth=3)) == 2
+    assert index.query(root, organelle='chloro')[0].kind == 'scaffolds'
+
+
+# Запрос по одному образцу не должен перебирать папки других образцов
+def test_query_touches_only_matching_subtree(tmp_path, monkeypatch):
+    root = str(tmp_path / 'assemblies')
+    make_tree(root)
+    index = ArtifactIndex()
+    index.refresh(root)
+    seen = []
+    dirs = index.dirs
+
+    class Recording(dict):
+        def get(self, key, default=None):
+            seen.append(key)
+            return dict.get(self, key, default)
+
+    index.dirs = Recording(dirs)
+    index.query(root, sample='S1', refresh=False)
+    assert all(not key.startswith(os.path.join(root, 'S2')) for key in seen)
+
+
+def test_removed_subdir_is_forgotten(tmp_path):
+    root = str(tmp_path / 'assemblies')
+    make_tree(root)
+    index = ArtifactIndex()
+    index.refresh(root)
+    os.remove(os.path.join(root, 'S1', 'chloro', 'scaffolds.fasta'))
+    os.rmdir(os.path.join(root, 'S1', 'chloro'))
+    assert index.query(root, kind='scaffolds') == []
+    assert os.path.join(root, 'S1', 'chloro') not in index.dirs
+
+
+# Файл появился, а mtime папки не изменился (как при кэше атрибутов NFS): при промахе папка перечитывается
+def test_miss_forces_rescan_when_mtime_is_stale(tmp_path):
+    root = str(tmp_path / 'assemblies')
+    make_tree(root)
+    index = ArtifactIndex()
+    index.refresh(root)
+    sample_dir = os.path.join(root, 'S1', 'mito')
+    mtime_ns = os.stat(sample_dir).st_mtime_ns
+    write(os.path.join(sample_dir, 'short_summary.specific.txt'), 'C:99%')
+    os.utime(sample_dir, ns=(mtime_ns, mtime_ns))
+    assert [a.sample for a in index.query(root, kind='busco_summary')] == ['S1']
+
+
+def test_save_and_load(tmp_path):
+    root = str(tmp_path / 'assemblies')
+    make_tree(root)
+    path = str(tmp_path / 'index.json')
+    index = ArtifactIndex(path)
+    index.refresh(root)
+    index.save()
+    loaded = ArtifactIndex(path)
+    assert loaded.query(root, refresh=False) == index.query(root, refresh=False)
+
+
+# Имя образца с mito или chloro не влияет на органеллу: учитываются только окончания имён и папки органелл
+def test_organelle_ignores_sample_names():
+    assert artifact_organelle(os.path.join('mito_S1', 'Contigs_1_mito_S1_chloro.fasta')) == 'chloro'
+    assert artifact_organelle(os.path.join('chloroplast_S2', 'contigs.fasta')) is None
+    assert artifact_organelle(os.path.join('S_mito1', 'chloro', 'report.tsv')) == 'chloro'
+    assert artifact_organelle(os.path.join('S3', 'short_summary.specific.x.Contigs_1_S3_mito.fasta.txt')) == 'mito'
+    assert artifact_organelle(os.path.join('mito_S4', 'short_summary.specific.x.chloro.txt')) == 'chloro'
+    assert artifact_organelle(os.path.join('mitoS5', 'scaffolds.fasta')) is None
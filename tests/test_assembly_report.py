@@ -0,0 +1,76 @@
+import os
+
+import pandas as pd
+
+from assembly_report import assembly_sheets, load_assembly_results, parse_busco_summary, parse_quast_report
+
+BUSCO_LINE = '\tC:{}%[S:{}%,D:0.5%],F:1.0%,M:2.0%,n:255\n'
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+def quast_report(path, n50, total_length):
+    return write(path, f'Assembly\tcontigs\n# contigs\t12\nTotal length\t{total_length}\nN50\t{n50}\n'
+                       f'Misassemblies\t3\n')
+
+
+def busco_summary(path, complete):
+    return write(path, '# BUSCO version 5\n' + BUSCO_LINE.format(complete, complete - 0.5))
+
+
+def key(sample, assembler, organelle=''):
+    return {'sample': sample, 'assembler': assembler, 'tier': 'good', 'organelle': organelle}
+
+
+def test_parsers(tmp_path):
+    report = quast_report(str(tmp_path / 'report.tsv'), 5000, 90000)
+    assert parse_quast_report(report) == {'contigs': '12', 'total_length': '90000', 'n50': '5000'}
+    summary = busco_summary(str(tmp_path / 'short_summary.txt'), 97.5)
+    assert parse_busco_summary(summary)['busco_complete'] == '97.5'
+    assert parse_busco_summary(write(str(tmp_path / 'empty.txt'), 'no summary\n')) == {}
+
+
+# Отчёты QUAST и BUSCO одной сборки объединяются в строку; нечитаемые файлы пропускаются
+def test_load_assembly_results(tmp_path):
+    files = [
+        ('quast_report', quast_report(str(tmp_path / 'q' / 'S1' / 'report.tsv'), 5000, 90000), key('S1', 'spades')),
+        ('busco_summary', busco_summary(str(tmp_path / 'b' / 'S1.txt'), 95.0), key('S1', 'spades')),
+        ('quast_report', quast_report(str(tmp_path / 'q' / 'S1a' / 'report.tsv'), 2000, 80000), key('S1', 'abyss')),
+        ('quast_report', str(tmp_path / 'missing.tsv'), key('S2', 'abyss')),
+    ]
+    results = load_assembly_results(files, workers=2)
+    assert results[['assembler', 'n50']].values.tolist() == [['abyss', 2000], ['spades', 5000]]
+    assert pd.isna(results.loc[0, 'busco_complete'])
+    assert results.loc[1, 'busco_complete'] == 95.0
+
+
+# Стоимость берётся из телеметрии этапов сборки, органелла NOVOPlasty - из названия этапа
+def test_assembly_sheets_costs_and_comparison(tmp_path):
+    files = [
+        ('quast_report', quast_report(str(tmp_path / 'S1_spades.tsv'), 4000, 90000), key('S1', 'spades')),
+        ('busco_summary', busco_summary(str(tmp_path / 'S1_spades.txt'), 90.0), key('S1', 'spades')),
+        ('quast_report', quast_report(str(tmp_path / 'S1_abyss.tsv'), 2000, 85000), key('S1', 'abyss')),
+        ('quast_report', quast_report(str(tmp_path / 'S1_mito.tsv'), 16000, 16000), key('S1', 'novo', 'mito')),
+    ]
+    costs = [{'stage': 'spades', 'tier': 'good', 'sample': 'S1', 'wall_s': 400, 'cpu_s': 7200},
+             {'stage': 'abyss', 'tier': 'good', 'sample': 'S1', 'wall_s': 100, 'cpu_s': 360},
+             {'stage': 'novo_mito', 'tier': 'good', 'sample': 'S1', 'wall_s': 32, 'cpu_s': 36}]
+    sheets = assembly_sheets(files, costs, workers=2)
+    assemblies = sheets['Assemblies'].set_index(['assembler', 'organelle'])
+    assert assemblies.loc[('spades', ''), 'seconds_per_n50_kb'] == 100
+    assert assemblies.loc[('spades', ''), 'cpu_hours_per_busco_complete'] == round(2 / 90, 6)
+    assert assemblies.loc[('novo', 'mito'), 'seconds_per_n50_kb'] == 2
+    summary = sheets['Assembler_summary'].set_index('assembler')
+    assert summary.loc['abyss', 'assemblies'] == 1
+    assert summary.loc['spades', 'total_cpu_hours'] == 2
+    comparison = sheets['Assembler_comparison'].set_index('organelle')
+    assert comparison.loc['', 'n50_spades'] == 4000 and comparison.loc['', 'n50_abyss'] == 2000
+
+
+def test_no_results_give_no_sheets():
+    assert assembly_sheets([], []) == {}
@@ -0,0 +1,134 @@
+import importlib
+import os
+from functools import partial
+
+from cache import ResultCache
+from fastq_io import BlockGzipWriter, index_path, load_index
+from pipeline import Pipeline, Task
+from scheduler import ResourceScheduler
+
+
+def make_cache(tmp_path):
+    return ResultCache(str(tmp_path / 'cache'), version_commands={'tool': 'echo tool 1.0'})
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def test_key_depends_on_inputs_and_command(tmp_path):
+    cache = make_cache(tmp_path)
+    reads = str(tmp_path / 'reads.fq')
+    write(reads, 'ACGT')
+    key = cache.key('tool -k 21', [reads], 'tool')
+    assert cache.key('tool -k 21', [reads], 'tool') == key
+    assert cache.key('tool -k 33', [reads], 'tool') != key
+    write(reads, 'ACGTT')
+    assert cache.key('tool -k 21', [reads], 'tool') != key
+
+
+def test_restore_file(tmp_path):
+    cache = make_cache(tmp_path)
+    output = str(tmp_path / 'out' / 'contigs.fasta')
+    write(output, '>c1\nACGT\n')
+    cache.store('k1', 'tool', [output], 12.5)
+    os.remove(output)
+    assert cache.restore('k1', [output]) == 12.5
+    assert read(output) == '>c1\nACGT\n'
+    # Другой набор выходных файлов - промах
+    assert cache.restore('k1', [output, output + '.bak']) is None
+    assert cache.restore('missing', [output]) is None
+
+
+# Сохраненная копия - жесткая ссылка: запись, испорченная правкой файла на месте, не используется
+def test_restore_rejects_file_modified_in_place(tmp_path):
+    cache = make_cache(tmp_path)
+    output = str(tmp_path / 'report.tsv')
+    write(output, 'N50\t100\n')
+    cache.store('k1', 'tool', [output], 1.0)
+    with open(output, 'a') as f:
+        f.write('L50\t3\n')
+    assert cache.restore('k1', [output]) is None
+
+
+# Папка восстанавливается по файлам: чужие файлы в ней остаются, измененные файлы заменяются
+def test_restore_folder_keeps_other_files(tmp_path):
+    cache = make_cache(tmp_path)
+    folder = str(tmp_path / 'novo' / 'mito')
+    write(os.path.join(folder, 'contigs.fasta'), '>mito\nACGT\n')
+    write(os.path.join(folder, 'log.txt'), 'done\n')
+    cache.store('k1', 'tool', [folder], 3.0)
+
+    os.remove(os.path.join(folder, 'contigs.fasta'))
+    # Файл изменен заменой (новый inode), сохраненная копия не затронута
+    os.remove(os.path.join(folder, 'log.txt'))
+    write(os.path.join(folder, 'log.txt'), 'partial\n')
+    write(os.path.join(folder, 'other_task.txt'), 'keep me\n')
+
+    assert cache.restore('k1', [folder]) == 3.0
+    assert read(os.path.join(folder, 'contigs.fasta')) == '>mito\nACGT\n'
+    assert read(os.path.join(folder, 'log.txt')) == 'done\n'
+    assert read(os.path.join(folder, 'other_task.txt')) == 'keep me\n'
+
+
+# Папка на месте файла результата не удаляется: запись не используется
+def test_restore_does_not_replace_folder_with_file(tmp_path):
+    cache = make_cache(tmp_path)
+    output = str(tmp_path / 'summary')
+    write(output, 'C:95%\n')
+    cache.store('k1', 'tool', [output], 1.0)
+    os.remove(output)
+    write(os.path.join(output, 'shared.txt'), 'other task\n')
+    assert cache.restore('k1', [output]) is None
+    assert read(os.path.join(output, 'shared.txt')) == 'other task\n'
+
+
+def test_index_sidecar_is_stored_and_restored(tmp_path):
+    cache = make_cache(tmp_path)
+    reads = str(tmp_path / 'sub' / 'sample_R1.fastq.gz')
+    os.makedirs(os.path.dirname(reads))
+    with BlockGzipWriter(reads, block_size=64) as writer:
+        for i in range(20):
+            writer.write(b'@r%d\nACGT\n+\nIIII\n' % i, records=1)
+    members = load_index(reads)
+    cache.store('k1', 'tool', [reads], 1.0)
+    os.remove(reads)
+    os.remove(index_path(reads))
+    assert cache.restore('k1', [reads]) == 1.0
+    assert load_index(reads) == members
+
+
+def test_evict_over_quota(tmp_path):
+    cache = ResultCache(str(tmp_path / 'cache'), quota_gb=0)
+    output = str(tmp_path / 'out.txt')
+    write(output, 'x' * 100)
+    cache.store('k1', 'tool', [output], 1.0)
+    assert not os.path.exists(os.path.join(cache.entries_dir, 'k1'))
+
+
+# Правка модуля этапа, который выполняется внутри Python, дает промах кэша
+def test_python_stage_key_includes_module_source(tmp_path, monkeypatch):
+    module_path = tmp_path / 'stage_module.py'
+    module_path.write_text("def stage(path):\n    open(path, 'w').write('v1')\n    return 1.0\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = importlib.import_module('stage_module')
+    output = str(tmp_path / 'out.txt')
+    cache = make_cache(tmp_path)
+
+    def run():
+        task = Task('trim', 's1', func=partial(module.stage, output), outputs=[output], tool='tool')
+        Pipeline([task], ResourceScheduler(1, 1), lambda command: 0, cache).run_all()
+        return task.cached
+
+    assert Task('trim', 's1', func=partial(module.stage, output)).source_file == str(module_path)
+    assert not run()
+    assert run()
+    module_path.write_text("def stage(path):\n    open(path, 'w').write('version 2')\n    return 1.0\n")
+    assert not run()
@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+
+import numpy as np
+
+from classify import (DEFAULT_THRESHOLDS, classification_path, classify_metrics, classify_sample, score_sample,
+                      write_classification_summary)
+
+_COMPLEMENT = bytes.maketrans(b'ACGT', b'TGCA')
+
+
+# Пары прочтений из фрагментов длины insert: R1 - начало фрагмента, R2 - обратный комплемент конца
+def write_pair(directory, pairs, insert, read_length=100, quality=b'I', seed=0):
+    rng = np.random.default_rng(seed)
+    paths = [os.path.join(directory, 'S_R1.fastq.gz'), os.path.join(directory, 'S_R2.fastq.gz')]
+    with gzip.open(paths[0], 'wb') as f1, gzip.open(paths[1], 'wb') as f2:
+        for i in range(pairs):
+            fragment = bytes(rng.choice(list(b'ACGT'), insert).astype(np.uint8))
+            seq_R1 = fragment[:read_length]
+            seq_R2 = fragment[-read_length:].translate(_COMPLEMENT)[::-1]
+            f1.write(b'@p%d/1\n%s\n+\n%s\n' % (i, seq_R1, quality * len(seq_R1)))
+            f2.write(b'@p%d/2\n%s\n+\n%s\n' % (i, seq_R2, quality * len(seq_R2)))
+    return paths
+
+
+def test_score_sample_metrics(tmp_path):
+    paths = write_pair(str(tmp_path), 500, insert=150)
+    metrics = score_sample(*paths, genome_size_mb=0.01)
+    assert metrics['pairs'] == 500
+    assert metrics['bases'] == 500 * 200
+    assert metrics['coverage'] == 500 * 200 / 1e4
+    assert metrics['mean_quality'] == ord('I') - 33
+    assert metrics['insert_size'] == 150
+    assert metrics['overlapping_pairs_percent'] == 100
+
+
+# Фрагменты длиннее двух прочтений не перекрываются, и размер вставки не оценивается
+def test_insert_size_without_overlap(tmp_path):
+    paths = write_pair(str(tmp_path), 200, insert=400)
+    metrics = score_sample(*paths, genome_size_mb=1)
+    assert metrics['insert_size'] is None
+    assert metrics['overlapping_pairs_percent'] < 5
+
+
+def test_classify_metrics_reasons():
+    thresholds = {**DEFAULT_THRESHOLDS, 'min_insert_size': 200}
+    good = {'coverage': 50, 'mean_quality': 35, 'duplicate_percent': 10, 'insert_size': 300}
+    assert classify_metrics(good, thresholds) == ('good', [])
+    tier, reasons = classify_metrics({**good, 'coverage': 2, 'insert_size': 150}, thresholds)
+    assert tier == 'bad'
+    assert len(reasons) == 2
+    assert classify_metrics({**good, 'insert_size': None}, thresholds) == ('good', [])
+
+
+# Повторная классификация переносит ссылки на прочтения в другую группу
+def test_classify_sample_links_reads_and_reclassifies(tmp_path):
+    paths = write_pair(str(tmp_path), 300, insert=150)
+    tier_dirs = {'good': str(tmp_path / 'good'), 'bad': str(tmp_path / 'bad')}
+    output_dir = str(tmp_path / 'classify')
+    classify_sample('S', paths, tier_dirs, output_dir, {'genome_size_mb': 0.001})
+    assert sorted(os.listdir(tier_dirs['good'])) == ['S_R1.fastq.gz', 'S_R2.fastq.gz']
+    assert os.listdir(tier_dirs['bad']) == []
+    with open(classification_path(output_dir, 'S')) as f:
+        assert json.load(f)['tier'] == 'good'
+
+    classify_sample('S', paths, tier_dirs, output_dir, {'genome_size_mb': 1000})
+    assert os.listdir(tier_dirs['good']) == []
+    assert sorted(os.listdir(tier_dirs['bad'])) == ['S_R1.fastq.gz', 'S_R2.fastq.gz']
+    rows = write_classification_summary(output_dir)
+    assert [(row['sample'], row['tier']) for row in rows] == [('S', 'bad')]
+    assert rows[0]['reasons'].startswith('coverage')
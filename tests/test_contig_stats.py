@@ -0,0 +1,73 @@
+import gzip
+import os
+
+import numpy as np
+
+from contig_stats import (assembly_gate, contig_stats, filter_assemblies, pass_marker_path, scan_fasta,
+                          write_contig_stats_summary)
+
+
+def write_fasta(path, contigs, width=7, gz=False):
+    lines = []
+    for i, sequence in enumerate(contigs):
+        lines.append(f'>contig{i} GC-rich header\n')
+        lines.extend(sequence[start:start + width] + '\n' for start in range(0, len(sequence), width))
+    with (gzip.open(path, 'wt') if gz else open(path, 'w')) as f:
+        f.write(''.join(lines))
+    return str(path)
+
+
+# Эталон без NumPy: построчный разбор
+def reference_lengths(contigs):
+    return [len(sequence) for sequence in contigs]
+
+
+# Маленькие блоки проверяют контиги и строки, разрезанные границами блоков
+def test_scan_fasta_matches_reference_across_chunks(tmp_path):
+    rng = np.random.default_rng(1)
+    contigs = [''.join(rng.choice(list('ACGTN'), int(length))) for length in rng.integers(1, 60, 40)]
+    path = write_fasta(tmp_path / 'a.fasta.gz', contigs, gz=True)
+    expected_gc = sum(sequence.count('G') + sequence.count('C') for sequence in contigs)
+    expected_n = sum(sequence.count('N') for sequence in contigs)
+    for chunk_size in (5, 64, 1 << 20):
+        lengths, gc, n = scan_fasta(path, chunk_size)
+        assert lengths.tolist() == reference_lengths(contigs)
+        assert (gc, n) == (expected_gc, expected_n)
+
+
+def test_contig_stats_n50_and_distribution(tmp_path):
+    contigs = ['A' * 600, 'C' * 300, 'G' * 80, 'T' * 20]
+    stats = contig_stats(write_fasta(tmp_path / 'b.fasta', contigs), genome_size=1600)
+    assert (stats['contigs'], stats['total_length'], stats['largest_contig']) == (4, 1000, 600)
+    assert (stats['n50'], stats['l50']) == (600, 1)
+    assert (stats['ng50'], stats['lg50']) == (300, 2)
+    assert contig_stats(stats['assembly'], genome_size=4000)['ng50'] is None
+    assert stats['gc_percent'] == 38.0
+    assert stats['length_distribution'][">=500"] == 1
+
+
+def test_windows_line_endings_are_not_bases(tmp_path):
+    path = str(tmp_path / 'crlf.fasta')
+    with open(path, 'wb') as f:
+        f.write(b'>a\r\nACGT\r\nAC\r\n>b\r\nGG\r\n')
+    assert scan_fasta(path)[0].tolist() == [6, 2]
+
+
+# Метка .pass создаётся для прошедших сборок и удаляется, если сборка перестала проходить пороги
+def test_assembly_gate_marker(tmp_path):
+    path = write_fasta(tmp_path / 'c.fasta', ['ACGT' * 100])
+    output_dir = str(tmp_path / 'stats')
+    assembly_gate(path, output_dir, 'S1_spades', {'min_total_length': 100})
+    assert os.path.exists(pass_marker_path(output_dir, 'S1_spades'))
+    assembly_gate(path, output_dir, 'S1_spades', {'min_total_length': 1000})
+    assert not os.path.exists(pass_marker_path(output_dir, 'S1_spades'))
+    rows = write_contig_stats_summary(output_dir)
+    assert rows[0]['assembly'] == 'S1_spades' and not rows[0]['passed']
+
+
+def test_filter_assemblies(tmp_path):
+    good = write_fasta(tmp_path / 'good.fasta', ['ACGT' * 50])
+    gappy = write_fasta(tmp_path / 'gappy.fasta', ['N' * 150 + 'ACGT' * 10])
+    passed = filter_assemblies([good, gappy], str(tmp_path / 'out'), {'max_n_percent': 50}, workers=2)
+    assert passed == [good]
+    assert os.path.exists(str(tmp_path / 'out' / 'contig_stats.tsv'))
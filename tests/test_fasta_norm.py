@@ -0,0 +1,43 @@
+import gzip
+
+from fasta_norm import needs_normalization, normalize_fasta, normalize_files
+
+FASTA = b'>c1\nAC*T\nGG\n>c2 len=3\nA*A\n>c1\nTTTT\n>c1\nC\n'
+
+
+def write(path, data):
+    with (gzip.open(path, 'wb') if str(path).endswith('.gz') else open(path, 'wb')) as f:
+        f.write(data)
+    return str(path)
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+# Маленький размер блока проверяет заголовки и строки на границах блоков
+def test_normalize_renames_duplicates_and_replaces_ambiguity(tmp_path):
+    source = write(tmp_path / 'in.fasta', FASTA)
+    for chunk_size in (3, 7, 1 << 20):
+        output = normalize_fasta(source, str(tmp_path / 'out.fasta'), chunk_size=chunk_size)
+        assert read(output) == b'>c1\nACNT\nGG\n>c2 len=3\nANA\n>c1(2)\nTTTT\n>c1(3)\nC\n'
+
+
+def test_normalize_wraps_lines_and_filters_short(tmp_path):
+    source = write(tmp_path / 'in.fasta.gz', FASTA)
+    output = normalize_fasta(source, str(tmp_path / 'out.fasta'), line_width=4, min_length=3, chunk_size=5)
+    assert read(output) == b'>c1\nACNT\nGG\n>c2 len=3\nANA\n>c1(2)\nTTTT\n'
+
+
+def test_needs_normalization(tmp_path):
+    assert needs_normalization(write(tmp_path / 'a.fasta', FASTA), chunk_size=4)
+    assert needs_normalization(write(tmp_path / 'b.fasta', b'>a\nAC\n>a\nGT\n'))
+    assert not needs_normalization(write(tmp_path / 'c.fasta', b'>a\nAC\n>b\nGT\n'))
+
+
+def test_normalize_files_in_pool(tmp_path):
+    sources = [write(tmp_path / f'{i}.fasta.gz', FASTA) for i in range(3)]
+    outputs = normalize_files(sources, str(tmp_path / 'out'), workers=2)
+    assert [path.rsplit('/', 1)[1] for path in outputs] == ['0.fasta', '1.fasta', '2.fasta']
+    assert all(read(path).count(b'(2)') == 1 for path in outputs)
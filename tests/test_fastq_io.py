@@ -0,0 +1,118 @@
+import gzip
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from fastq_io import BlockGzipWriter, FastqBlockReader, is_bgzf, iter_blocks, split_pair
+
+
+def fastq_records(count, seed=0):
+    rng = np.random.default_rng(seed)
+    records = []
+    for i in range(count):
+        length = int(rng.integers(30, 150))
+        seq = bytes(rng.choice(list(b'ACGT'), length).astype(np.uint8))
+        records.append(b'@read%d\n%s\n+\n%s\n' % (i, seq, b'I' * length))
+    return records
+
+
+def bgzf_member(data):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    deflated = compressor.compress(data) + compressor.flush()
+    header = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+    return (header + struct.pack('<H', len(header) + 2 + len(deflated) + 8 - 1) + deflated
+            + struct.pack('<II', zlib.crc32(data), len(data)))
+
+
+# Один и тот же FASTQ в разных форматах: обычный gzip, многочленный gzip, BGZF, без сжатия и с индексом
+@pytest.fixture(params=['gzip', 'multi_member', 'bgzf', 'plain', 'indexed'])
+def fastq_file(request, tmp_path):
+    records = fastq_records(3000)
+    data = b''.join(records)
+    path = str(tmp_path / ('reads.fastq' if request.param == 'plain' else 'reads.fastq.gz'))
+    if request.param == 'indexed':
+        with BlockGzipWriter(path, block_size=20000) as writer:
+            for i in range(0, len(records), 100):
+                writer.write(b''.join(records[i:i + 100]), records=len(records[i:i + 100]))
+    else:
+        if request.param == 'gzip':
+            content = gzip.compress(data)
+        elif request.param == 'multi_member':
+            content = b''.join(gzip.compress(data[i:i + 30000]) for i in range(0, len(data), 30000))
+        elif request.param == 'bgzf':
+            content = b''.join(bgzf_member(data[i:i + 65280]) for i in range(0, len(data), 65280)) + bgzf_member(b'')
+        else:
+            content = data
+        with open(path, 'wb') as f:
+            f.write(content)
+    return path, records, request.param
+
+
+def test_iter_blocks_round_trip(fastq_file):
+    path, records, kind = fastq_file
+    assert b''.join(iter_blocks(path, threads=3, read_ahead=2)) == b''.join(records)
+    if path.endswith('.gz'):
+        assert is_bgzf(path) == (kind == 'bgzf')
+
+
+@pytest.mark.parametrize('batch', [1, 7, 250, 10000])
+def test_read_records_returns_whole_records(fastq_file, batch):
+    path, records, _ = fastq_file
+    reader = FastqBlockReader(path, threads=2)
+    blocks = []
+    while True:
+        block = reader.read_records(batch)
+        if not block:
+            break
+        blocks.append(block)
+    reader.close()
+    assert [block.count(b'\n') for block in blocks[:-1]] == [4 * batch] * (len(blocks) - 1)
+    assert b''.join(blocks) == b''.join(records)
+
+
+def test_reader_closes_early(fastq_file):
+    reader = FastqBlockReader(fastq_file[0], threads=2, read_ahead=1)
+    assert reader.read_records(2).count(b'\n') == 8
+    reader.close()
+
+
+def test_missing_final_newline(tmp_path):
+    path = str(tmp_path / 'reads.fastq.gz')
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(b'@a\nAC\n+\nII\n@b\nGG\n+\nII'))
+    reader = FastqBlockReader(path)
+    assert reader.read_records(5) == b'@a\nAC\n+\nII\n@b\nGG\n+\nII\n'
+    assert reader.read_records(5) == b''
+
+
+def test_truncated_record(tmp_path):
+    path = str(tmp_path / 'reads.fastq.gz')
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(b'@a\nAC\n+\nII\n@b\nGG\n'))
+    with pytest.raises(ValueError):
+        FastqBlockReader(path).read_records(5)
+
+
+def test_truncated_gzip(tmp_path):
+    path = str(tmp_path / 'reads.fastq.gz')
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(b''.join(fastq_records(500)))[:-100])
+    with pytest.raises(EOFError):
+        b''.join(iter_blocks(path))
+
+
+def test_split_pair_keeps_reads_paired(tmp_path):
+    paths = [str(tmp_path / f'reads_R{mate}.fastq.gz') for mate in (1, 2)]
+    records = fastq_records(1000)
+    for path, block_size in zip(paths, (8000, 13000)):
+        with BlockGzipWriter(path, block_size=block_size) as writer:
+            for i in range(0, len(records), 50):
+                writer.write(b''.join(records[i:i + 50]), records=50)
+    ranges = split_pair(*paths, parts=4)
+    assert len(ranges) > 1
+    for range_R1, range_R2 in ranges:
+        part_R1 = b''.join(iter_blocks(paths[0], member_range=range_R1))
+        part_R2 = b''.join(iter_blocks(paths[1], member_range=range_R2))
+        assert part_R1 == part_R2
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from fastq_qc import FastqStats
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fastq_block(seqs):
+    return b''.join(b'@r%d\n%s\n+\n%s\n' % (i, seq, b'I' * len(seq)) for i, seq in enumerate(seqs))
+
+
+def random_seqs(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [bytes(rng.choice(list(b'ACGT'), 100).astype(np.uint8)) for _ in range(count)]
+
+
+# Оценка числа уникальных прочтений в пределах ошибки HyperLogLog (~1% при 2**14 регистрах)
+def test_duplicate_estimate():
+    seqs = random_seqs(20000)
+    stats = FastqStats()
+    stats.add_block(fastq_block(seqs[:15000]))
+    stats.add_block(fastq_block(seqs[5000:]))
+    assert abs(stats.sketch.estimate() - 20000) < 20000 * 0.05
+
+
+# Скетч не зависит от PYTHONHASHSEED: результаты разных процессов и запусков совпадают
+def test_sketch_is_deterministic_across_processes():
+    script = ("import sys; sys.path.insert(0, sys.argv[1]); from fastq_qc import FastqStats; "
+              "from test_fastq_qc import fastq_block, random_seqs; stats = FastqStats(); "
+              "stats.add_block(fastq_block(random_seqs(2000) + [b''])); print(stats.sketch.registers.tobytes().hex())")
+    outputs = set()
+    for seed in ('1', '2'):
+        env = {**os.environ, 'PYTHONHASHSEED': seed, 'PYTHONPATH': os.path.dirname(os.path.abspath(__file__))}
+        outputs.add(subprocess.run([sys.executable, '-c', script, ROOT], env=env, capture_output=True, text=True,
+                                   check=True).stdout)
+    assert len(outputs) == 1
@@ -0,0 +1,143 @@
+import os
+from functools import partial
+
+from journal import RunJournal
+from lifecycle import DELETE, ArtifactLifecycle
+from pipeline import DONE, FAILED, Pipeline, Task
+from scheduler import ResourceScheduler
+
+
+# Граф из двух задач: produce пишет промежуточный файл, consume читает его и пишет результат.
+# runs - список запущенных задач
+class TwoStepGraph:
+    def __init__(self, tmp_path):
+        self.intermediate = str(tmp_path / 'subsampled.fq')
+        self.result = str(tmp_path / 'contigs.fasta')
+        self.journal_path = str(tmp_path / 'journal.json')
+        self.runs = []
+        self.fail_consume = False
+
+    def produce(self):
+        self.runs.append('produce')
+        with open(self.intermediate, 'w') as f:
+            f.write('ACGT' * 1000)
+        return 1.0
+
+    def consume(self):
+        self.runs.append('consume')
+        if self.fail_consume:
+            raise RuntimeError('assembler crashed')
+        with open(self.intermediate) as source, open(self.result, 'w') as target:
+            target.write(source.read()[:10])
+        return 2.0
+
+    def tasks(self, reclaim=False):
+        intermediates = [(DELETE, self.intermediate)] if reclaim else []
+        return [Task('produce', 's1', func=self.produce, outputs=[self.intermediate], intermediates=intermediates),
+                Task('consume', 's1', func=self.consume, inputs=[self.intermediate], outputs=[self.result])]
+
+    def run(self, resume=False, reclaim=False):
+        self.runs.clear()
+        tasks = self.tasks(reclaim)
+        journal = RunJournal(self.journal_path)
+        lifecycle = ArtifactLifecycle(tasks, min_free_gb=0, poll_interval=0.05, journal=journal) if reclaim else None
+        pipeline = Pipeline(tasks, ResourceScheduler(4, 8), lambda command: 0, journal=journal, lifecycle=lifecycle)
+        pipeline.run_all(resume=resume)
+        return {task.stage: task.state for task in tasks}
+
+
+def test_resume_skips_completed_tasks(tmp_path):
+    graph = TwoStepGraph(tmp_path)
+    assert graph.run() == {'produce': DONE, 'consume': DONE}
+    assert graph.run(resume=True) == {'produce': DONE, 'consume': DONE}
+    assert graph.runs == []
+    # Без --resume все задачи выполняются заново
+    graph.run()
+    assert graph.runs == ['produce', 'consume']
+
+
+def test_resume_reruns_failed_task_only(tmp_path):
+    graph = TwoStepGraph(tmp_path)
+    graph.fail_consume = True
+    assert graph.run() == {'produce': DONE, 'consume': FAILED}
+    graph.fail_consume = False
+    assert graph.run(resume=True) == {'produce': DONE, 'consume': DONE}
+    assert graph.runs == ['consume']
+
+
+def test_resume_reruns_task_with_changed_output(tmp_path):
+    graph = TwoStepGraph(tmp_path)
+    graph.run()
+    with open(graph.result, 'w') as f:
+        f.write('ACGTACGTAA')  # тот же размер, другое содержимое
+    graph.run(resume=True)
+    assert graph.runs == ['consume']
+
+
+def test_journal_elapsed_time(tmp_path):
+    graph = TwoStepGraph(tmp_path)
+    graph.run()
+    journal = RunJournal(graph.journal_path)
+    produce, consume = graph.tasks()
+    assert journal.elapsed_time(produce) == 1.0
+    assert journal.elapsed_time(consume) == 2.0
+
+
+# Удаленный как промежуточный результат не заставляет перезапускать задачу, пока выполнены все,
+# кто его читает; если читающая задача снова нужна, промежуточный файл создается заново
+def test_resume_with_reclaimed_intermediate(tmp_path):
+    graph = TwoStepGraph(tmp_path)
+    graph.run(reclaim=True)
+    assert not os.path.exists(graph.intermediate)
+    assert RunJournal(graph.journal_path).reclaimed_outputs(graph.tasks()[0]) == [graph.intermediate]
+
+    assert graph.run(resume=True, reclaim=True) == {'produce': DONE, 'consume': DONE}
+    assert graph.runs == []
+
+    os.remove(graph.result)
+    assert graph.run(resume=True, reclaim=True) == {'produce': DONE, 'consume': DONE}
+    assert graph.runs == ['produce', 'consume']
+
+
+# Сводная задача без выходных файлов (как quast_report) выполняется заново после перезапуска образца
+def test_resume_reruns_output_less_report(tmp_path):
+    runs = []
+    failing = {'b'}
+
+    def assemble(sample):
+        runs.append(sample)
+        if sample in failing:
+            raise RuntimeError('assembler crashed')
+        with open(str(tmp_path / f'{sample}.tsv'), 'w') as f:
+            f.write(sample)
+        return 1.0
+
+    def report():
+        runs.append('report')
+        return 0.1
+
+    def run(resume):
+        runs.clear()
+        tasks = [Task('assemble', sample, func=partial(assemble, sample), outputs=[str(tmp_path / f'{sample}.tsv')])
+                 for sample in ('a', 'b')]
+        tasks.append(Task('quast_report', 'result', func=report, inputs=[str(tmp_path / f'{sample}.tsv')
+                                                                          for sample in ('a', 'b')],
+                          require_all=False))
+        Pipeline(tasks, ResourceScheduler(4, 8), lambda command: 0,
+                 journal=RunJournal(str(tmp_path / 'journal.json'))).run_all(resume=resume)
+        return {task.name: task.state for task in tasks}
+
+    assert run(resume=False)['assemble:b'] == FAILED
+    failing.clear()
+    assert run(resume=True) == {'assemble:a': DONE, 'assemble:b': DONE, 'quast_report:result': DONE}
+    assert runs == ['b', 'report']
+
+
+# Задачи после перезапускаемой (здесь - из-за измененного результата) тоже выполняются заново
+def test_resume_reruns_dependents_of_rerun_task(tmp_path):
+    graph = TwoStepGraph(tmp_path)
+    graph.run()
+    with open(graph.intermediate, 'w') as f:
+        f.write('TTTT' * 1000)
+    graph.run(resume=True)
+    assert graph.runs == ['produce', 'consume']
@@ -0,0 +1,65 @@
+import json
+import os
+
+from kmer_sweep import SUMMARY_FILE, assembly_score, keep_best_run, sweep_kmers
+
+
+def write_contigs(path, lengths):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        for i, length in enumerate(lengths):
+            f.write(f'>c{i}\n{"ACGT" * (length // 4)}\n')
+
+
+# Сборки-заглушки: для каждого k заранее известны длины контигов (None - сборка без результата)
+def fake_sweep(tmp_path, contig_lengths):
+    waves = []
+
+    def contigs_path(k):
+        return str(tmp_path / f'k{k}' / 'contigs.fasta')
+
+    def run_wave(kmers):
+        waves.append(list(kmers))
+        for k in kmers:
+            if contig_lengths.get(k) is not None:
+                write_contigs(contigs_path(k), contig_lengths[k])
+        return {f'k={k}': 1.0 for k in kmers}
+
+    return waves, run_wave, contigs_path
+
+
+def test_assembly_score():
+    assert assembly_score(None) is None
+    assert assembly_score({'contigs': 0, 'n50': None, 'total_length': 0}) is None
+    assert assembly_score({'contigs': 2, 'n50': 400, 'total_length': 600}) == (400, 600)
+
+
+# Перебор останавливается после волны без прироста; лучший k - с наибольшим N50
+def test_sweep_stops_when_gain_stalls(tmp_path):
+    lengths = {21: [200, 100], 33: [400, 100], 55: [400, 104], 77: [400, 100], 99: [1600], 127: [3200]}
+    waves, run_wave, contigs_path = fake_sweep(tmp_path, lengths)
+    summary = sweep_kmers([99, 21, 33, 55, 77, 127], run_wave, contigs_path, width=2, min_gain=0.02)
+    assert waves == [[21, 33], [55, 77]]
+    assert summary['best_k'] == 55
+    assert summary['elapsed_time'] == 4.0
+    assert sorted(summary['results']) == [21, 33, 55, 77]
+
+
+def test_sweep_skips_failed_assemblies(tmp_path):
+    waves, run_wave, contigs_path = fake_sweep(tmp_path, {21: None, 33: [300], 55: None})
+    summary = sweep_kmers([21, 33, 55], run_wave, contigs_path, width=1, patience=2)
+    assert summary['best_k'] == 33
+    assert summary['results'][21] is None
+
+
+# Файлы лучшей сборки переносятся на место результата, остальные сборки удаляются
+def test_keep_best_run(tmp_path):
+    sweep_dir = tmp_path / 'out' / 'kmer_sweep'
+    write_contigs(str(sweep_dir / 'k21' / 'contigs.fasta'), [100])
+    write_contigs(str(sweep_dir / 'k33' / 'contigs.fasta'), [200])
+    os.makedirs(sweep_dir / 'k33' / 'K33')
+    os.makedirs(tmp_path / 'out' / 'K33')  # от прошлого запуска
+    keep_best_run(str(sweep_dir), str(sweep_dir / 'k33'), str(tmp_path / 'out'), {'best_k': 33})
+    assert sorted(os.listdir(tmp_path / 'out')) == sorted(['K33', SUMMARY_FILE, 'contigs.fasta'])
+    with open(tmp_path / 'out' / SUMMARY_FILE) as f:
+        assert json.load(f)['best_k'] == 33
@@ -0,0 +1,127 @@
+import gzip
+import os
+import threading
+
+from cache import ResultCache
+from fastq_io import BlockGzipWriter, index_path
+from lifecycle import COMPRESS, DELETE, ArtifactLifecycle
+from pipeline import DONE, FAILED, PENDING, SKIPPED, Pipeline, Task
+from scheduler import ResourceScheduler
+
+
+def write(path, size=1000):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write('A' * size)
+
+
+def done_task(stage, **kwargs):
+    task = Task(stage, 's1', func=lambda: 0, **kwargs)
+    task.state = DONE
+    return task
+
+
+# Промежуточный файл нужен ожидающей задаче - не трогается; после нее удаляется
+def test_reclaim_waits_for_consumers(tmp_path):
+    reads = str(tmp_path / 'sub' / 'r1.fq')
+    write(reads)
+    producer = done_task('subsample', outputs=[reads], intermediates=[(DELETE, reads)])
+    consumer = Task('spades', 's1', func=lambda: 0, inputs=[reads], outputs=[str(tmp_path / 'contigs.fasta')])
+    lifecycle = ArtifactLifecycle([producer, consumer], min_free_gb=0)
+    assert lifecycle.reclaim() == 0
+    assert os.path.exists(reads)
+    consumer.state = DONE
+    assert lifecycle.reclaim() == 1000
+    assert not os.path.exists(reads)
+
+
+# Объявленные результаты задач и файлы, на которые ссылаются результаты, не удаляются по шаблону
+def test_reclaim_keeps_outputs_and_link_targets(tmp_path):
+    folder = tmp_path / 'abyss' / 's1'
+    unitigs, scratch = str(folder / 's1-6.fa'), str(folder / 's1-3.fa')
+    write(unitigs)
+    write(scratch)
+    contigs = str(folder / 's1-contigs.fa')
+    os.symlink('s1-6.fa', contigs)
+    task = done_task('abyss', outputs=[contigs], intermediates=[(DELETE, str(folder / '*-[0-9].fa'))])
+    ArtifactLifecycle([task], min_free_gb=0).reclaim()
+    assert os.path.exists(unitigs)
+    assert not os.path.exists(scratch)
+
+
+def test_failed_task_keeps_intermediates(tmp_path):
+    scratch = str(tmp_path / 'spades' / 'K21')
+    write(os.path.join(scratch, 'graph.fastg'))
+    task = done_task('spades', intermediates=[(DELETE, scratch)])
+    task.state = FAILED
+    ArtifactLifecycle([task], min_free_gb=0).reclaim()
+    assert os.path.exists(scratch)
+
+
+def test_compress_intermediate(tmp_path):
+    graph = str(tmp_path / 'spades' / 'assembly_graph.fastg')
+    write(graph, 100000)
+    lifecycle = ArtifactLifecycle([done_task('spades', intermediates=[(COMPRESS, graph)])], min_free_gb=0)
+    assert lifecycle.reclaim() > 0
+    with gzip.open(graph + '.gz', 'rt') as f:
+        assert f.read() == 'A' * 100000
+    assert not os.path.exists(graph)
+
+
+# Индекс .idx удаляется вместе с файлом; файл, который держит только кэш, считается освобожденным
+def test_delete_with_index_and_cache_links(tmp_path):
+    reads = str(tmp_path / 'sub' / 'r1.fastq.gz')
+    os.makedirs(os.path.dirname(reads))
+    with BlockGzipWriter(reads) as writer:
+        writer.write(b'@r\nACGT\n+\nIIII\n' * 1000, records=1000)
+    size = os.path.getsize(reads) + os.path.getsize(index_path(reads))
+    cache = ResultCache(str(tmp_path / 'cache'))
+    cache.store('k1', 'subsample', [reads], 1.0)
+    lifecycle = ArtifactLifecycle([done_task('subsample', outputs=[reads], intermediates=[(DELETE, reads)])],
+                                  min_free_gb=0, cache_dir=cache.entries_dir)
+    assert lifecycle.reclaim() == size
+    assert lifecycle.held_by_cache_bytes == size
+    assert not os.path.exists(reads) and not os.path.exists(index_path(reads))
+
+
+def test_can_admit_by_free_space(tmp_path):
+    task = Task('spades', 's1', func=lambda: 0, outputs=[str(tmp_path / 'spades' / 'contigs.fasta')], disk_gb=1)
+    assert ArtifactLifecycle([task], min_free_gb=0).can_admit(task)
+    assert not ArtifactLifecycle([task], min_free_gb=10 ** 9).can_admit(task)
+
+
+# Места не хватит никогда (ничего не выполняется, освобождать нечего): задача падает с ошибкой,
+# зависящие от нее пропускаются, а запуск завершается, а не ждет бесконечно
+def test_run_fails_task_that_never_fits(tmp_path):
+    contigs = str(tmp_path / 'spades' / 'contigs.fasta')
+    tasks = [Task('spades', 's1', func=lambda: 0, outputs=[contigs], disk_gb=1),
+             Task('quast', 's1', func=lambda: 0, inputs=[contigs], outputs=[str(tmp_path / 'report.tsv')])]
+    lifecycle = ArtifactLifecycle(tasks, min_free_gb=10 ** 9, poll_interval=0.05)
+    pipeline = Pipeline(tasks, ResourceScheduler(4, 8), lambda command: 0, lifecycle=lifecycle)
+    thread = threading.Thread(target=pipeline.run_all)
+    thread.start()
+    thread.join(30)
+    assert not thread.is_alive()
+    assert [task.state for task in tasks] == [FAILED, SKIPPED]
+
+
+# Задача ждет места, пока выполняется другая задача, и запускается, когда место появилось
+def test_deferred_task_starts_after_space_appears(tmp_path):
+    release = threading.Event()
+    contigs = str(tmp_path / 'spades' / 'contigs.fasta')
+
+    def first():
+        release.wait(5)
+        lifecycle.min_free_gb = 0
+        return 0
+
+    tasks = [Task('novo', 's1', func=first, outputs=[]),
+             Task('spades', 's1', func=lambda: write(contigs), outputs=[contigs], disk_gb=1)]
+    lifecycle = ArtifactLifecycle(tasks, min_free_gb=10 ** 9, poll_interval=0.05)
+    pipeline = Pipeline(tasks, ResourceScheduler(4, 8), lambda command: 0, lifecycle=lifecycle)
+    thread = threading.Thread(target=pipeline.run_all)
+    thread.start()
+    assert tasks[1].state == PENDING
+    release.set()
+    thread.join(30)
+    assert [task.state for task in tasks] == [DONE, DONE]
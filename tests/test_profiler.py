@@ -0,0 +1,101 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import profiler
+from profiler import TreeSampler, process_tree, profile_command, signal_running
+
+
+def test_profile_command_counts_children():
+    code, record = profile_command('sh -c "sleep 0.3; exit 3"', interval=0.05)
+    assert code == 3
+    assert record['exit_code'] == 3 and not record['timed_out']
+    assert record['peak_rss_mb'] > 0
+
+
+def test_process_tree_includes_descendants():
+    code = []
+    thread = threading.Thread(target=lambda: code.append(profile_command('sh -c "sleep 1 & wait"')))
+    thread.start()
+    try:
+        for _ in range(100):
+            running = list(profiler._running)
+            if running and len(process_tree(running[0])) >= 2:
+                break
+            threading.Event().wait(0.02)
+        assert len(process_tree(running[0])) >= 2
+    finally:
+        thread.join()
+    assert code[0][0] == 0
+
+
+# Несколько опрашивающих потоков используют один обход /proc за интервал
+def test_samplers_share_proc_scan(monkeypatch):
+    calls = []
+    parent_map = profiler._parent_map
+    monkeypatch.setattr(profiler, '_parent_map', lambda: calls.append(1) or parent_map())
+    monkeypatch.setattr(profiler, '_children_scan', {'time': None, 'children': {}})
+    samplers = [TreeSampler(os.getpid(), interval=60) for _ in range(8)]
+    for sampler in samplers:
+        sampler.sample()
+    assert len(calls) == 1
+    assert all(sampler.peak_rss > 0 for sampler in samplers)
+
+
+def wait_for_pid(path):
+    for _ in range(200):
+        if os.path.exists(path) and open(path).read().strip():
+            return int(open(path).read())
+        time.sleep(0.02)
+    raise AssertionError(f'{path} was not written')
+
+
+def is_alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except OSError:
+        return False
+
+
+# Команда с пределом времени в своей группе процессов: сигнал пересылается ей и её потомкам
+def test_signal_running_stops_command_group(tmp_path):
+    pid_path = str(tmp_path / 'child.pid')
+    results = []
+    thread = threading.Thread(target=lambda: results.append(
+        profile_command(f'sleep 30 & echo $! > {pid_path}; wait', timeout=60)))
+    thread.start()
+    child = wait_for_pid(pid_path)
+    signal_running(signal.SIGTERM)
+    thread.join(10)
+    assert not thread.is_alive()
+    assert results[0][0] != 0
+    assert not is_alive(child)
+
+
+# Ctrl-C во время ожидания команды в основном потоке: команда и её потомки останавливаются, а не остаются сиротами
+def test_interrupted_wait_stops_command(tmp_path):
+    pid_path = str(tmp_path / 'child.pid')
+    script = ('from profiler import forward_signals, profile_command\n'
+              'forward_signals()\n'
+              f'profile_command("sleep 30 & echo $! > {pid_path}; wait", timeout=60)\n')
+    env = {**os.environ, 'PYTHONPATH': os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+    process = subprocess.Popen([sys.executable, '-c', script], env=env, stderr=subprocess.PIPE)
+    child = wait_for_pid(pid_path)
+    # Сигнал посылается, когда основной поток уже ждёт команду в wait4
+    for _ in range(200):
+        with open(f'/proc/{process.pid}/wchan') as f:
+            if f.read() == 'do_wait':
+                break
+        time.sleep(0.02)
+    process.send_signal(signal.SIGINT)
+    _, stderr = process.communicate(timeout=20)
+    assert b'KeyboardInterrupt' in stderr
+    for _ in range(100):
+        if not is_alive(child):
+            break
+        time.sleep(0.05)
+    assert not is_alive(child)
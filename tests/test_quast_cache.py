@@ -0,0 +1,64 @@
+import os
+
+import cache
+import pipe_finish
+import quast_cache
+from quast_cache import QuastCache, merge_reports, read_report
+from scheduler import ResourceScheduler
+
+
+def write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+
+def test_digest_follows_content_and_is_remembered(tmp_path, monkeypatch):
+    first = write(str(tmp_path / 'a' / 'contigs.fasta'), '>c\nACGT\n')
+    copy = write(str(tmp_path / 'b' / 'renamed.fasta'), '>c\nACGT\n')
+    calls = []
+    monkeypatch.setattr(quast_cache, 'path_digest', lambda path: calls.append(path) or cache.path_digest(path))
+    quast = QuastCache(str(tmp_path / 'quast'))
+    assert quast.digest(first) == quast.digest(copy)
+    quast.save_index()
+    # Хеш неизменившегося файла берётся из сохранённого индекса
+    assert QuastCache(str(tmp_path / 'quast')).digest(first) == quast.digest(first)
+    assert len(calls) == 2
+    write(first, '>c\nACGTT\n')
+    assert quast.digest(first) != quast.digest(copy)
+
+
+def test_merge_reports(tmp_path):
+    one = write(str(tmp_path / 'one' / 'report.tsv'), 'Assembly\tS1\n# contigs\t10\nN50\t500\n')
+    two = write(str(tmp_path / 'two' / 'report.tsv'), 'Assembly\tS2\n# contigs\t4\nGC (%)\t40.1\n')
+    report = merge_reports({'S1_spades': one, 'S2_spades': two}, str(tmp_path / 'merged'))
+    assert read_report(report) == {
+        'S1_spades': [('# contigs', '10'), ('N50', '500'), ('GC (%)', '')],
+        'S2_spades': [('# contigs', '4'), ('N50', ''), ('GC (%)', '40.1')],
+    }
+    with open(os.path.join(str(tmp_path / 'merged'), 'transposed_report.tsv')) as f:
+        assert f.readline() == 'Assembly\t# contigs\tN50\tGC (%)\n'
+
+
+# QUAST запускается только для новых сборок; одинаковые сборки оцениваются один раз
+def test_quast_incremental_runs_only_new_assemblies(tmp_path, monkeypatch):
+    runs = []
+
+    def fake_quast(contigs_file, entry_dir):
+        runs.append(contigs_file)
+        write(os.path.join(entry_dir, 'report.tsv'), f'Assembly\tx\n# contigs\t{len(runs)}\n')
+        return 1.0
+
+    monkeypatch.setattr(pipe_finish, 'quast_assembly', fake_quast)
+    monkeypatch.setattr(pipe_finish, 'scheduler', ResourceScheduler(4, 8))
+    files = [write(str(tmp_path / sample / 'contigs.fasta'), f'>c\n{sequence}\n')
+             for sample, sequence in (('S1', 'ACGT'), ('S2', 'GGCC'), ('S3', 'ACGT'))]
+    output_dir = str(tmp_path / 'quast')
+    assert pipe_finish.quast_incremental(files, output_dir) == 2.0
+    assert sorted(read_report(os.path.join(output_dir, 'report.tsv'))) == ['S1_contigs', 'S2_contigs', 'S3_contigs']
+
+    files.append(write(str(tmp_path / 'S4' / 'contigs.fasta'), '>c\nTTTT\n'))
+    assert pipe_finish.quast_incremental(files, output_dir) == 1.0
+    assert len(runs) == 3
+    assert len(read_report(os.path.join(output_dir, 'report.tsv'))) == 4
@@ -0,0 +1,126 @@
+import glob
+import subprocess
+
+import pytest
+
+import pipe_finish
+from executors import make_executor
+from profiler import task_context
+from retry import (Escalation, RetryPolicy, command_resources, escalate_command, is_oom_like, stage_policy)
+from scheduler import ResourceScheduler
+from telemetry import TelemetryStore
+
+SPADES = Escalation(r'-m (\d+)', r'-t (\d+)', mem_factor=2, max_mem_gb=100)
+ABYSS = Escalation(r'B=(\d+)G', r'j=(\d+)', mem_factor=2, max_mem_gb=40)
+
+
+def test_escalation_doubles_memory_up_to_limit_then_halves_threads():
+    command = 'spades.py -1 r1.fq -2 r2.fq -t 16 -m 32 -o out'
+    steps = []
+    while command is not None:
+        steps.append(command_resources(command, SPADES))
+        command = escalate_command(command, SPADES)
+    assert steps == [(32, 16), (64, 16), (100, 16), (100, 8), (100, 4), (100, 2), (100, 1)]
+
+
+def test_escalation_of_abyss_command():
+    command = 'abyss-pe name=s1 k=64 B=16G j=12 in="r1.fq r2.fq"'
+    escalated = escalate_command(command, ABYSS)
+    assert escalated == 'abyss-pe name=s1 k=64 B=32G j=12 in="r1.fq r2.fq"'
+    assert escalate_command(escalate_command(escalated, ABYSS), ABYSS) == 'abyss-pe name=s1 k=64 B=40G j=6 in="r1.fq r2.fq"'
+
+
+def test_nothing_to_escalate():
+    assert escalate_command('quast.py contigs.fasta', SPADES) is None
+    assert escalate_command('spades.py -t 1 -m 100', SPADES) is None
+    assert escalate_command('spades.py -t 8 -m 32', None) is None
+    assert command_resources('quast.py contigs.fasta', SPADES) == (None, None)
+
+
+def test_oom_like_exits():
+    assert is_oom_like({'exit_code': 137})
+    assert is_oom_like({'exit_code': -9})
+    assert is_oom_like({'exit_code': 1, 'mem_efficiency': 0.99})
+    assert not is_oom_like({'exit_code': 1, 'mem_efficiency': 0.5})
+    assert not is_oom_like({'exit_code': 137, 'timed_out': True})
+    assert not is_oom_like({'exit_code': 0})
+
+
+def test_stage_policy_lookup():
+    policies = {'quast': RetryPolicy(retries=1), 'quast_novo': RetryPolicy(retries=3)}
+    assert stage_policy(policies, 'quast_spades').retries == 1
+    assert stage_policy(policies, 'quast_novo').retries == 3
+    assert stage_policy(policies, 'busco_spades').retries == 0
+    assert stage_policy(policies, None).retries == 0
+
+
+# Исполнитель, который запоминает свободную память общего планировщика на момент каждой попытки
+class RecordingExecutor:
+    def __init__(self, executor, scheduler):
+        self.executor = executor
+        self.scheduler = scheduler
+        self.free_mem_gb = []
+
+    def run(self, command, timeout=None):
+        self.free_mem_gb.append(self.scheduler.free_mem_gb)
+        return self.executor.run(command, timeout)
+
+
+@pytest.fixture
+def batch(tmp_path, monkeypatch):
+    scheduler = ResourceScheduler(32, 256)
+    executor = RecordingExecutor(make_executor('fake-slurm', str(tmp_path / 'jobs'), total_cores=32,
+                                               total_mem_gb=256, poll_interval=0.05), scheduler)
+    monkeypatch.setattr(pipe_finish, 'scheduler', scheduler)
+    monkeypatch.setattr(pipe_finish, 'executor', executor)
+    monkeypatch.setattr(pipe_finish, 'telemetry', TelemetryStore(str(tmp_path / 'telemetry.sqlite')))
+    return scheduler, executor, tmp_path / 'jobs'
+
+
+def job_directives(job_dir):
+    lines = []
+    for script in sorted(glob.glob(str(job_dir / '*.sh'))):
+        with open(script) as f:
+            lines.append(next(line for line in f if line.startswith('# job-name')))
+    return lines
+
+
+# Команда "падает по памяти" (код 137), пока ей не дадут хотя бы 100 ГБ
+def test_escalated_retry_gets_memory_in_executor_and_scheduler(batch):
+    scheduler, executor, job_dir = batch
+    policy = RetryPolicy(retries=3, backoff_s=0, escalation=SPADES)
+    command = "sh -c 'test $1 -ge 100 || exit 137' -m 32 -t 8"
+    assert scheduler.try_acquire(8, 32)  # резерв задачи графа
+    with task_context(stage='spades', sample='s1', cores=8, mem_gb=32):
+        pipe_finish.run_command(command, check=True, policy=policy)
+
+    directives = job_directives(job_dir)
+    assert [line.split()[3] for line in directives] == ['mem=32G', 'mem=64G', 'mem=100G']
+    assert all('cores=8' in line for line in directives)
+    # Перед каждым повтором резерв задачи в общем планировщике вырос до памяти повтора
+    assert executor.free_mem_gb == [224, 192, 156]
+    # После команды лишняя память возвращена, остается резерв самой задачи
+    assert (scheduler.free_cores, scheduler.free_mem_gb) == (24, 224)
+
+
+def test_failed_escalation_releases_extra_memory(batch):
+    scheduler, executor, job_dir = batch
+    policy = RetryPolicy(retries=1, backoff_s=0, escalation=SPADES)
+    assert scheduler.try_acquire(8, 32)
+    with task_context(stage='spades', sample='s1', cores=8, mem_gb=32):
+        with pytest.raises(subprocess.CalledProcessError):
+            pipe_finish.run_command("sh -c 'exit 137' -m 32 -t 8", check=True, policy=policy)
+    assert len(job_directives(job_dir)) == 2
+    assert scheduler.free_mem_gb == 224
+
+
+# Память уже на пределе: повтор идет с вдвое меньшим числом потоков, и очередь получает новое число ядер
+def test_escalated_retry_with_fewer_threads(batch):
+    scheduler, executor, job_dir = batch
+    policy = RetryPolicy(retries=1, backoff_s=0, escalation=SPADES)
+    assert scheduler.try_acquire(8, 100)
+    with task_context(stage='spades', sample='s1', cores=8, mem_gb=100):
+        pipe_finish.run_command("sh -c 'test $3 -le 4 || exit 137' -m 100 -t 8", check=True, policy=policy)
+    directives = job_directives(job_dir)
+    assert [line.split()[2:4] for line in directives] == [['cores=8', 'mem=100G'], ['cores=4', 'mem=100G']]
+    assert executor.free_mem_gb == [156, 156]
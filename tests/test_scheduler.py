@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pipe_finish
+from profiler import current_tags, task_context
+from scheduler import Job, ResourceScheduler
+
+
+# Задачи, которые запоминают пиковое одновременное использование ядер и памяти
+class Usage:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cores = self.mem_gb = 0
+        self.peak_cores = self.peak_mem_gb = 0
+
+    def job(self, label, cores, mem_gb, seconds=0.02):
+        def run():
+            with self.lock:
+                self.cores += cores
+                self.mem_gb += mem_gb
+                self.peak_cores = max(self.peak_cores, self.cores)
+                self.peak_mem_gb = max(self.peak_mem_gb, self.mem_gb)
+            time.sleep(seconds)
+            with self.lock:
+                self.cores -= cores
+                self.mem_gb -= mem_gb
+            return seconds
+        return Job(label, run, cores, mem_gb)
+
+
+def test_run_jobs_stays_within_budget():
+    scheduler = ResourceScheduler(8, 32)
+    usage = Usage()
+    jobs = [usage.job(f"job{i}", cores, mem_gb)
+            for i, (cores, mem_gb) in enumerate([(4, 8), (2, 24), (4, 4), (1, 16), (8, 2), (2, 8)] * 3)]
+    results = scheduler.run_jobs(jobs, run=None)
+    assert sorted(results) == sorted(job.label for job in jobs)
+    assert usage.peak_cores <= 8
+    assert usage.peak_mem_gb <= 32
+    assert (scheduler.free_cores, scheduler.free_mem_gb) == (8, 32)
+
+
+# Задача больше всего бюджета урезается до бюджета, а не ждет вечно
+def test_oversized_job_is_clamped():
+    scheduler = ResourceScheduler(4, 8)
+    results = scheduler.run_jobs([Job('big', lambda: 1.0, 16, 64)], run=None)
+    assert results == {'big': 1.0}
+    assert (scheduler.free_cores, scheduler.free_mem_gb) == (4, 8)
+
+
+def test_jobs_see_their_resources_and_parent_tags():
+    scheduler = ResourceScheduler(8, 32)
+    seen = {}
+
+    def record():
+        seen.update(current_tags())
+
+    with task_context(stage='busco_spades', sample='s1'):
+        scheduler.run_jobs([Job('part', record, 4, 16)], run=None)
+    assert seen == {'stage': 'busco_spades', 'sample': 's1', 'cores': 4, 'mem_gb': 16}
+
+
+def test_try_acquire_and_release():
+    scheduler = ResourceScheduler(8, 32)
+    assert scheduler.try_acquire(6, 16)
+    assert not scheduler.try_acquire(4, 8)
+    assert scheduler.try_acquire(2, 16)
+    scheduler.release(6, 16)
+    assert (scheduler.free_cores, scheduler.free_mem_gb) == (6, 16)
+
+
+# Увеличение резерва ждет, пока память освободится, и не держит при этом старый резерв
+def test_resize_waits_for_memory():
+    scheduler = ResourceScheduler(8, 32)
+    assert scheduler.try_acquire(4, 16)  # задача, которой нужно больше памяти
+    assert scheduler.try_acquire(4, 16)  # соседняя задача
+    resized = threading.Event()
+
+    def grow():
+        scheduler.resize(0, 16, 0, 24)
+        resized.set()
+
+    thread = threading.Thread(target=grow)
+    thread.start()
+    assert not resized.wait(0.1)
+    # Пока ждет, старый резерв свободен
+    assert scheduler.free_mem_gb == 16
+    scheduler.release(4, 16)
+    assert resized.wait(5)
+    thread.join()
+    assert (scheduler.free_cores, scheduler.free_mem_gb) == (4, 8)
+
+
+# Задачи run_jobs изнутри задачи графа делят ресурсы этой задачи, а не весь бюджет заново
+def test_nested_run_jobs_use_parent_reservation(monkeypatch):
+    shared = ResourceScheduler(16, 64)
+    monkeypatch.setattr(pipe_finish, 'scheduler', shared)
+    assert shared.try_acquire(4, 8)
+    usage = Usage()
+    with task_context(stage='busco_spades', cores=4, mem_gb=8):
+        pipe_finish.run_jobs([usage.job(f"part{i}", 2, 4) for i in range(6)])
+    assert usage.peak_cores <= 4
+    assert usage.peak_mem_gb <= 8
+    assert (shared.free_cores, shared.free_mem_gb) == (12, 56)
+
+
+def test_top_level_run_jobs_use_shared_scheduler(monkeypatch):
+    shared = ResourceScheduler(4, 8)
+    monkeypatch.setattr(pipe_finish, 'scheduler', shared)
+    usage = Usage()
+    pipe_finish.run_jobs([usage.job(f"sample{i}", 2, 4) for i in range(5)])
+    assert usage.peak_cores <= 4
+    assert usage.peak_mem_gb <= 8
+
+
+# Задача, ждущая дольше предела, получает резерв: меньшие задачи её больше не обходят
+def test_long_blocked_request_reserves_resources():
+    scheduler = ResourceScheduler(8, 32, backfill_limit=0)
+    assert scheduler.try_acquire(4, 8, 'small1')
+    assert not scheduler.try_acquire(8, 16, 'sweep')
+    assert not scheduler.try_acquire(2, 4, 'small2')
+    scheduler.release(4, 8)
+    assert scheduler.try_acquire(8, 16, 'sweep')
+    assert scheduler.try_acquire(0, 4, 'small2')
+    scheduler.cancel('small2')
+    assert scheduler._blocked == {}
+
+
+def test_short_wait_still_backfills():
+    scheduler = ResourceScheduler(8, 32, backfill_limit=60)
+    assert scheduler.try_acquire(4, 8, 'small1')
+    assert not scheduler.try_acquire(8, 16, 'sweep')
+    assert scheduler.try_acquire(2, 4, 'small2')
+
+
+# Перебор k-меров на весь бюджет не ждёт, пока пройдут все мелкие задачи
+def test_run_jobs_wide_job_is_not_starved():
+    starts = []
+    lock = threading.Lock()
+
+    def job(label, cores):
+        def run():
+            with lock:
+                starts.append(label)
+            time.sleep(0.05)
+        return Job(label, run, cores, 1)
+
+    jobs = [job('small0', 2), job('sweep', 4)] + [job(f'small{i}', 2) for i in range(1, 6)]
+    ResourceScheduler(4, 8, backfill_limit=0).run_jobs(jobs, run=None)
+    assert starts.index('sweep') == 1
+    starts.clear()
+    ResourceScheduler(4, 8).run_jobs(jobs, run=None)
+    assert starts.index('sweep') > 1
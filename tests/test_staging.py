@@ -0,0 +1,53 @@
+import json
+import os
+
+from staging import MANIFEST_FILE, StagingArea
+
+
+def write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+    return str(path)
+
+
+def manifest_modes(root, view):
+    with open(os.path.join(root, MANIFEST_FILE)) as f:
+        return {name: entry['mode'] for name, entry in json.load(f)[view].items()}
+
+
+# Чистые файлы связываются ссылками, файлы с '*' нормализуются; имена в представлении задаются names
+def test_view_links_clean_files_and_normalizes_others(tmp_path):
+    clean = write(tmp_path / 'clean.fasta', b'>a\nACGT\n')
+    dirty = write(tmp_path / 'dirty.fasta', b'>a\nAC*T\n')
+    staging = StagingArea(str(tmp_path / 'staging'))
+    targets = staging.view('mito', [clean, dirty], names=['S1_mito.fasta', 'S2_mito.fasta'])
+    assert [os.path.basename(path) for path in targets] == ['S1_mito.fasta', 'S2_mito.fasta']
+    assert os.path.samefile(targets[0], clean)
+    with open(targets[1], 'rb') as f:
+        assert f.read() == b'>a\nACNT\n'
+    assert manifest_modes(staging.root, 'mito') == {'S1_mito.fasta': 'link', 'S2_mito.fasta': 'normalized'}
+
+
+# Неизменённые файлы переиспользуются, изменённые подготавливаются заново, лишние удаляются
+def test_view_reuses_unchanged_files_and_drops_stale(tmp_path, capsys):
+    first = write(tmp_path / 'first.fasta', b'>a\nAC*T\n')
+    second = write(tmp_path / 'second.fasta', b'>b\nGG\n')
+    staging = StagingArea(str(tmp_path / 'staging'))
+    staging.view('all', [first, second])
+    capsys.readouterr()
+    staging.view('all', [first, second])
+    assert '0 linked, 0 normalized, 2 reused' in capsys.readouterr().out
+
+    write(first, b'>a\nAC*TT\n')
+    targets = staging.view('all', [first])
+    assert '1 normalized, 0 reused' in capsys.readouterr().out
+    with open(targets[0], 'rb') as f:
+        assert f.read() == b'>a\nACNTT\n'
+    assert os.listdir(staging.view_dir('all')) == ['first.fasta']
+
+
+def test_view_without_normalize_links_everything(tmp_path):
+    dirty = write(tmp_path / 'dirty.fasta', b'>a\nAC*T\n')
+    staging = StagingArea(str(tmp_path / 'staging'))
+    target, = staging.view('raw', [dirty], normalize=False)
+    assert os.path.samefile(target, dirty)
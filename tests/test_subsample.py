@@ -0,0 +1,69 @@
+import gzip
+import json
+import os
+
+from fastq_io import FastqBlockReader
+from subsample import count_bases, downsample_pair, subsample_json_path, subsample_sample, write_subsample_summary
+
+
+def write_pair(directory, pairs, read_length=50):
+    paths = [os.path.join(directory, 'S_R1.fastq.gz'), os.path.join(directory, 'S_R2.fastq.gz')]
+    for mate, path in enumerate(paths, start=1):
+        with gzip.open(path, 'wb') as f:
+            for i in range(pairs):
+                f.write(b'@p%d/%d extra\n%s\n+\n%s\n' % (i, mate, b'ACGT'[i % 4:i % 4 + 1] * read_length,
+                                                         b'I' * read_length))
+    return paths
+
+
+def read_ids(path):
+    reader = FastqBlockReader(path)
+    try:
+        return [line.split()[0][:-2] for line in reader.read_records(10 ** 6).split(b'\n')[0::4] if line]
+    finally:
+        reader.close()
+
+
+def test_count_bases(tmp_path):
+    paths = write_pair(str(tmp_path), 120, read_length=30)
+    assert count_bases(paths[0]) == (120, 3600)
+
+
+# Пары не разрываются, выборка детерминирована и близка к заданной доле
+def test_downsample_keeps_pairs_together(tmp_path):
+    paths = write_pair(str(tmp_path), 4000)
+    outputs = [str(tmp_path / 'out_R1.fastq.gz'), str(tmp_path / 'out_R2.fastq.gz')]
+    pairs_in, pairs_out, bases_out = downsample_pair(paths, outputs, 0.25)
+    assert pairs_in == 4000
+    assert 800 < pairs_out < 1200
+    assert bases_out == pairs_out * 2 * 50
+    ids_R1, ids_R2 = read_ids(outputs[0]), read_ids(outputs[1])
+    assert ids_R1 == ids_R2 and len(ids_R1) == pairs_out
+    again = [str(tmp_path / 'again_R1.fastq.gz'), str(tmp_path / 'again_R2.fastq.gz')]
+    downsample_pair(paths, again, 0.25)
+    assert read_ids(again[0]) == ids_R1
+
+
+def test_subsample_sample_below_target_links_inputs(tmp_path):
+    paths = write_pair(str(tmp_path), 100)
+    outputs = [str(tmp_path / 'sub' / 'S_R1.fastq.gz'), str(tmp_path / 'sub' / 'S_R2.fastq.gz')]
+    subsample_sample('S', paths, outputs, target_depth=100, genome_size_mb=0.001)
+    assert os.path.samefile(outputs[0], paths[0])
+    with open(subsample_json_path(str(tmp_path / 'sub'), 'S')) as f:
+        result = json.load(f)
+    assert result['fraction'] == 1.0 and result['pairs_out'] == 100
+    assert result['estimated_depth'] == 10.0
+
+
+# Число пар и оснований берётся из JSON классификации, если он новее прочтений
+def test_subsample_sample_uses_classification_metrics(tmp_path):
+    paths = write_pair(str(tmp_path), 1000)
+    metrics_file = str(tmp_path / 'S_classification.json')
+    with open(metrics_file, 'w') as f:
+        json.dump({'pairs': 1000, 'bases': 400000}, f)
+    outputs = [str(tmp_path / 'sub' / 'S_R1.fastq.gz'), str(tmp_path / 'sub' / 'S_R2.fastq.gz')]
+    subsample_sample('S', paths, outputs, target_depth=10, genome_size_mb=0.01, metrics_file=metrics_file)
+    rows = write_subsample_summary(str(tmp_path / 'sub'))
+    assert rows[0]['estimated_depth'] == 40.0
+    assert rows[0]['fraction'] == 0.25
+    assert rows[0]['pairs_out'] < 1000
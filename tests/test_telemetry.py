@@ -0,0 +1,91 @@
+import csv
+import sqlite3
+import threading
+from types import SimpleNamespace
+
+from telemetry import TelemetryStore
+
+
+def task(stage, sample, elapsed_time, state='done', cached=False, tier='good'):
+    return SimpleNamespace(stage=stage, tier=tier, sample=sample, tool=stage, state=state, elapsed_time=elapsed_time,
+                           cached=cached, exit_code=0, cores=4, mem_gb=8)
+
+
+def command(stage, sample, wall_s, cpu_s):
+    return {'stage': stage, 'tier': 'good', 'sample': sample, 'tool': stage, 'command': f'{stage} {sample}',
+            'wall_s': wall_s, 'user_s': cpu_s, 'sys_s': 0, 'exit_code': 0}
+
+
+def test_history_and_medians_across_runs(tmp_path):
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+    for elapsed in (10, 30):
+        store.start_run(['pipe_finish.py'])
+        store.add_tasks([task('spades', 'S1', elapsed), task('spades', 'S2', elapsed),
+                         task('quast', 'S1', 1000, cached=True), task('busco', 'S1', 0, state='failed')])
+        store.finish_run(peak_disk_gb=1.5)
+    history = store.stage_history({'spades': 'SPAdes'})
+    assert [(row['program'], row['elapsed_s']) for row in history] == [
+        ('SPAdes_good', 20), ('quast_good', 1000), ('SPAdes_good', 60), ('quast_good', 1000)]
+    # Задачи из кэша и незавершённые в медиану не входят
+    assert store.stage_medians() == {('spades', 'good'): 20}
+    assert store.query("SELECT peak_disk_gb FROM runs")[0]['peak_disk_gb'] == 1.5
+
+
+# Стоимость этапа берётся из последнего запуска, в котором выполнялись его команды
+def test_stage_costs_use_latest_run_with_commands(tmp_path):
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+    store.start_run()
+    store.add_command(command('spades', 'S1', 100, 300))
+    store.add_command(command('spades', 'S1', 50, 100))  # повтор после ошибки
+    store.add_command(command('abyss', 'S1', 40, 40))
+    store.start_run()
+    store.add_command(command('abyss', 'S1', 20, 10))
+    costs = {row['stage']: (row['wall_s'], row['cpu_s']) for row in store.stage_costs(['spades', 'abyss'])}
+    assert costs == {'spades': (150, 400), 'abyss': (20, 10)}
+    assert len(store.commands(store.run_id)) == 1
+
+
+def test_add_command_outside_run_starts_one(tmp_path):
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+    store.add_command(command('quast', 'S1', 1, 1))
+    assert store.run_id is not None
+    assert store.commands()[0]['run_id'] == store.run_id
+
+
+def test_import_history_once(tmp_path):
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+    assert store.import_history([('SPAdes_good', 12.5), ('QUAST_good', 3)]) == 2
+    assert store.import_history([('SPAdes_good', 99)]) == 0
+    assert [row['elapsed_s'] for row in store.stage_history()] == [12.5, 3]
+    assert store.stage_medians() == {}
+
+
+# Старая база без новых колонок дополняется при открытии
+def test_old_database_gets_missing_columns(tmp_path):
+    path = str(tmp_path / 'telemetry.db')
+    connection = sqlite3.connect(path)
+    connection.executescript("CREATE TABLE runs (run_id, started, PRIMARY KEY (run_id));"
+                             "CREATE TABLE tasks (id INTEGER PRIMARY KEY, run_id, stage, state, elapsed_s);")
+    connection.execute("INSERT INTO tasks (run_id, stage, state, elapsed_s) VALUES ('old', 'spades', 'done', 5)")
+    connection.commit()
+    connection.close()
+    store = TelemetryStore(path)
+    store.start_run()
+    store.add_tasks([task('spades', 'S1', 7)])
+    assert [(row['stage'], row['cores']) for row in store.query("SELECT stage, cores FROM tasks ORDER BY id")] == [
+        ('spades', None), ('spades', 4)]
+
+
+def test_concurrent_writes_and_csv_export(tmp_path):
+    store = TelemetryStore(str(tmp_path / 'telemetry.db'))
+    store.start_run()
+    threads = [threading.Thread(target=lambda i=i: [store.add_command(command('busco', f'S{i}', 1, 1))
+                                                    for _ in range(20)]) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.export_csv(str(tmp_path / 'csv'))
+    with open(tmp_path / 'csv' / 'commands.csv') as f:
+        assert len(list(csv.DictReader(f))) == 80
+    store.close()
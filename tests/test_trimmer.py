@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from trimmer import PHRED_OFFSET, TRIM_STEPS, parse_steps, trim_batch, trim_chunk
+
+
+# Построчная обрезка одного прочтения теми же шагами, что и trim_batch: эталон для векторного варианта.
+# Возвращает (начало, конец, запись не отброшена)
+def trim_reference(q, steps):
+    start, end = 0, len(q)
+    alive = len(q) > 0
+    for name, args in steps:
+        if name == 'LEADING':
+            good = [i for i in range(start, end) if q[i] >= args[0]]
+            alive &= bool(good)
+            start = good[0] if good else start
+        elif name == 'TRAILING':
+            good = [i for i in range(start, end) if q[i] >= args[0]]
+            alive &= bool(good)
+            end = good[-1] + 1 if good else end
+        elif name == 'SLIDINGWINDOW':
+            window, quality = args
+            required = window * quality
+            short = end - start < window
+            alive &= not short and sum(q[start:start + window]) >= required
+            for i in range(start + 1, end - window + 1):
+                if sum(q[i:i + window]) < required:
+                    end = i - 1 + window
+                    break
+            good = [i for i in range(start, end) if q[i] >= quality]
+            end = good[-1] + 1 if good else start + 1
+        elif name == 'MINLEN':
+            alive &= end - start >= args[0]
+        elif name == 'HEADCROP':
+            alive &= end - start > args[0]
+            start = min(start + args[0], end)
+        elif name == 'CROP':
+            end = min(end, start + args[0])
+    return start, end, alive and end > start
+
+
+# Качества с типичной картиной: хорошее начало, падение к концу и случайные провалы
+def random_qualities(rng, count, max_length=300):
+    reads = []
+    for _ in range(count):
+        length = int(rng.integers(0, max_length))
+        decay = np.linspace(rng.integers(20, 41), rng.integers(0, 30), length)
+        q = np.clip(decay + rng.normal(0, 6, length), 0, 41).astype(np.int64)
+        q[rng.random(length) < 0.05] = 2
+        reads.append(q)
+    return reads
+
+
+def run_batch(reads, steps):
+    lengths = np.array([len(q) for q in reads], dtype=np.int64)
+    offsets = np.zeros(len(reads), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=offsets[1:])
+    quals = np.concatenate(reads).astype(np.uint8) + PHRED_OFFSET
+    return trim_batch(quals, offsets, lengths, steps)
+
+
+@pytest.mark.parametrize('steps', [
+    TRIM_STEPS,
+    'LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:36',
+    'SLIDINGWINDOW:1:20',
+    'SLIDINGWINDOW:10:30 CROP:50',
+    'HEADCROP:5 LEADING:25 TRAILING:25 MINLEN:10',
+])
+def test_trim_batch_matches_reference(steps):
+    steps = parse_steps(steps)
+    reads = random_qualities(np.random.default_rng(7), 2000)
+    starts, ends, alive = run_batch(reads, steps)
+    for i, q in enumerate(reads):
+        start, end, keep = trim_reference(list(q), steps)
+        assert alive[i] == keep, i
+        if keep:
+            assert (starts[i], ends[i]) == (start, end), i
+
+
+def test_parse_steps_rejects_unknown_step():
+    with pytest.raises(ValueError):
+        parse_steps('LEADING:3 ILLUMINACLIP:adapters.fa:2:30:10')
+
+
+def _record(name, seq, quals):
+    return b'@%s\n%s\n+\n%s\n' % (name, seq, bytes(q + PHRED_OFFSET for q in quals))
+
+
+# Пары раскладываются по paired/unpaired так же, как у Trimmomatic PE
+def test_trim_chunk_splits_pairs():
+    good, bad = [35] * 60, [2] * 60
+    block_r1 = _record(b'a', b'A' * 60, good) + _record(b'b', b'C' * 60, good) + _record(b'c', b'G' * 60, bad)
+    block_r2 = _record(b'a', b'T' * 60, good) + _record(b'b', b'G' * 60, bad) + _record(b'c', b'A' * 60, good)
+    steps = parse_steps('LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:36')
+    members, stats = trim_chunk(block_r1, block_r2, steps)
+    assert stats == {'input': 3, 'both': 1, 'forward_only': 1, 'reverse_only': 1, 'dropped': 0}
+    assert [records for _, _, records in members] == [1, 1, 1, 1]
@@ -0,0 +1,215 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fastq_io import BlockGzipWriter, FastqBlockReader, compress_block
+
+# Те же шаги, что и в команде Trimmomatic в trim_reads; выполняются в указанном порядке
+TRIM_STEPS = "LEADING:3 TRAILING:3 SLIDINGWINDOW:4:15 MINLEN:36 HEADCROP:20 CROP:265"
+
+# Количество записей в одном блоке, который обрабатывается одним процессом
+CHUNK_RECORDS = 200000
+PHRED_OFFSET = 33
+
+_BIG = np.iinfo(np.int64).max
+
+
+def parse_steps(steps):
+    parsed = []
+    for step in steps.split():
+        name, *args = step.split(':')
+        if name not in ('LEADING', 'TRAILING', 'SLIDINGWINDOW', 'MINLEN', 'HEADCROP', 'CROP'):
+            raise ValueError(f"Unsupported trimming step: {step}")
+        parsed.append((name, [int(arg) for arg in args]))
+    return parsed
+
+
+# Для каждого отрезка [starts, ends) - первая (или последняя) позиция, где mask истинна; -1, если такой нет.
+# Отрезки обрабатываются разом через reduceat, без цикла по основаниям
+def _segment_reduce(mask, starts, ends, first):
+    positions = np.arange(len(mask) + 1, dtype=np.int64)
+    if first:
+        values = np.where(np.append(mask, False), positions, _BIG)
+    else:
+        values = np.where(np.append(mask, False), positions, -1)
+
+    result = np.full(len(starts), -1, dtype=np.int64)
+    nonempty = ends > starts
+    if not nonempty.any():
+        return result
+
+    indices = np.empty(2 * nonempty.sum(), dtype=np.int64)
+    indices[0::2] = starts[nonempty]
+    indices[1::2] = ends[nonempty]
+    reduce = np.minimum if first else np.maximum
+    found = reduce.reduceat(values, indices)[0::2]
+    if first:
+        found[found == _BIG] = -1
+    result[nonempty] = found
+    return result
+
+
+# Применяет шаги обрезки к блоку качеств.
+# quals - все строки качества подряд (uint8), offsets - начало каждой записи.
+# Возвращает начало и конец оставшейся части каждой записи и признак, что запись не отброшена
+def trim_batch(quals, offsets, lengths, steps):
+    q = quals.astype(np.int64) - PHRED_OFFSET
+    starts = offsets.astype(np.int64)
+    ends = starts + lengths
+    alive = lengths > 0
+
+    for name, args in steps:
+        if name == 'LEADING':
+            first = _segment_reduce(q >= args[0], starts, ends, first=True)
+            alive &= first >= 0
+            starts = np.where(first >= 0, first, starts)
+
+        elif name == 'TRAILING':
+            last = _segment_reduce(q >= args[0], starts, ends, first=False)
+            alive &= last >= 0
+            ends = np.where(last >= 0, last + 1, ends)
+
+        elif name == 'SLIDINGWINDOW':
+            window, quality = args
+            required = window * quality
+            cumsum = np.concatenate(([0], np.cumsum(q)))
+            window_sums = np.full(len(q), _BIG, dtype=np.int64)
+            if len(q) >= window:
+                window_sums[:len(q) - window + 1] = cumsum[window:] - cumsum[:-window]
+            bad = window_sums < required
+
+            # Запись отбрасывается, если она короче окна или первое окно уже плохое
+            short = ends - starts < window
+            first_bad = np.zeros(len(starts), dtype=bool)
+            first_bad[~short] = bad[starts[~short]]
+            alive &= ~short & ~first_bad
+
+            # Первое плохое окно после первого: оставляем основания до конца предыдущего окна
+            cut = _segment_reduce(bad, starts + 1, np.maximum(ends - window + 1, starts + 1), first=True)
+            ends = np.where(cut >= 0, cut - 1 + window, ends)
+
+            # Затем отрезаем с конца основания ниже порога (но оставляем хотя бы одно)
+            last_good = _segment_reduce(q >= quality, starts, ends, first=False)
+            ends = np.where(last_good >= 0, last_good + 1, starts + 1)
+
+        elif name == 'MINLEN':
+            alive &= ends - starts >= args[0]
+
+        elif name == 'HEADCROP':
+            alive &= ends - starts > args[0]
+            starts = np.minimum(starts + args[0], ends)
+
+        elif name == 'CROP':
+            ends = np.minimum(ends, starts + args[0])
+
+    alive &= ends > starts
+    return starts - offsets, ends - offsets, alive
+
+
+def _split_records(block):
+    lines = block.split(b'\n')
+    if lines and lines[-1] == b'':
+        lines.pop()
+    if len(lines) % 4:
+        raise ValueError("FASTQ block is not made of 4-line records")
+    return lines[0::4], lines[1::4], lines[2::4], lines[3::4]
+
+
+def _trim_records(quals, steps):
+    lengths = np.fromiter(map(len, quals), dtype=np.int64, count=len(quals))
+    offsets = np.zeros(len(quals), dtype=np.int64)
+    if len(quals) > 1:
+        np.cumsum(lengths[:-1], out=offsets[1:])
+    data = np.frombuffer(b''.join(quals), dtype=np.uint8)
+    return trim_batch(data, offsets, lengths, steps)
+
+
+def _format(headers, seqs, plus, quals, starts, ends, selected):
+    out = []
+    for i in np.flatnonzero(selected):
+        s, e = starts[i], ends[i]
+        out.append(b'%s\n%s\n%s\n%s\n' % (headers[i], seqs[i][s:e], plus[i], quals[i][s:e]))
+    return b''.join(out)
+
+
+# Обработка одного блока пар прочтений в отдельном процессе.
+# Каждый выходной блок сжимается отдельным gzip-членом, поэтому блоки можно просто дописывать подряд,
+# а индекс членов потом позволяет читать файл параллельно
+def trim_chunk(block_r1, block_r2, steps):
+    records_r1 = _split_records(block_r1)
+    records_r2 = _split_records(block_r2)
+    if len(records_r1[0]) != len(records_r2[0]):
+        raise ValueError("R1 and R2 blocks contain different numbers of reads")
+
+    starts1, ends1, alive1 = _trim_records(records_r1[3], steps)
+    starts2, ends2, alive2 = _trim_records(records_r2[3], steps)
+
+    paired = alive1 & alive2
+    outputs = [
+        _format(*records_r1, starts1, ends1, paired),
+        _format(*records_r1, starts1, ends1, alive1 & ~alive2),
+        _format(*records_r2, starts2, ends2, paired),
+        _format(*records_r2, starts2, ends2, alive2 & ~alive1),
+    ]
+    selected = [paired, alive1 & ~alive2, paired, alive2 & ~alive1]
+    stats = {'input': len(paired), 'both': int(paired.sum()), 'forward_only': int((alive1 & ~alive2).sum()),
+             'reverse_only': int((alive2 & ~alive1).sum()), 'dropped': int((~alive1 & ~alive2).sum())}
+    members = [(compress_block(data) if data else b'', len(data), int(mask.sum()))
+               for data, mask in zip(outputs, selected)]
+    return members, stats
+
+
+# Аналог Trimmomatic PE: пишет paired/unpaired файлы с теми же именами, что и trim_reads
+def trim_pair(input_file_R1, input_file_R2, output_files, steps=TRIM_STEPS, workers=4,
+              chunk_records=CHUNK_RECORDS):
+    start_time = time.time()
+    parsed_steps = parse_steps(steps)
+    reader_r1 = FastqBlockReader(input_file_R1)
+    reader_r2 = FastqBlockReader(input_file_R2)
+    writers = [BlockGzipWriter(path, threads=1) for path in output_files]
+    totals = {}
+
+    # Ограничиваем количество блоков в обработке, чтобы не держать весь файл в памяти
+    max_in_flight = 2 * workers
+    pending = []
+
+    def write_result(future):
+        members, stats = future.result()
+        for writer, member in zip(writers, members):
+            writer.write_member(*member)
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+
+    try:
+        # forkserver: trim_pair может вызываться из потоков планировщика, а fork из многопоточного процесса небезопасен
+        context = multiprocessing.get_context('forkserver')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            while True:
+                block_r1 = reader_r1.read_records(chunk_records)
+                if not block_r1:
+                    break
+                block_r2 = reader_r2.read_records(block_r1.count(b'\n') // 4)
+                pending.append(executor.submit(trim_chunk, block_r1, block_r2, parsed_steps))
+                # Блоки записываются строго по порядку
+                while len(pending) >= max_in_flight:
+                    write_result(pending.pop(0))
+            if reader_r2.read_records(1):
+                raise ValueError(f"{input_file_R2} has more reads than {input_file_R1}")
+            while pending:
+                write_result(pending.pop(0))
+    finally:
+        reader_r1.close()
+        reader_r2.close()
+        for writer in writers:
+            writer.close()
+
+    elapsed_time = time.time() - start_time
+    if totals.get('input'):
+        print(f"Input Read Pairs: {totals['input']} Both Surviving: {totals['both']} "
+              f"Forward Only Surviving: {totals['forward_only']} Reverse Only Surviving: {totals['reverse_only']} "
+              f"Dropped: {totals['dropped']}")
+    print(f"Trimmed {os.path.basename(input_file_R1)} in {elapsed_time:.2f} seconds")
+    return elapsed_time